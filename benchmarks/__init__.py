@@ -0,0 +1,18 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
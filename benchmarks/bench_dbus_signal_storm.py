@@ -0,0 +1,131 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Measures how `UsbguardDbusInterface` and `DeviceModel` keep up with storms
+of `DevicePresenceChanged` and `DevicePolicyChanged` signals, emitted by the
+fake USBGuard daemon on a private bus, with and without coalescing of the
+presence events and the worker thread, including the time spent on the GUI
+thread per event.
+
+Requires dbus-python, PyGObject, PySide2 and dbus-daemon. Run from the
+repository root with:
+
+    python -m benchmarks.bench_dbus_signal_storm [signals] [signals/s]
+"""
+
+import os
+import sys
+from time import perf_counter
+from dbus.bus import BusConnection
+from dbus.mainloop.glib import DBusGMainLoop
+from PySide2.QtCore import QTimer
+from PySide2.QtWidgets import QApplication
+from tests.fake_usbguard_daemon import (BUS_NAME,
+                                        DEVICES_IFACE_NAME,
+                                        DEVICES_PATH,
+                                        private_fake_daemon)
+from usbguard_simple_gui_py_qt.device import DeviceModel
+from usbguard_simple_gui_py_qt.usbguard_dbus_interface import (
+    CallbackEventType,
+    EventPresenceChangeType,
+    UsbguardDbusInterface)
+
+
+def _run_storm(
+    app: QApplication,
+    address: str,
+    count: int,
+    rate: float,
+    window: float,
+    worker_thread: bool
+) -> None:
+    bus = BusConnection(address, mainloop=DBusGMainLoop())
+    usbguard_dbus = UsbguardDbusInterface(
+        bus=bus,
+        presence_coalescing_window=window,
+        worker_thread=worker_thread)
+    model = DeviceModel([])
+    stats = {'callbacks': 0, 'callback_time': 0.0}
+
+    def on_presence_changed(device, event, _target):
+        start = perf_counter()
+        if event is EventPresenceChangeType.REMOVE:
+            model.remove_device(device)
+        else:
+            model.update_or_add_device(device)
+        stats['callback_time'] += perf_counter() - start
+        stats['callbacks'] += 1
+
+    def on_policy_changed(device, _target_old, _target_new, _rule_id):
+        start = perf_counter()
+        model.update_or_add_device(device)
+        stats['callback_time'] += perf_counter() - start
+        stats['callbacks'] += 1
+
+    def on_storm_done(_count):
+        stats['received'] = perf_counter()
+        # Waiting for the last coalesced batch and worker deliveries
+        QTimer.singleShot(int(window * 1000) + 200, app.quit)
+
+    usbguard_dbus.register_callback(
+        CallbackEventType.DEVICE_PRESENCE_CHANGED, on_presence_changed)
+    usbguard_dbus.register_callback(
+        CallbackEventType.DEVICE_POLICY_CHANGED, on_policy_changed)
+    bus.add_signal_receiver(
+        on_storm_done, 'SignalStormDone', DEVICES_IFACE_NAME)
+
+    start = perf_counter()
+    bus.get_object(BUS_NAME, DEVICES_PATH).startSignalStorm(
+        count, rate, dbus_interface=DEVICES_IFACE_NAME)
+    app.exec_()
+    usbguard_dbus.close()
+    bus.close()
+
+    elapsed = stats['received'] - start
+    gui_time = usbguard_dbus.gui_thread_timing.total \
+        / max(1, usbguard_dbus.received_signals)
+    print(f'coalescing window {window * 1000:>5.0f} ms, '
+          f'worker thread {"on " if worker_thread else "off"}: '
+          f'{count} signals in {elapsed:.2f} s '
+          f'({count / elapsed:,.0f} signals/s), '
+          f'{stats["callbacks"]} callbacks taking '
+          f'{stats["callback_time"] * 1000:.1f} ms, '
+          f'{model.rowCount()} rows, '
+          f'{gui_time * 1e6:.1f} us/event on the GUI thread')
+    print(usbguard_dbus.callback_dispatcher.report())
+    print()
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 3000
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication(sys.argv[:1])
+
+    for worker_thread in (False, True):
+        for window in (0, 0.05, 0.25):
+            # A new daemon each time, so that all the devices are new
+            with private_fake_daemon() as address:
+                _run_storm(app, address, count, rate, window, worker_thread)
+
+
+if __name__ == '__main__':
+    main()
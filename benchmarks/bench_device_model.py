@@ -0,0 +1,110 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Measures the cost of updating a device in `DeviceModel` as the model grows,
+compared with the linear scan for the row of the device used before the
+row index, and the cost of `DeviceModel.data` compared with rendering the
+cells on each call.
+
+Requires PySide2. Run from the repository root with:
+
+    python -m benchmarks.bench_device_model
+"""
+
+from timeit import repeat
+from PySide2.QtCore import QCoreApplication
+from usbguard_simple_gui_py_qt.device import Device, DeviceModel
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+
+def _device(device_id: int, target: str = 'block') -> Device:
+    return Device(device_id, RuleParser.parse(
+        f'{target} id 0781:{device_id % 0x10000:04x} '
+        f'serial "SN{device_id}" name "Device {device_id}" '
+        f'hash "h{device_id}" with-interface 08:06:50'))
+
+
+def _linear_find(devices, device_id):
+    for row, device in enumerate(devices):
+        if device.device_id == device_id:
+            return row
+    return None
+
+
+def main() -> None:
+    _app = QCoreApplication.instance() or QCoreApplication([])
+
+    print(f'{"devices":>8} {"update":>12} {"linear scan":>14} '
+          f'{"insert+remove":>15}')
+
+    for size in (100, 1_000, 5_000, 20_000):
+        model = DeviceModel([_device(i) for i in range(size)])
+        # The last device is the worst case of the linear scan
+        updated = _device(size - 1, 'allow')
+        added = _device(size)
+        number = 2000
+
+        update = min(repeat(
+            lambda: model.update_or_add_device(updated),
+            number=number, repeat=5)) / number
+        scan = min(repeat(
+            lambda: _linear_find(model.devices, size - 1),
+            number=number // 10, repeat=5)) / (number // 10)
+
+        def insert_and_remove():
+            model.update_or_add_device(added)
+            model.remove_device(added)
+
+        insert_remove = min(repeat(
+            insert_and_remove, number=number, repeat=5)) / number
+
+        print(f'{size:>8} {update * 1e6:>9.2f} us {scan * 1e6:>11.2f} us '
+              f'{insert_remove * 1e6:>12.2f} us')
+
+    _bench_data()
+
+
+def _bench_data() -> None:
+    # Like a view painting (or resizing to the contents of) a whole table
+    model = DeviceModel([_device(i) for i in range(1_000)])
+    indexes = [
+        model.index(row, column)
+        for row in range(model.rowCount())
+        for column in range(model.columnCount())
+    ]
+
+    def render_on_each_call():
+        for index in indexes:
+            DeviceModel._render(model.devices[index.row()])[index.column()]
+
+    def cached():
+        for index in indexes:
+            model.data(index)
+
+    print()
+    for label, function in (('rendering on each call', render_on_each_call),
+                            ('cached cells', cached)):
+        best = min(repeat(function, number=5, repeat=5)) / 5
+        print(f'data() on {len(indexes)} cells, {label:<24} '
+              f'{best / len(indexes) * 1e6:>6.2f} us/cell')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Measures the cost of filtering the device table on each keystroke, looking
+the devices up in `DeviceSearchIndex` compared with reading the cells of
+each row through `DeviceModel.data`, as a plain `QSortFilterProxyModel`
+would do.
+
+Requires PySide2. Run from the repository root with:
+
+    python -m benchmarks.bench_device_search
+"""
+
+from timeit import repeat
+from PySide2.QtCore import QCoreApplication
+from usbguard_simple_gui_py_qt.device import (Device,
+                                              DeviceFilterProxyModel,
+                                              DeviceModel)
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+# What the user types, one keystroke at a time
+_QUERY = 'device 1234'
+
+# Name, serial and hash
+_SEARCHED_COLUMNS = (2, 5, 7)
+
+
+def _device(device_id: int) -> Device:
+    return Device(device_id, RuleParser.parse(
+        f'block id 0781:{device_id % 0x10000:04x} '
+        f'serial "SN{device_id}" name "Device {device_id}" '
+        f'hash "h{device_id}" with-interface 08:06:50'))
+
+
+def main() -> None:
+    _app = QCoreApplication.instance() or QCoreApplication([])
+
+    print(f'{"devices":>8} {"cell scan":>12} {"index":>12} '
+          f'{"proxy":>12}   (per keystroke)')
+
+    for size in (1_000, 5_000, 20_000):
+        model = DeviceModel([_device(i) for i in range(size)])
+        proxy = DeviceFilterProxyModel(model)
+        prefixes = [_QUERY[:i] for i in range(1, len(_QUERY) + 1)]
+
+        def scan_cells():
+            for prefix in prefixes:
+                term = prefix.lower()
+                [
+                    row for row in range(model.rowCount())
+                    if any(
+                        term in model.data(model.index(row, column)).lower()
+                        for column in _SEARCHED_COLUMNS)
+                ]
+
+        def search_index():
+            for prefix in prefixes:
+                model.search_index.search(prefix)
+
+        def filter_proxy():
+            for prefix in prefixes:
+                proxy.set_search_text(prefix)
+                # Filtering is lazy, until the view asks for the rows
+                proxy.rowCount()
+            proxy.set_search_text('')
+
+        results = [
+            min(repeat(function, number=1, repeat=3)) / len(prefixes)
+            for function in (scan_cells, search_index, filter_proxy)
+        ]
+        print(f'{size:>8} ' + ' '.join(
+            f'{result * 1e3:>9.2f} ms' for result in results))
+
+
+if __name__ == '__main__':
+    main()
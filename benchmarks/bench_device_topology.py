@@ -0,0 +1,84 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Measures the cost of plugging and unplugging a hub with its devices in
+`DeviceTreeModel` as the tree grows, compared with rebuilding the tree from
+all the devices.
+
+Requires PySide2. Run from the repository root with:
+
+    python -m benchmarks.bench_device_topology
+"""
+
+from timeit import repeat
+from typing import List
+from PySide2.QtCore import QCoreApplication
+from usbguard_simple_gui_py_qt.device import Device, DeviceTreeModel
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+# Devices behind each hub
+_HUB_SIZE = 10
+
+
+def _device(device_id: int, device_hash: str, parent_hash: str) -> Device:
+    return Device(device_id, RuleParser.parse(
+        f'block id 0781:{device_id % 0x10000:04x} '
+        f'name "Device {device_id}" '
+        f'hash "{device_hash}" parent-hash "{parent_hash}"'))
+
+
+def _hub(hub: int) -> List[Device]:
+    """A hub and its devices, in the order they're usually reported."""
+    first_id = hub * (_HUB_SIZE + 1)
+    return [_device(first_id, f'hub{hub}', 'root')] + [
+        _device(first_id + i, f'dev{hub}.{i}', f'hub{hub}')
+        for i in range(1, _HUB_SIZE + 1)
+    ]
+
+
+def main() -> None:
+    _app = QCoreApplication.instance() or QCoreApplication([])
+
+    print(f'{"devices":>8} {"unplug+plug":>14} {"rebuild":>12}')
+
+    for hubs in (10, 100, 1_000):
+        devices = [device for hub in range(hubs) for device in _hub(hub)]
+        model = DeviceTreeModel(devices)
+        burst = _hub(hubs // 2)
+        number = 20
+
+        def unplug_and_plug():
+            for device in reversed(burst):
+                model.remove_device(device)
+            # The devices may be reported before their hub
+            for device in burst[1:] + burst[:1]:
+                model.update_or_add_device(device)
+
+        burst_time = min(repeat(
+            unplug_and_plug, number=number, repeat=5)) / number
+        rebuild_time = min(repeat(
+            lambda: model.reset_devices(devices), number=2, repeat=3)) / 2
+
+        print(f'{len(devices):>8} {burst_time * 1e3:>11.2f} ms '
+              f'{rebuild_time * 1e3:>9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Compares sequential and process-pool parsing of a large generated policy.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_parallel_rule_parsing [lines]
+"""
+
+import os
+import sys
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+from usbguard_simple_gui_py_qt.parallel_rule_parsing import (
+    parse_file_parallel)
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+
+def _write_policy(lines: int) -> str:
+    with NamedTemporaryFile('w', suffix='.conf', delete=False) as file:
+        for i in range(lines):
+            file.write(
+                f'allow id {i % 0xffff:04x}:{i // 7 % 0xffff:04x} '
+                f'serial "{i:012d}" name "Device {i % 97}" '
+                f'hash "{i:044d}" '
+                f'with-interface {{ 03:01:{i % 3:02x} 03:00:00 }}\n')
+    return file.name
+
+
+def main() -> None:
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    path = _write_policy(lines)
+
+    try:
+        start = perf_counter()
+        sequential = sum(1 for _ in RuleParser.iter_file(path))
+        sequential_time = perf_counter() - start
+
+        start = perf_counter()
+        parallel = len(parse_file_parallel(path))
+        parallel_time = perf_counter() - start
+    finally:
+        os.remove(path)
+
+    assert sequential == parallel == lines
+    print(f'{lines} rules, {os.cpu_count()} CPUs')
+    print(f'sequential: {sequential_time:8.3f} s')
+    print(f'parallel:   {parallel_time:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
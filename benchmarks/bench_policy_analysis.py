@@ -0,0 +1,84 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Analyzes a generated policy with tens of thousands of rules, or, with
+`--interfaces-only`, a policy made only of `with-interface` rules, like
+many hand-written ones.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_policy_analysis [rules] [--interfaces-only]
+"""
+
+import sys
+from collections import Counter
+from random import Random
+from time import perf_counter
+from usbguard_simple_gui_py_qt.policy_analysis import analyze_policy
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+
+def _policy(random: Random, rules: int):
+    policy = []
+    for i in range(rules):
+        target = random.choice(['allow', 'block'])
+        vendor = random.randrange(rules // 10 + 1)
+        kind = random.random()
+        if kind < 0.75:
+            rule = f'{target} id {vendor:04x}:{random.randrange(16):04x} ' \
+                   f'serial "{i}" hash "{random.randrange(rules * 10)}" ' \
+                   f'with-interface {{ 03:01:01 03:00:00 }}'
+        elif kind < 0.99:
+            rule = f'{target} id {vendor:04x}:* with-interface one-of ' \
+                   f'{{ 03:{random.randrange(4):02x}:* 08:*:* }}'
+        else:
+            rule = f'{target} with-interface one-of ' \
+                   f'{{ {random.randrange(256):02x}:*:* }}'
+        policy.append(RuleParser.parse(rule))
+    return policy
+
+
+def _interfaces_only_policy(random: Random, rules: int):
+    return [
+        RuleParser.parse(
+            f'{random.choice(["allow", "block"])} with-interface equals '
+            f'{{ {random.randrange(256):02x}:{random.randrange(256):02x}:* }}')
+        for _ in range(rules)
+    ]
+
+
+def main() -> None:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    rules = int(args[0]) if args else 20_000
+    if '--interfaces-only' in sys.argv:
+        policy = _interfaces_only_policy(Random(0), rules)
+    else:
+        policy = _policy(Random(0), rules)
+
+    start = perf_counter()
+    issues = analyze_policy(policy)
+    elapsed = perf_counter() - start
+
+    counts = Counter(issue.issue_type.value for issue in issues)
+    print(f'{rules} rules analyzed in {elapsed:.2f} s: {dict(counts)}')
+
+
+if __name__ == '__main__':
+    main()
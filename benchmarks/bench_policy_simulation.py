@@ -0,0 +1,82 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Simulates a generated policy over a generated device inventory.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_policy_simulation [devices] [rules]
+"""
+
+import sys
+from random import Random
+from time import perf_counter
+from usbguard_simple_gui_py_qt.policy_simulation import simulate_policy
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+_INTERFACES = ['03:01:01', '03:01:02', '03:00:00', '08:06:50', '09:00:00',
+               'e0:01:01', '0e:01:00', '01:01:00']
+
+
+def _policy(random: Random, rules: int):
+    policy = []
+    for i in range(rules):
+        kind = random.random()
+        if kind < 0.8:
+            rule = f'allow id {i % 4096:04x}:{random.randrange(64):04x}'
+        elif kind < 0.9:
+            rule = f'block id {i % 4096:04x}:*'
+        else:
+            rule = 'reject with-interface one-of { %s }' % ' '.join(
+                random.sample(_INTERFACES, 2))
+        policy.append(RuleParser.parse(rule))
+    policy.append(RuleParser.parse('allow with-interface equals { 09:00:* }'))
+    return policy
+
+
+def _inventory(random: Random, devices: int):
+    return [
+        (i, RuleParser.parse(
+            f'{random.choice(["allow", "block"])} '
+            f'id {random.randrange(4096):04x}:{random.randrange(64):04x} '
+            f'serial "{i}" hash "{i:044d}" '
+            f'with-interface {{ {" ".join(random.sample(_INTERFACES, 2))} }}'))
+        for i in range(devices)
+    ]
+
+
+def main() -> None:
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rules = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    random = Random(0)
+    policy = _policy(random, rules)
+    inventory = _inventory(random, devices)
+
+    start = perf_counter()
+    changes = simulate_policy(policy, inventory)
+    elapsed = perf_counter() - start
+
+    print(f'{devices} devices x {rules} rules: {elapsed:.2f} s, '
+          f'{len(changes)} changes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Measures the memory used by the parsed rules of a 10k-device inventory, and
+the cost of the `Rule` attribute accessors.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_rule_memory
+"""
+
+import tracemalloc
+from timeit import repeat
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+DEVICES = 10_000
+
+
+def _device_rules():
+    return [
+        f'allow id {i % 0xffff:04x}:{i // 7 % 0xffff:04x} '
+        f'serial "{i:012d}" name "Device {i % 97}" '
+        f'hash "{i:044d}" parent-hash "{i // 4:044d}" '
+        f'via-port "1-{i % 8}" '
+        f'with-interface {{ 03:01:{i % 3:02x} 03:00:00 }} '
+        f'with-connect-type "hotplug"'
+        for i in range(DEVICES)
+    ]
+
+
+def main() -> None:
+    device_rules = _device_rules()
+
+    tracemalloc.start()
+    rules = [RuleParser.parse(device_rule) for device_rule in device_rules]
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{DEVICES} devices: {size / 1024:.0f} KiB, '
+          f'{size / DEVICES:.0f} bytes/device')
+
+    rule = rules[0]
+    best = min(repeat(lambda: (rule.name, rule.hash), number=100_000))
+    print(f'rule.name + rule.hash: {best / 100_000 * 1e9:.0f} ns')
+
+
+if __name__ == '__main__':
+    main()
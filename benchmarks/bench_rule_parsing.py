@@ -0,0 +1,65 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Measures the throughput of `RuleParser.parse` on short device rules and on
+long rules with many `with-interface` values.
+
+The values are interned by their source text, and only the attributes with
+a few values are interned as a whole, so that interning never costs more
+than the parsing itself on long rules.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_rule_parsing
+"""
+
+from timeit import repeat
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+SHORT_RULE = (
+    'allow id 1d6b:0002 serial "0000:00:14.0" name "xHCI Host Controller" '
+    'hash "jEP/6WzviqdJ5VSeTUY8PatCNBKeaREvo2OqdplND/o=" '
+    'parent-hash "rV9bfLq7c2eA4tYjVjwO4bxhm+y6GgZpl9J60L0fBkY=" '
+    'with-interface 09:00:00 with-connect-type ""')
+
+
+def _long_rule(interfaces: int) -> str:
+    values = ' '.join(
+        '%02x:%02x:%02x' % (i % 256, (i // 256) % 256, i % 7)
+        for i in range(interfaces))
+    return f'allow id *:* with-interface one-of {{ {values} }}'
+
+
+def _bench(label: str, rule: str, number: int) -> None:
+    best = min(repeat(lambda: RuleParser.parse(rule), number=number, repeat=5))
+    print(f'{label:<32} {len(rule):>8} chars  '
+          f'{best / number * 1e6:>12.1f} us/rule')
+
+
+def main() -> None:
+    _bench('short device rule', SHORT_RULE, 2000)
+    for interfaces in (100, 1_000, 10_000):
+        _bench(f'with-interface x {interfaces}',
+               _long_rule(interfaces),
+               max(1, 20_000 // interfaces))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Measures how long `write_rules` takes to generate a 10k-rule policy from a
+device inventory.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_rule_serialization
+"""
+
+from io import StringIO
+from timeit import repeat
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+from usbguard_simple_gui_py_qt.rules import write_rules
+
+RULES = 10_000
+
+
+def _inventory():
+    return [
+        RuleParser.parse(
+            f'allow id {i % 0xffff:04x}:{i // 7 % 0xffff:04x} '
+            f'serial "{i:012d}" name "Device {i % 97}" '
+            f'hash "{i:044d}" parent-hash "{i // 4:044d}" '
+            f'via-port "1-{i % 8}" '
+            f'with-interface {{ 03:01:{i % 3:02x} 03:00:00 }} '
+            f'with-connect-type "hotplug"')
+        for i in range(RULES)
+    ]
+
+
+def main() -> None:
+    rules = _inventory()
+    best = min(repeat(lambda: write_rules(rules, StringIO()),
+                      number=1, repeat=5))
+    print(f'{RULES} rules written in {best * 1e3:.1f} ms '
+          f'({best / RULES * 1e6:.2f} us/rule)')
+
+
+if __name__ == '__main__':
+    main()
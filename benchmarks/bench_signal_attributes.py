@@ -0,0 +1,88 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Compares the per-event cost of building a device rule from the attribute
+dictionary of the USBGuard signals (`RuleParser.from_attributes`) with
+parsing the device rule string (`RuleParser.parse`).
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_signal_attributes
+"""
+
+from timeit import repeat
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+ROOT_HUB_RULE = (
+    'allow id 1d6b:0002 serial "0000:00:14.0" name "xHCI Host Controller" '
+    'hash "jEP/6WzviqdJ5VSeTUY8PatCNBKeaREvo2OqdplND/o=" '
+    'parent-hash "rV9bfLq7c2eA4tYjVjwO4bxhm+y6GgZpl9J60L0fBkY=" '
+    'via-port "usb1" with-interface 09:00:00 with-connect-type ""')
+
+HUB_RULE = (
+    'allow id 05e3:0610 serial "" name "USB2.1 Hub" '
+    'hash "ZGBnXKRYMqDMlv+pnR5qgcMMiIr9kp8d0F5Nw1Y6oFU=" '
+    'parent-hash "jEP/6WzviqdJ5VSeTUY8PatCNBKeaREvo2OqdplND/o=" '
+    'via-port "1-1" with-interface { 09:00:01 09:00:02 } '
+    'with-connect-type "hotplug"')
+
+# As sent by USBGuard along with the rules above
+SIGNAL_ATTRIBUTES = {
+    ROOT_HUB_RULE: {
+        'id': '1d6b:0002',
+        'serial': '0000:00:14.0',
+        'name': 'xHCI Host Controller',
+        'hash': 'jEP/6WzviqdJ5VSeTUY8PatCNBKeaREvo2OqdplND/o=',
+        'parent-hash': 'rV9bfLq7c2eA4tYjVjwO4bxhm+y6GgZpl9J60L0fBkY=',
+        'via-port': 'usb1',
+        'with-interface': '09:00:00',
+        'with-connect-type': '',
+    },
+    HUB_RULE: {
+        'id': '05e3:0610',
+        'serial': '',
+        'name': 'USB2.1 Hub',
+        'hash': 'ZGBnXKRYMqDMlv+pnR5qgcMMiIr9kp8d0F5Nw1Y6oFU=',
+        'parent-hash': 'jEP/6WzviqdJ5VSeTUY8PatCNBKeaREvo2OqdplND/o=',
+        'via-port': '1-1',
+        'with-interface': '{ 09:00:01 09:00:02 }',
+        'with-connect-type': 'hotplug',
+    },
+}
+
+
+def _bench(label: str, function, number: int = 20_000) -> None:
+    best = min(repeat(function, number=number, repeat=5))
+    print(f'{label:<40} {best / number * 1e6:>8.2f} us/event')
+
+
+def main() -> None:
+    for label, rule in (('root hub', ROOT_HUB_RULE), ('hub', HUB_RULE)):
+        attributes = SIGNAL_ATTRIBUTES[rule]
+        if RuleParser.from_attributes(rule, attributes) \
+                != RuleParser.parse(rule):
+            raise RuntimeError(f'attributes mismatch for {label}')
+        _bench(f'{label}: parse', lambda: RuleParser.parse(rule))
+        _bench(f'{label}: from_attributes',
+               lambda: RuleParser.from_attributes(rule, attributes))
+
+
+if __name__ == '__main__':
+    main()
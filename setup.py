@@ -27,6 +27,10 @@ setup(
 
     packages=['usbguard_simple_gui_py_qt'],
     entry_points={
+        'console_scripts': [
+            ('usbguard-simple-gui-py-qt-simulate-policy = '
+                'usbguard_simple_gui_py_qt.policy_simulation:main'),
+        ],
         'gui_scripts': [
             ('usbguard-simple-gui-py-qt = ' 
                 'usbguard_simple_gui_py_qt.system_tray_app:main'),
@@ -0,0 +1,391 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Stand-in for the USBGuard daemon, exposing the `org.usbguard.Devices1` and
+`org.usbguard.Policy1` interfaces on a private bus, with configurable reply
+latency, scriptable device inventory and policy, and a generator of
+signal storms (see `FakeDevices.startSignalStorm`).
+
+Run it with:
+
+    python -m tests.fake_usbguard_daemon --address ADDRESS [--delay SECONDS]
+        [--inventory PATH] [--policy PATH]
+
+where the inventory has the format of `usbguard list-devices` (see
+`policy_simulation.load_device_inventory`) and the policy the one of
+`rules.conf`. `private_fake_daemon` starts both a private bus and the fake
+daemon from tests and benchmarks.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+from contextlib import contextmanager
+from time import sleep
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from dbus import Array, Dictionary, String, Struct, UInt32
+from dbus.bus import BusConnection
+from dbus.exceptions import DBusException
+from dbus.mainloop.glib import DBusGMainLoop
+from dbus.service import BusName, method, Object, signal
+from gi.repository import GLib
+from usbguard_simple_gui_py_qt.policy_simulation import load_device_inventory
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+from usbguard_simple_gui_py_qt.rules import DeviceAttributeName
+
+BUS_NAME = 'org.usbguard1'
+DEVICES_PATH = '/org/usbguard1/Devices'
+DEVICES_IFACE_NAME = 'org.usbguard.Devices1'
+POLICY_PATH = '/org/usbguard1/Policy'
+POLICY_IFACE_NAME = 'org.usbguard.Policy1'
+
+DEFAULT_DEVICES = [
+    (1, 'allow id 1d6b:0002 serial "0000:00:14.0" name "xHCI Host Controller" '
+        'hash "h1" parent-hash "h0" via-port "usb1" with-interface 09:00:00 '
+        'with-connect-type ""'),
+    (2, 'block id 046d:c52b serial "" name "USB Receiver" hash "h2" '
+        'parent-hash "h1" via-port "1-2" '
+        'with-interface { 03:01:01 03:01:02 03:00:00 } '
+        'with-connect-type "hotplug"'),
+]
+
+DEFAULT_RULES = [
+    'allow id 1d6b:*',
+    'block with-interface one-of { 03:*:* }',
+]
+
+_TARGETS = ['allow', 'block', 'reject']
+_LAST_RULE_ID = 0xfffffffd
+_IMPLICIT_RULE_ID = 0xfffffffc
+
+# First device id of the devices created by the signal storms
+STORM_FIRST_DEVICE_ID = 100_000
+
+_STORM_TICK = 0.01  # seconds
+
+
+def signal_attributes(device_rule: str) -> Dict[str, str]:
+    """The attribute dictionary sent by USBGuard along with a device rule."""
+    rule = RuleParser.parse(device_rule)
+    attributes = {}
+    for name, attribute in rule.attributes.items():
+        values = [
+            value if isinstance(value, str) else value.to_rule_string()
+            for value in attribute.values
+        ]
+        if name is DeviceAttributeName.WITH_INTERFACE and len(values) > 1:
+            attributes[name.value] = '{ %s }' % ' '.join(values)
+        else:
+            attributes[name.value] = values[0]
+    return attributes
+
+
+def _with_target(device_rule: str, target: str) -> str:
+    return f'{target} {device_rule.split(None, 1)[1]}'
+
+
+class FakePolicy(Object):
+    def __init__(self, bus: BusConnection, rules: List[str]) -> None:
+        super().__init__(bus, POLICY_PATH)
+        self.rules: List[Tuple[int, str]] = list(enumerate(rules, 1))
+        self._next_rule_id = len(rules) + 1
+
+    def append(self, rule: str, parent_id: int = _LAST_RULE_ID) -> int:
+        rule_id = self._next_rule_id
+        self._next_rule_id += 1
+
+        if parent_id == _LAST_RULE_ID:
+            position = len(self.rules)
+        else:
+            ids = [i for i, _ in self.rules]
+            if parent_id not in ids:
+                raise DBusException(f'unknown rule id {parent_id}')
+            position = ids.index(parent_id) + 1
+
+        self.rules.insert(position, (rule_id, rule))
+        return rule_id
+
+    @method(POLICY_IFACE_NAME, in_signature='s', out_signature='a(us)')
+    def listRules(self, _query):
+        return Array(
+            [Struct((UInt32(i), String(r))) for i, r in self.rules],
+            signature='(us)')
+
+    @method(POLICY_IFACE_NAME, in_signature='sub', out_signature='u')
+    def appendRule(self, rule, parent_id, _temporary):
+        RuleParser.parse(str(rule))  # Rejecting invalid rules
+        return UInt32(self.append(str(rule), int(parent_id)))
+
+    @method(POLICY_IFACE_NAME, in_signature='u', out_signature='')
+    def removeRule(self, rule_id):
+        ids = [i for i, _ in self.rules]
+        if rule_id not in ids:
+            raise DBusException(f'unknown rule id {rule_id}')
+        del self.rules[ids.index(rule_id)]
+
+
+class FakeDevices(Object):
+    def __init__(
+        self,
+        bus: BusConnection,
+        devices: List[Tuple[int, str]],
+        delay: float,
+        policy: Optional[FakePolicy] = None,
+        on_exit: Optional[Callable[[], None]] = None
+    ) -> None:
+        super().__init__(bus, DEVICES_PATH)
+        self.devices: Dict[int, str] = dict(devices)
+        self.delay = delay
+        self.policy = policy
+        self._on_exit = on_exit
+
+    @method(DEVICES_IFACE_NAME,
+            in_signature='s',
+            out_signature='a(us)',
+            async_callbacks=('reply', 'error'))
+    def listDevices(self, _query, reply, error):
+        response = Array(
+            [Struct((UInt32(i), String(r))) for i, r in self.devices.items()],
+            signature='(us)')
+        self._reply_later(reply, response)
+
+    @method(DEVICES_IFACE_NAME,
+            in_signature='uub',
+            out_signature='u',
+            async_callbacks=('reply', 'error'))
+    def applyDevicePolicy(self, device_id, target, permanent, reply, error):
+        device_id, target = int(device_id), int(target)
+        device_rule = self.devices.get(device_id)
+        if device_rule is None or not 0 <= target < len(_TARGETS):
+            self._reply_later(
+                error, DBusException(f'invalid device {device_id}'))
+            return
+
+        old_target = _TARGETS.index(device_rule.split(None, 1)[0])
+        device_rule = _with_target(device_rule, _TARGETS[target])
+        self.devices[device_id] = device_rule
+
+        rule_id = _IMPLICIT_RULE_ID
+        if permanent and self.policy is not None:
+            rule_id = self.policy.append(device_rule)
+
+        self._reply_later(reply, UInt32(rule_id if permanent else 0))
+        self._emit_policy_changed(device_id, old_target, target, rule_id)
+
+    @method(DEVICES_IFACE_NAME, in_signature='ud', out_signature='')
+    def startSignalStorm(self, count, rate):
+        """
+        Testing only: emits `count` signals, at about `rate` signals per
+        second, for a set of new devices (with ids from
+        `STORM_FIRST_DEVICE_ID`). Each device goes through insert, policy
+        change and update events. `SignalStormDone` is emitted at the end.
+        """
+        events = self._storm_events(int(count))
+        per_tick = max(1, int(float(rate) * _STORM_TICK))
+
+        def emit_some():
+            for _ in range(per_tick):
+                emit = next(events, None)
+                if emit is None:
+                    self.SignalStormDone(UInt32(count))
+                    return False
+                emit()
+            return True
+
+        GLib.timeout_add(int(_STORM_TICK * 1000), emit_some)
+
+    @method(DEVICES_IFACE_NAME, in_signature='', out_signature='')
+    def exit(self):
+        """Testing only: stops the daemon, as if USBGuard was restarted."""
+        if self._on_exit is not None:
+            GLib.idle_add(self._on_exit)
+
+    @signal(DEVICES_IFACE_NAME, signature='u')
+    def SignalStormDone(self, count):
+        pass
+
+    @signal(DEVICES_IFACE_NAME, signature='uuusa{ss}')
+    def DevicePresenceChanged(self, id, event, target, device_rule,
+                              attributes):
+        pass
+
+    @signal(DEVICES_IFACE_NAME, signature='uuusua{ss}')
+    def DevicePolicyChanged(self, id, target_old, target_new, device_rule,
+                            rule_id, attributes):
+        pass
+
+    def _storm_events(self, count: int) -> Iterator:
+        devices = max(1, count // 3)
+        for i in range(count):
+            device_id = STORM_FIRST_DEVICE_ID + i % devices
+            device_rule = (
+                f'block id 0781:{i % devices % 0x10000:04x} '
+                f'serial "SN{i % devices}" name "Storm device {i % devices}" '
+                f'hash "storm{i % devices}" parent-hash "h1" '
+                f'via-port "2-{i % devices}" with-interface 08:06:50 '
+                'with-connect-type "hotplug"')
+            step = i // devices
+
+            if step == 0:
+                yield lambda d=device_id, r=device_rule: \
+                    self._emit_presence_changed(d, 1, r)
+            elif step == 1:
+                yield lambda d=device_id: \
+                    self._emit_policy_changed(d, 1, 0, _IMPLICIT_RULE_ID)
+            else:
+                yield lambda d=device_id: \
+                    self._emit_presence_changed(
+                        d, 2, self.devices.get(d, ''))
+
+    def _emit_presence_changed(
+        self,
+        device_id: int,
+        event: int,
+        device_rule: str
+    ) -> None:
+        if device_rule:
+            self.devices[device_id] = device_rule
+        device_rule = self.devices[device_id]
+        target = _TARGETS.index(device_rule.split(None, 1)[0])
+        self.DevicePresenceChanged(
+            UInt32(device_id), UInt32(event), UInt32(target),
+            String(device_rule), self._attributes(device_rule))
+
+    def _emit_policy_changed(
+        self,
+        device_id: int,
+        target_old: int,
+        target_new: int,
+        rule_id: int
+    ) -> None:
+        device_rule = _with_target(
+            self.devices[device_id], _TARGETS[target_new])
+        self.devices[device_id] = device_rule
+        self.DevicePolicyChanged(
+            UInt32(device_id), UInt32(target_old), UInt32(target_new),
+            String(device_rule), UInt32(rule_id),
+            self._attributes(device_rule))
+
+    @staticmethod
+    def _attributes(device_rule: str) -> Dictionary:
+        return Dictionary(signal_attributes(device_rule), signature='ss')
+
+    def _reply_later(self, reply, *args) -> None:
+        if not self.delay:
+            reply(*args)
+            return
+
+        def do_reply():
+            reply(*args)
+            return False
+
+        GLib.timeout_add(int(self.delay * 1000), do_reply)
+
+
+@contextmanager
+def private_fake_daemon(*daemon_args: str) -> Iterator[str]:
+    """
+    Starts a private bus with the fake daemon on it, and stops both on exit.
+
+    :param daemon_args: Additional command line arguments of the daemon.
+    :return: The address of the bus.
+    """
+    if shutil.which('dbus-daemon') is None:
+        raise RuntimeError('dbus-daemon not found')
+
+    bus_daemon = subprocess.Popen(
+        ['dbus-daemon', '--session', '--nofork', '--print-address'],
+        stdout=subprocess.PIPE)
+    try:
+        address = bus_daemon.stdout.readline().decode().strip()
+        fake_daemon = start_fake_daemon(address, *daemon_args)
+        try:
+            _wait_for_name(address)
+            yield address
+        finally:
+            fake_daemon.terminate()
+            fake_daemon.wait()
+    finally:
+        bus_daemon.terminate()
+        bus_daemon.wait()
+
+
+def start_fake_daemon(address: str, *daemon_args: str) -> subprocess.Popen:
+    """
+    Starts another fake daemon on the bus. While the name is owned by a
+    previous one, it waits in the queue of the name owners.
+    """
+    return subprocess.Popen(
+        [sys.executable, '-m', 'tests.fake_usbguard_daemon',
+         '--address', address, *daemon_args],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _wait_for_name(address: str, timeout: float = 5) -> None:
+    bus = BusConnection(address)
+    try:
+        for _ in range(int(timeout / 0.05)):
+            if bus.name_has_owner(BUS_NAME):
+                return
+            sleep(0.05)
+        raise RuntimeError('the fake daemon did not start')
+    finally:
+        bus.close()
+
+
+def _load_rules(path: str) -> List[str]:
+    with open(path, encoding='utf-8') as file:
+        return [
+            line.strip() for line in file
+            if line.strip() and not line.strip().startswith('#')
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--address', required=True)
+    parser.add_argument('--delay', type=float, default=0)
+    parser.add_argument('--inventory', help='device inventory file')
+    parser.add_argument('--policy', help='rules.conf file')
+    args = parser.parse_args()
+
+    if args.inventory:
+        devices = [
+            (device_id, rule.to_rule_string())
+            for device_id, rule in load_device_inventory(args.inventory)
+        ]
+    else:
+        devices = DEFAULT_DEVICES
+
+    rules = _load_rules(args.policy) if args.policy else DEFAULT_RULES
+
+    bus = BusConnection(args.address, mainloop=DBusGMainLoop())
+    _bus_name = BusName(BUS_NAME, bus)
+    policy = FakePolicy(bus, rules)
+    loop = GLib.MainLoop()
+    _devices = FakeDevices(bus, devices, args.delay, policy, loop.quit)
+
+    loop.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from enum import auto, Enum
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.callback_dispatch import (CallbackDispatcher,
+                                                         CallbackError,
+                                                         LatencyHistogram)
+
+
+class _Event(Enum):
+    CHANGED = auto()
+    CHANGED_ERROR = auto()
+    OTHER = auto()
+
+
+class TestLatencyHistogram(TestCase):
+    def test_buckets(self):
+        histogram = LatencyHistogram([0.001, 0.01])
+        for duration in (0.0005, 0.001, 0.002, 0.5):
+            histogram.add(duration)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.max, 0.5)
+        self.assertAlmostEqual(histogram.mean, 0.50350 / 4)
+
+    def test_quantile(self):
+        histogram = LatencyHistogram([0.001, 0.01])
+        self.assertEqual(histogram.quantile(0.5), 0)
+        for _ in range(90):
+            histogram.add(0.0005)
+        for _ in range(10):
+            histogram.add(0.2)
+        self.assertEqual(histogram.quantile(0.5), 0.001)
+        self.assertEqual(histogram.quantile(0.9), 0.001)
+        self.assertEqual(histogram.quantile(0.95), 0.2)
+
+
+class TestCallbackDispatcher(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.slow = []
+        self.unhandled = []
+        self.dispatcher = CallbackDispatcher(
+            list(_Event),
+            {_Event.CHANGED: _Event.CHANGED_ERROR},
+            time_budget=0.05,
+            on_slow_callback=lambda *args: self.slow.append(args),
+            on_unhandled_error=self.unhandled.append,
+            clock=lambda: self.now)
+
+    def test_registration_order(self):
+        calls = []
+        for i in (3, 1, 2):
+            self.dispatcher.register(
+                _Event.CHANGED, lambda x, i=i: calls.append((i, x)))
+        self.dispatcher.dispatch(_Event.CHANGED, 'a')
+        self.dispatcher.dispatch(_Event.OTHER, 'b')
+        self.assertEqual(calls, [(3, 'a'), (1, 'a'), (2, 'a')])
+
+    def test_duplicate_and_unregister(self):
+        calls = []
+        self.dispatcher.register(_Event.CHANGED, calls.append)
+        with self.assertRaises(Exception):
+            self.dispatcher.register(_Event.CHANGED, calls.append)
+        self.dispatcher.unregister(_Event.CHANGED, calls.append)
+        self.dispatcher.dispatch(_Event.CHANGED, 'a')
+        self.assertEqual(calls, [])
+        with self.assertRaises(KeyError):
+            self.dispatcher.unregister(_Event.CHANGED, calls.append)
+
+    def test_errors_are_isolated_and_reported(self):
+        calls = []
+        errors = []
+        error = ValueError('broken')
+
+        def failing(_value):
+            raise error
+
+        self.dispatcher.register(_Event.CHANGED, failing)
+        self.dispatcher.register(_Event.CHANGED, calls.append)
+        self.dispatcher.register(_Event.CHANGED_ERROR, errors.append)
+        self.dispatcher.dispatch(_Event.CHANGED, 'a')
+
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], CallbackError)
+        self.assertIs(errors[0].error, error)
+        self.assertIs(errors[0].callback, failing)
+        self.assertIs(errors[0].event_type, _Event.CHANGED)
+        self.assertEqual(
+            self.dispatcher.errors, {(_Event.CHANGED, failing): 1})
+        self.assertEqual(self.unhandled, [])
+
+    def test_unhandled_errors(self):
+        def failing(*_args):
+            raise ValueError('broken')
+
+        # No error event type
+        self.dispatcher.register(_Event.OTHER, failing)
+        self.dispatcher.dispatch(_Event.OTHER)
+        # No error callbacks
+        self.dispatcher.register(_Event.CHANGED, failing)
+        self.dispatcher.dispatch(_Event.CHANGED)
+        # Failing error callback
+        self.dispatcher.register(_Event.CHANGED_ERROR, failing)
+        self.dispatcher.dispatch(_Event.CHANGED)
+
+        self.assertEqual(
+            [e.event_type for e in self.unhandled],
+            [_Event.OTHER, _Event.CHANGED, _Event.CHANGED_ERROR])
+
+    def test_latencies_and_slow_callbacks(self):
+        def fast(_value):
+            self.now += 0.01
+
+        def slow(_value):
+            self.now += 0.2
+
+        self.dispatcher.register(_Event.CHANGED, fast)
+        self.dispatcher.register(_Event.CHANGED, slow)
+        for _ in range(3):
+            self.dispatcher.dispatch(_Event.CHANGED, 'a')
+
+        fast_latencies = self.dispatcher.latencies[(_Event.CHANGED, fast)]
+        slow_latencies = self.dispatcher.latencies[(_Event.CHANGED, slow)]
+        self.assertEqual(fast_latencies.count, 3)
+        self.assertAlmostEqual(slow_latencies.max, 0.2)
+        self.assertEqual(self.dispatcher.slow_calls,
+                         {(_Event.CHANGED, slow): 3})
+        self.assertEqual([(e, c) for e, c, _ in self.slow],
+                         [(_Event.CHANGED, slow)] * 3)
+
+        report = self.dispatcher.report().splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertIn('CHANGED / TestCallbackDispatcher', report[2])
+
+    def test_unregister_drops_statistics(self):
+        def slow(_value):
+            self.now += 0.2
+            raise ValueError('a')
+
+        self.dispatcher.register(_Event.CHANGED, slow)
+        self.dispatcher.dispatch(_Event.CHANGED, 'a')
+        self.assertIn((_Event.CHANGED, slow), self.dispatcher.latencies)
+
+        self.dispatcher.unregister(_Event.CHANGED, slow)
+        self.assertEqual(self.dispatcher.latencies, {})
+        self.assertEqual(self.dispatcher.slow_calls, {})
+        self.assertEqual(self.dispatcher.errors, {})
+
+    def test_unregister_while_being_called(self):
+        def unregistering(_value):
+            self.now += 0.2
+            self.dispatcher.unregister(_Event.CHANGED, unregistering)
+
+        self.dispatcher.register(_Event.CHANGED, unregistering)
+        self.dispatcher.dispatch(_Event.CHANGED, 'a')
+        self.assertEqual(self.dispatcher.latencies, {})
+        # Still reported as slow
+        self.assertEqual([(e, c) for e, c, _ in self.slow],
+                         [(_Event.CHANGED, unregistering)])
@@ -0,0 +1,175 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.device_events import (diff_device_inventories,
+                                                     EventPresenceChangeType,
+                                                     PendingPresenceEvent,
+                                                     PresenceEventCoalescer)
+
+_PRESENT = EventPresenceChangeType.PRESENT
+_INSERT = EventPresenceChangeType.INSERT
+_UPDATE = EventPresenceChangeType.UPDATE
+_REMOVE = EventPresenceChangeType.REMOVE
+
+
+def _event(device_id, event, payload=None):
+    return PendingPresenceEvent(device_id, event, 1, payload)
+
+
+class TestPresenceEventCoalescer(TestCase):
+    def setUp(self):
+        self.batches = []
+        self.scheduled = []
+        self.coalescer = PresenceEventCoalescer(
+            0.25,
+            self.batches.append,
+            lambda delay, callback: self.scheduled.append((delay, callback)))
+
+    def _add_and_flush(self, *events):
+        for event in events:
+            self.coalescer.add(event)
+        self.coalescer.flush()
+        return self.batches[-1] if self.batches else None
+
+    def test_schedules_one_flush_per_window(self):
+        self.coalescer.add(_event(1, _INSERT))
+        self.coalescer.add(_event(2, _INSERT))
+        self.assertEqual(len(self.scheduled), 1)
+        delay, callback = self.scheduled[0]
+        self.assertEqual(delay, 0.25)
+        callback()
+        self.assertEqual(len(self.batches), 1)
+        self.coalescer.add(_event(3, _INSERT))
+        self.assertEqual(len(self.scheduled), 2)
+
+    def test_distinct_devices_keep_order(self):
+        batch = self._add_and_flush(
+            _event(3, _INSERT), _event(1, _UPDATE), _event(2, _REMOVE))
+        self.assertEqual([e.device_id for e in batch], [3, 1, 2])
+
+    def test_merged_devices_keep_order(self):
+        batch = self._add_and_flush(
+            _event(1, _INSERT, 'a'), _event(2, _INSERT), _event(1, _UPDATE),
+            _event(3, _REMOVE), _event(2, _UPDATE), _event(3, _INSERT))
+        self.assertEqual(
+            [(e.device_id, e.event) for e in batch],
+            [(1, _INSERT), (2, _INSERT), (3, _UPDATE)])
+
+    def test_flush_device(self):
+        self.coalescer.add(_event(1, _INSERT))
+        self.coalescer.add(_event(2, _INSERT, 'a'))
+        self.coalescer.add(_event(3, _INSERT))
+        self.coalescer.flush_device(2)
+        self.coalescer.flush_device(4)
+        self.assertEqual(self.batches, [[_event(2, _INSERT, 'a')]])
+
+        # The others are still delivered at the end of the window
+        self.coalescer.add(_event(2, _UPDATE, 'b'))
+        self.assertEqual(len(self.scheduled), 1)
+        self.scheduled[0][1]()
+        self.assertEqual(
+            [(e.device_id, e.event) for e in self.batches[-1]],
+            [(1, _INSERT), (3, _INSERT), (2, _UPDATE)])
+
+    def test_update_supersedes_insert(self):
+        batch = self._add_and_flush(
+            _event(1, _INSERT, 'a'), _event(1, _UPDATE, 'b'),
+            _event(1, _UPDATE, 'c'))
+        self.assertEqual(batch, [_event(1, _INSERT, 'c')])
+
+    def test_update_supersedes_present(self):
+        batch = self._add_and_flush(
+            _event(1, _PRESENT, 'a'), _event(1, _UPDATE, 'b'))
+        self.assertEqual(batch, [_event(1, _PRESENT, 'b')])
+
+    def test_updates_supersede_each_other(self):
+        batch = self._add_and_flush(
+            _event(1, _UPDATE, 'a'), _event(1, _UPDATE, 'b'))
+        self.assertEqual(batch, [_event(1, _UPDATE, 'b')])
+
+    def test_insert_then_remove_cancels_out(self):
+        batch = self._add_and_flush(
+            _event(1, _INSERT), _event(2, _INSERT), _event(1, _UPDATE),
+            _event(1, _REMOVE))
+        self.assertEqual(batch, [_event(2, _INSERT)])
+
+    def test_insert_then_remove_only_delivers_nothing(self):
+        self.assertIsNone(
+            self._add_and_flush(_event(1, _INSERT), _event(1, _REMOVE)))
+
+    def test_present_then_remove_is_remove(self):
+        batch = self._add_and_flush(
+            _event(1, _PRESENT, 'a'), _event(2, _INSERT),
+            _event(1, _UPDATE, 'b'), _event(1, _REMOVE, 'c'))
+        self.assertEqual(batch, [_event(1, _REMOVE, 'c'), _event(2, _INSERT)])
+
+    def test_update_then_remove_is_remove(self):
+        batch = self._add_and_flush(
+            _event(1, _UPDATE, 'a'), _event(1, _REMOVE, 'b'))
+        self.assertEqual(batch, [_event(1, _REMOVE, 'b')])
+
+    def test_remove_then_insert_is_update(self):
+        batch = self._add_and_flush(
+            _event(1, _REMOVE, 'a'), _event(1, _INSERT, 'b'))
+        self.assertEqual(batch, [_event(1, _UPDATE, 'b')])
+
+    def test_cancelled_device_reinserted_moves_to_end(self):
+        batch = self._add_and_flush(
+            _event(1, _INSERT), _event(2, _INSERT), _event(1, _REMOVE),
+            _event(1, _INSERT))
+        self.assertEqual(
+            [(e.device_id, e.event) for e in batch],
+            [(2, _INSERT), (1, _INSERT)])
+
+
+class _Device:
+    def __init__(self, device_id, rule):
+        self.device_id = device_id
+        self.rule = rule
+
+
+class TestDiffDeviceInventories(TestCase):
+    def test_no_changes(self):
+        old = [_Device(1, 'a'), _Device(2, 'b')]
+        new = [_Device(2, 'b'), _Device(1, 'a')]
+        diff = diff_device_inventories(old, new)
+        self.assertFalse(diff)
+        self.assertEqual(
+            (diff.inserted, diff.removed, diff.changed), ([], [], []))
+
+    def test_changes(self):
+        old = [_Device(1, 'a'), _Device(2, 'b'), _Device(3, 'c'),
+               _Device(4, 'd')]
+        new = [_Device(5, 'e'), _Device(2, 'b'), _Device(3, 'C'),
+               _Device(6, 'f'), _Device(1, 'A')]
+        diff = diff_device_inventories(old, new)
+        self.assertTrue(diff)
+        self.assertEqual([d.device_id for d in diff.inserted], [5, 6])
+        self.assertEqual([d.device_id for d in diff.removed], [4])
+        self.assertEqual([(d.device_id, d.rule) for d in diff.changed],
+                         [(3, 'C'), (1, 'A')])
+
+    def test_empty_inventories(self):
+        self.assertEqual(
+            [d.device_id for d in
+             diff_device_inventories([], [_Device(1, 'a')]).inserted], [1])
+        self.assertEqual(
+            [d.device_id for d in
+             diff_device_inventories([_Device(1, 'a')], []).removed], [1])
@@ -0,0 +1,318 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from unittest import skipUnless, TestCase
+
+try:
+    from PySide2.QtCore import QModelIndex, QPersistentModelIndex, Qt
+    from usbguard_simple_gui_py_qt.device import (Device,
+                                                  DeviceFilterProxyModel,
+                                                  DeviceModel,
+                                                  DeviceTreeModel)
+    _HAS_PYSIDE2 = True
+except ImportError:
+    _HAS_PYSIDE2 = False
+
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+
+def _device(device_id, target='block', name='dev'):
+    return Device(device_id, RuleParser.parse(
+        f'{target} id 0781:{device_id:04x} name "{name}{device_id}"'))
+
+
+@skipUnless(_HAS_PYSIDE2, 'requires PySide2')
+class TestDeviceModel(TestCase):
+    def setUp(self):
+        self.model = DeviceModel([_device(i) for i in (1, 2, 3)])
+        self.signals = []
+        self.model.rowsAboutToBeInserted.connect(
+            lambda _parent, first, last:
+                self.signals.append(('insert', first, last)))
+        self.model.rowsAboutToBeRemoved.connect(
+            lambda _parent, first, last:
+                self.signals.append(('remove', first, last)))
+        self.model.dataChanged.connect(
+            lambda top_left, bottom_right, _roles=None:
+                self.signals.append(
+                    ('changed', top_left.row(), top_left.column(),
+                     bottom_right.row(), bottom_right.column())))
+        self.model.modelReset.connect(
+            lambda: self.signals.append(('reset',)))
+
+    def _assert_consistent(self):
+        self.assertEqual(self.model.rowCount(), len(self.model.devices))
+        for row, device in enumerate(self.model.devices):
+            self.assertEqual(self.model.row_of_device(device.device_id), row)
+            self.assertEqual(
+                self.model.headerData(row, 2), device.device_id)
+            self.assertEqual(
+                [self.model.data(self.model.index(row, column))
+                 for column in (0, 1, 2)],
+                [device.rule.target.value,
+                 f'0781:{device.device_id:04x}',
+                 device.rule.name.values[0]])
+
+    def test_add(self):
+        self.model.update_or_add_device(_device(4))
+        self.assertEqual(self.signals, [('insert', 3, 3)])
+        self.assertEqual(self.model.devices[3].device_id, 4)
+        self._assert_consistent()
+
+    def test_update(self):
+        self.model.update_or_add_device(_device(2, 'allow'))
+        # Only the target column changed
+        self.assertEqual(self.signals, [('changed', 1, 0, 1, 0)])
+        self.assertEqual(
+            self.model.data(self.model.index(1, 0)), 'allow')
+        self._assert_consistent()
+
+    def test_update_changed_columns(self):
+        self.model.update_or_add_device(_device(2, 'allow', name='usb'))
+        self.model.update_or_add_device(Device(3, RuleParser.parse(
+            'block id 0781:0003 name "dev3" hash "abc" serial "123"')))
+        self.assertEqual(self.signals, [
+            ('changed', 1, 0, 1, 0),
+            ('changed', 1, 2, 1, 2),
+            ('changed', 2, 5, 2, 5),
+            ('changed', 2, 7, 2, 7),
+        ])
+        self.assertEqual(self.model.data(self.model.index(1, 2)), 'usb2')
+        self.assertEqual(self.model.data(self.model.index(2, 5)), 'abc')
+        self.assertEqual(self.model.data(self.model.index(2, 7)), '123')
+        self._assert_consistent()
+
+    def test_update_adjacent_columns(self):
+        self.model.update_or_add_device(Device(1, RuleParser.parse(
+            'allow id 0781:0002 name "dev1"')))
+        self.assertEqual(self.signals, [('changed', 0, 0, 0, 1)])
+
+    def test_update_unchanged(self):
+        self.model.update_or_add_device(_device(2))
+        self.assertEqual(self.signals, [])
+        self._assert_consistent()
+
+    def test_remove(self):
+        self.model.remove_device(_device(1))
+        self.assertEqual(self.signals, [('remove', 0, 0)])
+        self.assertEqual(
+            [d.device_id for d in self.model.devices], [2, 3])
+        self._assert_consistent()
+
+        self.model.remove_device(_device(1))
+        self.assertEqual(len(self.signals), 1)
+
+    def test_reset(self):
+        self.model.reset_devices([_device(7), _device(8)])
+        self.assertEqual(self.signals, [('reset',)])
+        self.assertIsNone(self.model.row_of_device(1))
+        self._assert_consistent()
+
+    def test_sync(self):
+        self.model.sync_devices(
+            [_device(3, 'allow'), _device(1), _device(5)])
+        self.assertNotIn(('reset',), self.signals)
+        self.assertEqual(
+            [(d.device_id, d.rule.target.value) for d in self.model.devices],
+            [(1, 'block'), (3, 'allow'), (5, 'block')])
+        self._assert_consistent()
+
+    def test_many_changes(self):
+        for i in range(4, 50):
+            self.model.update_or_add_device(_device(i))
+        for i in range(1, 50, 3):
+            self.model.remove_device(_device(i))
+        for i in range(2, 50, 5):
+            self.model.update_or_add_device(_device(i, 'reject'))
+        self._assert_consistent()
+        self.assertFalse(self.model.index(0, 0).parent().isValid())
+        self.assertEqual(self.model.rowCount(QModelIndex()), 35)
+
+    def test_cells_are_rendered_on_change_only(self):
+        renders = []
+        render = DeviceModel._render
+        self.model._render = lambda device: (renders.append(device.device_id),
+                                             render(device))[1]
+        for _ in range(3):
+            for row in range(self.model.rowCount()):
+                for column in range(self.model.columnCount()):
+                    self.model.data(self.model.index(row, column))
+        self.assertEqual(renders, [])
+
+        self.model.update_or_add_device(_device(2, 'allow'))
+        self.model.update_or_add_device(_device(9))
+        # The update only rendered the target cell again
+        self.assertEqual(renders, [9])
+        self.assertEqual(self.model.data(self.model.index(1, 0)), 'allow')
+        self.assertIsNone(
+            self.model.data(self.model.index(1, 0), Qt.ToolTipRole))
+
+
+@skipUnless(_HAS_PYSIDE2, 'requires PySide2')
+class TestDeviceFilterProxyModel(TestCase):
+    def setUp(self):
+        self.model = DeviceModel(
+            [_device(1), _device(2, name='usb'), _device(3)])
+        self.proxy = DeviceFilterProxyModel(self.model)
+
+    def _shown_device_ids(self):
+        return [
+            self.proxy.headerData(row, Qt.Vertical)
+            for row in range(self.proxy.rowCount())
+        ]
+
+    def test_no_filter(self):
+        self.assertEqual(self._shown_device_ids(), [1, 2, 3])
+        self.proxy.set_search_text('   ')
+        self.assertEqual(self._shown_device_ids(), [1, 2, 3])
+
+    def test_filter(self):
+        self.proxy.set_search_text('dev')
+        self.assertEqual(self._shown_device_ids(), [1, 3])
+        self.proxy.set_search_text('0781:0002')
+        self.assertEqual(self._shown_device_ids(), [2])
+        self.proxy.set_search_text('')
+        self.assertEqual(self._shown_device_ids(), [1, 2, 3])
+
+    def test_source_changes(self):
+        self.proxy.set_search_text('dev')
+        self.model.update_or_add_device(_device(4))
+        self.model.update_or_add_device(_device(5, name='usb'))
+        self.assertEqual(self._shown_device_ids(), [1, 3, 4])
+
+        self.model.update_or_add_device(_device(1, name='usb'))
+        self.model.update_or_add_device(_device(2))
+        self.assertEqual(self._shown_device_ids(), [2, 3, 4])
+
+        self.model.remove_device(_device(3))
+        self.assertEqual(self._shown_device_ids(), [2, 4])
+
+        self.model.reset_devices([_device(6), _device(7, name='usb')])
+        self.assertEqual(self._shown_device_ids(), [6])
+
+    def test_map_to_source(self):
+        self.proxy.set_search_text('dev')
+        self.assertEqual(
+            self.proxy.mapToSource(self.proxy.index(1, 0)).row(), 2)
+
+
+def _tree_device(device_id, device_hash, parent_hash, target='block'):
+    return Device(device_id, RuleParser.parse(
+        f'{target} id 0781:{device_id:04x} name "dev{device_id}" '
+        f'hash "{device_hash}" parent-hash "{parent_hash}"'))
+
+
+@skipUnless(_HAS_PYSIDE2, 'requires PySide2')
+class TestDeviceTreeModel(TestCase):
+    def setUp(self):
+        self.model = DeviceTreeModel([
+            _tree_device(2, 'kbd', 'hub'),
+            _tree_device(1, 'hub', 'root'),
+            _tree_device(3, 'mouse', 'hub'),
+        ])
+        self.signals = []
+        self.model.rowsAboutToBeInserted.connect(
+            lambda parent, first, last:
+                self.signals.append(('insert', self._id(parent), first)))
+        self.model.rowsAboutToBeMoved.connect(
+            lambda parent, first, _last, new_parent, new_row:
+                self.signals.append(
+                    ('move', self._id(parent), first,
+                     self._id(new_parent), new_row)))
+        self.model.rowsAboutToBeRemoved.connect(
+            lambda parent, first, _last:
+                self.signals.append(('remove', self._id(parent), first)))
+        self.model.dataChanged.connect(
+            lambda top_left, bottom_right, _roles=None:
+                self.signals.append(
+                    ('changed', self._id(top_left), top_left.column(),
+                     bottom_right.column())))
+
+    def _id(self, index):
+        if not index.isValid():
+            return None
+        return self.model.data(self.model.index(
+            index.row(), 1, index.parent()))
+
+    def _tree(self, parent=None):
+        parent = parent or QModelIndex()
+        tree = {}
+        for row in range(self.model.rowCount(parent)):
+            index = self.model.index(row, 0, parent)
+            self.assertEqual(self.model.parent(index), parent)
+            device = self.model.device_at(index)
+            self.assertEqual(
+                self.model.data(self.model.index(row, 2, parent)),
+                f'dev{device.device_id}')
+            tree[device.device_id] = self._tree(index)
+        return tree
+
+    def test_initial_tree(self):
+        self.assertEqual(self._tree(), {1: {2: {}, 3: {}}})
+        self.assertEqual(self.model.headerData(0, Qt.Horizontal), 'Target')
+        self.assertFalse(self.model.index(5, 0).isValid())
+
+    def test_hub_unplugged_and_plugged(self):
+        keyboard = QPersistentModelIndex(self.model.index_of_device(2))
+        self.model.remove_device(_tree_device(1, 'hub', 'root'))
+        self.assertEqual(self._tree(), {2: {}, 3: {}})
+        self.assertEqual(self.signals, [
+            ('move', '0781:0001', 0, None, 1),
+            ('move', '0781:0001', 0, None, 2),
+            ('remove', None, 0),
+        ])
+        # The views keep track of the moved rows
+        self.assertEqual(self.model.device_at(keyboard).device_id, 2)
+
+        self.signals.clear()
+        self.model.update_or_add_device(_tree_device(1, 'hub', 'root'))
+        self.assertEqual(self._tree(), {1: {2: {}, 3: {}}})
+        self.assertEqual(self.signals, [
+            ('insert', None, 2),
+            ('move', None, 0, '0781:0001', 0),
+            ('move', None, 0, '0781:0001', 1),
+        ])
+        self.assertEqual(self.model.device_at(keyboard).device_id, 2)
+
+    def test_update(self):
+        self.model.update_or_add_device(_tree_device(3, 'mouse', 'hub',
+                                                     'allow'))
+        self.assertEqual(self.signals, [('changed', '0781:0003', 0, 0)])
+        self.assertEqual(
+            self.model.data(self.model.index_of_device(3)), 'allow')
+
+    def test_update_moves_device(self):
+        self.model.update_or_add_device(_tree_device(3, 'mouse', 'kbd'))
+        self.assertEqual(self._tree(), {1: {2: {3: {}}}})
+
+    def test_sync(self):
+        self.model.sync_devices([
+            _tree_device(1, 'hub', 'root'),
+            _tree_device(3, 'mouse', 'hub', 'allow'),
+            _tree_device(4, 'hub2', 'hub'),
+            _tree_device(5, 'disk', 'hub2'),
+        ])
+        self.assertEqual(self._tree(), {1: {3: {}, 4: {5: {}}}})
+
+    def test_reset(self):
+        self.model.reset_devices([_tree_device(5, 'disk', 'hub2')])
+        self.assertEqual(self._tree(), {5: {}})
+        self.assertEqual(self.signals, [])
+        self.model.update_or_add_device(_tree_device(4, 'hub2', 'hub'))
+        self.assertEqual(self._tree(), {4: {5: {}}})
@@ -0,0 +1,69 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.device_policy_batch import DevicePolicyBatch
+from usbguard_simple_gui_py_qt.rules import RuleTarget
+
+_CHANGES = [
+    (1, RuleTarget.ALLOW, False),
+    (2, RuleTarget.BLOCK, True),
+    (3, RuleTarget.REJECT, False),
+]
+
+
+class TestDevicePolicyBatch(TestCase):
+    def setUp(self):
+        self.now = 10.0
+        self.done = []
+        self.batch = DevicePolicyBatch(
+            _CHANGES, self.done.append, clock=lambda: self.now)
+        self.batch.start()
+
+    def test_done_after_all_answers_in_any_order(self):
+        error = Exception('denied')
+        self.batch.reply_handler(2)(None)
+        self.batch.error_handler(0)(error)
+        self.assertEqual(self.done, [])
+        self.now = 10.5
+        self.batch.reply_handler(1)(42)
+
+        self.assertEqual(len(self.done), 1)
+        batch_result = self.done[0]
+        self.assertEqual(batch_result.elapsed, 0.5)
+        self.assertEqual(
+            [(r.device_id, r.target, r.permanent, r.rule_id, r.error)
+             for r in batch_result.results],
+            [(1, RuleTarget.ALLOW, False, None, error),
+             (2, RuleTarget.BLOCK, True, 42, None),
+             (3, RuleTarget.REJECT, False, None, None)])
+        self.assertEqual(
+            [r.device_id for r in batch_result.failures], [1])
+
+    def test_duplicate_answer(self):
+        self.batch.reply_handler(0)(None)
+        with self.assertRaises(Exception):
+            self.batch.error_handler(0)(Exception())
+
+    def test_empty_batch(self):
+        done = []
+        DevicePolicyBatch([], done.append).start()
+        self.assertEqual(len(done), 1)
+        self.assertEqual(done[0].results, [])
+        self.assertEqual(done[0].failures, [])
@@ -0,0 +1,110 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.device_search import DeviceSearchIndex
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+_RULES = {
+    1: 'allow id 0781:5581 serial "4C530001" name "Ultra Fit" hash "abcDEF"',
+    2: 'block id 1d6b:0002 name "xHCI Host Controller" hash "h2"',
+    3: 'block id 0781:5583 serial "4C530002" name "Ultra Flair"',
+    4: 'allow id *:* name "Anything"',
+}
+
+
+class TestDeviceSearchIndex(TestCase):
+    def setUp(self):
+        self.index = DeviceSearchIndex()
+        for device_id, rule in _RULES.items():
+            self.index.add(device_id, RuleParser.parse(rule))
+
+    def test_blank_query(self):
+        self.assertEqual(self.index.search(''), {1, 2, 3, 4})
+        self.assertEqual(self.index.search('  '), {1, 2, 3, 4})
+
+    def test_substring(self):
+        self.assertEqual(self.index.search('ultra'), {1, 3})
+        self.assertEqual(self.index.search('FLAIR'), {3})
+        self.assertEqual(self.index.search('host con'), {2})
+        self.assertEqual(self.index.search('4c5300'), {1, 3})
+        self.assertEqual(self.index.search('cde'), {1})
+        self.assertEqual(self.index.search('ultra fix'), set())
+
+    def test_ngrams_must_be_contiguous(self):
+        index = DeviceSearchIndex()
+        index.add(1, RuleParser.parse('allow name "abab cabc"'))
+        # Every n-gram of "ababc" is in the name, but not the whole term
+        self.assertEqual(index.search('ababc'), set())
+        self.assertEqual(index.search('abab'), {1})
+
+    def test_short_terms(self):
+        self.assertEqual(self.index.search('h2'), {2})
+        self.assertEqual(self.index.search('u'), {1, 3})
+        self.assertEqual(self.index.search('ultra it'), {1})
+
+    def test_device_id(self):
+        self.assertEqual(self.index.search('0781:5581'), {1})
+        self.assertEqual(self.index.search('0781:'), {1, 3})
+        self.assertEqual(self.index.search('0781'), {1, 3})
+        self.assertEqual(self.index.search(':5583'), {3})
+        self.assertEqual(self.index.search('0781 flair'), {3})
+        # Only exact: not a prefix of the vendor or product
+        self.assertEqual(self.index.search('078'), set())
+        self.assertEqual(self.index.search('*:*'), set())
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.index.search('1d6b:0002 host'), {2})
+        self.assertEqual(self.index.search('1d6b:0002 ultra'), set())
+
+    def test_update(self):
+        version = self.index.version
+        self.index.add(3, RuleParser.parse('allow id 0781:5583 name "Cruzer"'))
+        self.assertNotEqual(self.index.version, version)
+        self.assertEqual(self.index.search('ultra'), {1})
+        self.assertEqual(self.index.search('cruzer'), {3})
+        self.assertEqual(len(self.index), 4)
+
+    def test_update_with_same_attributes(self):
+        version = self.index.version
+        # Only the target changed: nothing to index again
+        self.index.add(
+            1, RuleParser.parse(_RULES[1].replace('allow', 'block')))
+        self.assertEqual(self.index.version, version)
+
+    def test_remove(self):
+        self.index.remove(1)
+        self.index.remove(1)
+        self.index.remove(100)
+        self.assertNotIn(1, self.index)
+        self.assertEqual(self.index.search('ultra'), {3})
+        self.assertEqual(self.index.search('0781'), {3})
+        self.assertEqual(len(self.index), 3)
+
+    def test_remove_all_clears_the_lookups(self):
+        for device_id in _RULES:
+            self.index.remove(device_id)
+        self.assertEqual(self.index._ngrams, {})
+        self.assertEqual(self.index._ids, {})
+
+    def test_clear(self):
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.search('ultra'), set())
+        self.assertEqual(self.index.search(''), set())
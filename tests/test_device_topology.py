@@ -0,0 +1,196 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.device_topology import (DeviceTopology,
+                                                       DeviceTopologyListener)
+
+
+class _RecordingListener(DeviceTopologyListener):
+    def __init__(self):
+        self.events = []
+
+    def before_insert(self, parent, row):
+        self.events.append(('insert', parent, row))
+
+    def before_move(self, parent, row, new_parent, new_row):
+        self.events.append(('move', parent, row, new_parent, new_row))
+
+    def before_remove(self, parent, row):
+        self.events.append(('remove', parent, row))
+
+
+class TestDeviceTopology(TestCase):
+    def setUp(self):
+        self.listener = _RecordingListener()
+        self.topology = DeviceTopology(self.listener)
+
+    def _tree(self, parent=None):
+        return {
+            device_id: self._tree(device_id)
+            for device_id in self.topology.children_of(parent)
+        }
+
+    def _assert_consistent(self):
+        seen = []
+
+        def check(parent):
+            for row, device_id in enumerate(
+                    self.topology.children_of(parent)):
+                self.assertEqual(self.topology.row_of(device_id), row)
+                self.assertEqual(self.topology.parent_of(device_id), parent)
+                seen.append(device_id)
+                check(device_id)
+
+        check(None)
+        self.assertEqual(len(seen), len(self.topology))
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_parent_first(self):
+        self.topology.add(1, 'hub', 'root')
+        self.topology.add(2, 'kbd', 'hub')
+        self.topology.add(3, 'mouse', 'hub')
+        self.assertEqual(self._tree(), {1: {2: {}, 3: {}}})
+        self.assertEqual(self.listener.events, [
+            ('insert', None, 0), ('insert', 1, 0), ('insert', 1, 1)])
+        self._assert_consistent()
+
+    def test_children_first(self):
+        self.topology.add(2, 'kbd', 'hub')
+        self.topology.add(4, 'other', 'elsewhere')
+        self.topology.add(3, 'mouse', 'hub')
+        self.topology.add(1, 'hub', 'root')
+        self.assertEqual(self._tree(), {4: {}, 1: {2: {}, 3: {}}})
+        self.assertEqual(self.listener.events, [
+            ('insert', None, 0),
+            ('insert', None, 1),
+            ('insert', None, 2),
+            ('insert', None, 3),
+            ('move', None, 0, 1, 0),
+            ('move', None, 1, 1, 1),
+        ])
+        self._assert_consistent()
+
+    def test_nested_hubs(self):
+        self.topology.add(3, 'dev', 'hub2')
+        self.topology.add(2, 'hub2', 'hub1')
+        self.topology.add(1, 'hub1', 'root')
+        self.assertEqual(self._tree(), {1: {2: {3: {}}}})
+        self._assert_consistent()
+
+    def test_remove_hub(self):
+        self.topology.add(1, 'hub', 'root')
+        self.topology.add(2, 'kbd', 'hub')
+        self.topology.add(3, 'mouse', 'hub')
+        self.topology.add(4, 'other', None)
+        self.listener.events.clear()
+
+        self.topology.remove(1)
+        self.assertEqual(self._tree(), {4: {}, 2: {}, 3: {}})
+        self.assertEqual(self.listener.events, [
+            ('move', 1, 0, None, 2),
+            ('move', 1, 0, None, 3),
+            ('remove', None, 0),
+        ])
+        self._assert_consistent()
+
+        # Plugged back
+        self.topology.add(1, 'hub', 'root')
+        self.assertEqual(self._tree(), {4: {}, 1: {2: {}, 3: {}}})
+        self._assert_consistent()
+
+    def test_remove_leaf(self):
+        self.topology.add(1, 'hub', 'root')
+        self.topology.add(2, 'kbd', 'hub')
+        self.topology.add(3, 'mouse', 'hub')
+        self.topology.remove(2)
+        self.topology.remove(2)
+        self.assertEqual(self._tree(), {1: {3: {}}})
+        self.assertNotIn(2, self.topology)
+        self._assert_consistent()
+
+    def test_same_hash(self):
+        # Two identical hubs
+        self.topology.add(1, 'hub', 'root')
+        self.topology.add(2, 'hub', 'root')
+        self.topology.add(3, 'kbd', 'hub')
+        self.assertEqual(self._tree(), {1: {3: {}}, 2: {}})
+
+        self.topology.remove(1)
+        self.assertEqual(self._tree(), {2: {3: {}}})
+        self._assert_consistent()
+
+    def test_cycles(self):
+        self.topology.add(1, 'self', 'self')
+        self.topology.add(2, 'a', 'b')
+        self.topology.add(3, 'b', 'a')
+        self.assertEqual(self._tree(), {1: {}, 2: {3: {}}})
+        self._assert_consistent()
+
+        self.topology.remove(2)
+        self.assertEqual(self._tree(), {1: {}, 3: {}})
+        self._assert_consistent()
+
+    def test_update(self):
+        self.topology.add(1, 'hub', 'root')
+        self.topology.add(2, 'kbd', 'hub')
+        self.listener.events.clear()
+
+        self.topology.add(2, 'kbd', 'hub')
+        self.assertEqual(self.listener.events, [])
+
+        self.topology.add(2, 'kbd', None)
+        self.assertEqual(self._tree(), {1: {}, 2: {}})
+        self._assert_consistent()
+
+    def test_without_hashes(self):
+        self.topology.add(1, None, None)
+        self.topology.add(2, None, 'missing')
+        self.topology.remove(1)
+        self.assertEqual(self._tree(), {2: {}})
+        self._assert_consistent()
+
+    def test_clear(self):
+        self.topology.add(1, 'hub', 'root')
+        self.topology.add(2, 'kbd', 'hub')
+        self.listener.events.clear()
+        self.topology.clear()
+        self.assertEqual(len(self.topology), 0)
+        self.assertEqual(self._tree(), {})
+        self.assertEqual(self.listener.events, [])
+
+        self.topology.add(2, 'kbd', 'hub')
+        self.assertEqual(self._tree(), {2: {}})
+
+    def test_many_changes(self):
+        # Hubs 0-9, each with 10 devices, added in a scrambled order
+        devices = [
+            (hub * 100 + i, f'd{hub}.{i}', f'h{hub}')
+            for hub in range(10) for i in range(1, 11)
+        ] + [(hub * 100, f'h{hub}', 'root') for hub in range(10)]
+        for device in devices[::2] + devices[1::2]:
+            self.topology.add(*device)
+        self._assert_consistent()
+        self.assertEqual(len(self.topology.children_of(None)), 10)
+        self.assertEqual(len(self.topology.children_of(300)), 10)
+
+        for hub in range(0, 10, 2):
+            self.topology.remove(hub * 100)
+        self._assert_consistent()
+        self.assertEqual(len(self.topology.children_of(None)), 55)
@@ -0,0 +1,76 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from threading import current_thread, main_thread
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.event_worker import EventWorker, TimingStats
+
+
+class TestEventWorker(TestCase):
+    def setUp(self):
+        self.delivered = []
+        self.errors = []
+        self.worker = EventWorker(self.delivered.append, self.errors.append)
+
+    def _run_deliveries(self):
+        self.worker.stop()
+        for delivery in self.delivered:
+            delivery()
+
+    def test_jobs_run_in_order_on_worker_thread(self):
+        results = []
+        for i in range(20):
+            self.worker.submit(
+                lambda i=i: results.append((i, current_thread())))
+        self.worker.stop()
+        self.assertEqual([i for i, _ in results], list(range(20)))
+        self.assertTrue(all(t is not main_thread() for _, t in results))
+        # Jobs returning nothing deliver nothing
+        self.assertEqual(self.delivered, [])
+
+    def test_results_are_delivered(self):
+        results = []
+        self.worker.submit(lambda: lambda: results.append(1))
+        self.worker.submit(lambda: lambda: results.append(2))
+        self._run_deliveries()
+        self.assertEqual(results, [1, 2])
+
+    def test_errors_are_delivered(self):
+        error = ValueError('invalid')
+
+        def failing_job():
+            raise error
+
+        self.worker.submit(failing_job)
+        self.worker.submit(lambda: None)
+        self._run_deliveries()
+        self.assertEqual(self.errors, [error])
+
+
+class TestTimingStats(TestCase):
+    def test_stats(self):
+        stats = TimingStats()
+        self.assertEqual(stats.mean, 0)
+        for duration in (0.5, 2.0, 0.5):
+            stats.add(duration)
+        self.assertEqual(
+            (stats.count, stats.total, stats.max, stats.mean),
+            (3, 3.0, 2.0, 1.0))
+        stats.clear()
+        self.assertEqual((stats.count, stats.total, stats.max), (0, 0, 0))
@@ -0,0 +1,98 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+import os
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+from unittest.mock import patch
+from usbguard_simple_gui_py_qt.parallel_rule_parsing import (
+    decode_rule,
+    encode_rule,
+    parse_file_parallel,
+    parse_files_parallel,
+    parse_many_parallel)
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser, RuleParsingError
+
+LINES = [
+    '# generated policy',
+    'allow id 1d6b:0002 serial "0000:00:14.0" name "xHCI Host Controller"',
+    '',
+    'allow id *:* with-interface one-of { 03:00:01 03:01:* 08:*:* }',
+    'block id 123:1234',
+    'reject hash equals-ordered { "a" "b" } via-port "1-2"',
+    'allow with-connect-type "hotplug"',
+] * 50
+
+
+def _comparable(results):
+    return [
+        (line_no, str(result) if isinstance(result, RuleParsingError)
+            else result)
+        for line_no, result in results
+    ]
+
+
+class TestParallelRuleParsing(TestCase):
+    def _write_file(self, lines) -> str:
+        with NamedTemporaryFile('w', suffix='.conf', delete=False) as file:
+            file.write('\n'.join(lines))
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_compact_rule_round_trip(self):
+        for _, rule in RuleParser.parse_many(LINES[:7]):
+            if not isinstance(rule, RuleParsingError):
+                self.assertEqual(decode_rule(encode_rule(rule)), rule)
+
+    def test_file_matches_sequential_parsing(self):
+        path = self._write_file(LINES)
+        expected = _comparable(RuleParser.iter_file(path))
+        results = parse_file_parallel(
+            path, max_workers=2, chunk_size=500, min_parallel_size=0)
+        self.assertEqual(_comparable(results), expected)
+        self.assertIsInstance(results[2][1], RuleParsingError)
+
+    def test_many_files_keep_their_order(self):
+        paths = [self._write_file(LINES[i:]) for i in range(3)]
+        results = parse_files_parallel(
+            paths, max_workers=2, chunk_size=300, min_parallel_size=0)
+        self.assertEqual(
+            [_comparable(r) for r in results],
+            [_comparable(RuleParser.iter_file(path)) for path in paths])
+
+    def test_small_input_is_parsed_in_process(self):
+        path = self._write_file(LINES)
+        with patch('usbguard_simple_gui_py_qt.parallel_rule_parsing.'
+                   'ProcessPoolExecutor') as executor:
+            results = parse_file_parallel(path, max_workers=2)
+            lines_results = parse_many_parallel(LINES, max_workers=2)
+        executor.assert_not_called()
+        self.assertEqual(
+            _comparable(results), _comparable(RuleParser.iter_file(path)))
+        self.assertEqual(
+            _comparable(lines_results),
+            _comparable(RuleParser.parse_many(LINES)))
+
+    def test_lines_match_sequential_parsing(self):
+        results = parse_many_parallel(
+            LINES, first_line_no=5, max_workers=2, chunk_size=40,
+            min_parallel_size=0)
+        self.assertEqual(
+            _comparable(results),
+            _comparable(RuleParser.parse_many(LINES, first_line_no=5)))
@@ -0,0 +1,227 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from random import Random
+from unittest import TestCase
+from usbguard_simple_gui_py_qt import policy_analysis
+from usbguard_simple_gui_py_qt.policy_analysis import (analyze_policy,
+                                                       PolicyIssue,
+                                                       PolicyIssueType,
+                                                       rule_covers,
+                                                       rules_may_overlap)
+from usbguard_simple_gui_py_qt.rule_matching import rule_applies_to
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+
+def _analyze(*rules):
+    return analyze_policy([RuleParser.parse(rule) for rule in rules])
+
+
+class TestAnalyzePolicy(TestCase):
+    def test_clean_policy(self):
+        self.assertEqual(_analyze(
+            'allow id 046d:c52b',
+            'allow id 046d:c52c',
+            'reject id 046d:*',
+            'block',
+        ), [])
+
+    def test_duplicate(self):
+        self.assertEqual(_analyze(
+            'allow id 046d:c52b name "a"',
+            'block id 1234:*',
+            'allow name "a" id 046d:c52b',
+        ), [PolicyIssue(PolicyIssueType.DUPLICATE, 2, 0)])
+
+    def test_duplicate_with_different_target_is_shadowed(self):
+        self.assertEqual(_analyze(
+            'allow id 046d:c52b',
+            'block id 046d:c52b',
+        ), [PolicyIssue(PolicyIssueType.SHADOWED, 1, 0)])
+
+    def test_shadowed_by_wildcards(self):
+        self.assertEqual(_analyze(
+            'allow id 046d:*',
+            'block id 046d:c52b name "Receiver"',
+            'allow id *:* with-interface one-of { 03:*:* }',
+            'block id 1234:5678 with-interface { 03:01:01 08:06:50 }',
+        ), [PolicyIssue(PolicyIssueType.SHADOWED, 1, 0),
+            PolicyIssue(PolicyIssueType.CONFLICT, 2, 1),
+            PolicyIssue(PolicyIssueType.SHADOWED, 3, 2)])
+
+    def test_shadowed_by_catch_all(self):
+        self.assertEqual(_analyze('block', 'allow id 1234:5678'),
+                         [PolicyIssue(PolicyIssueType.SHADOWED, 1, 0)])
+
+    def test_conflict(self):
+        self.assertEqual(_analyze(
+            'allow id 046d:* with-interface one-of { 03:01:* 03:00:* }',
+            'block id *:* with-interface one-of { 03:01:02 08:*:* }',
+        ), [PolicyIssue(PolicyIssueType.CONFLICT, 1, 0)])
+
+    def test_no_conflict_for_special_cases(self):
+        self.assertEqual(_analyze(
+            'allow id 046d:c52b hash "x"',
+            'block id 046d:*',
+        ), [])
+
+    def test_no_conflict_for_disjoint_rules(self):
+        self.assertEqual(_analyze(
+            'allow id 046d:* with-interface one-of { 03:*:* }',
+            'block id 1234:* with-interface one-of { 03:*:* }',
+            'block id 046d:* with-interface none-of { 03:*:* }',
+            'allow id 1234:0001 hash "a" with-interface none-of { 03:*:* }',
+        ), [])
+        self.assertEqual(_analyze(
+            'reject hash "b" with-interface equals { 03:01:01 03:01:02 }',
+            'allow hash "b" with-interface equals { 03:01:01 }',
+            'allow hash "c" with-interface { 03:01:01 03:01:02 }',
+        ), [])
+
+    def test_results_agree_with_matching(self):
+        random = Random(3)
+        ids = ['046d:c52b', '046d:c52c', '046d:*', '1234:0001', '*:*']
+        hashes = ['"a"', '"b"']
+        ifaces = ['03:01:01', '03:01:*', '03:*:*', '08:06:50', '09:00:00']
+        operators = ['', 'one-of ', 'all-of ', 'none-of ', 'equals ',
+                     'equals-ordered ']
+
+        def random_rule():
+            parts = [random.choice(['allow', 'block'])]
+            if random.random() < 0.7:
+                parts.append('id %s{ %s }' % (
+                    random.choice(operators),
+                    ' '.join(random.sample(ids, random.randint(1, 2)))))
+            if random.random() < 0.3:
+                parts.append('hash %s{ %s }' % (
+                    random.choice(operators),
+                    ' '.join(random.sample(hashes, random.randint(1, 2)))))
+            if random.random() < 0.6:
+                parts.append('with-interface %s{ %s }' % (
+                    random.choice(operators),
+                    ' '.join(random.sample(ifaces, random.randint(1, 3)))))
+            return RuleParser.parse(' '.join(parts))
+
+        devices = [
+            RuleParser.parse(
+                f'allow id {device_id} hash {device_hash} '
+                f'with-interface {{ {" ".join(device_ifaces)} }}')
+            for device_id in ['046d:c52b', '046d:c52c', '1234:0001',
+                              '1234:0002', 'abcd:0001']
+            for device_hash in hashes
+            for device_ifaces in [['03:01:01'], ['08:06:50'],
+                                  ['03:01:01', '03:00:00'],
+                                  ['09:00:00', '03:01:02', '08:06:50']]
+        ]
+
+        policy = [random_rule() for _ in range(150)]
+
+        for issue in analyze_policy(policy):
+            rule = policy[issue.rule_index]
+            other = policy[issue.other_rule_index]
+            self.assertLess(issue.other_rule_index, issue.rule_index)
+            if issue.issue_type is PolicyIssueType.CONFLICT:
+                self.assertIsNot(rule.target, other.target)
+                continue
+            # Shadowed rules are dead
+            for device in devices:
+                if rule_applies_to(rule, device):
+                    self.assertTrue(rule_applies_to(other, device))
+
+        # Every pair of rules matching a common device is either unrelated
+        # by the index or reported as overlapping
+        for i, rule in enumerate(policy):
+            for other in policy[:i]:
+                if any(rule_applies_to(rule, device)
+                       and rule_applies_to(other, device)
+                       for device in devices):
+                    self.assertTrue(rules_may_overlap(other, rule))
+                if rule_covers(other, rule):
+                    self.assertTrue(all(
+                        rule_applies_to(other, device)
+                        for device in devices
+                        if rule_applies_to(rule, device)))
+
+    def test_interface_only_rules(self):
+        self.assertEqual(_analyze(
+            'allow with-interface equals { 08:06:* }',
+            'block with-interface equals { 03:01:* }',
+            'block with-interface equals { 08:06:50 }',
+            'allow with-interface one-of { 03:01:01 09:*:* }',
+            'allow with-interface { 09:00:00 }',
+        ), [PolicyIssue(PolicyIssueType.SHADOWED, 2, 0),
+            PolicyIssue(PolicyIssueType.CONFLICT, 3, 1),
+            PolicyIssue(PolicyIssueType.SHADOWED, 4, 3)])
+
+    def test_index_agrees_with_all_pairs(self):
+        random = Random(5)
+        ifaces = ['03:01:01', '03:01:*', '03:*:*', '08:06:50', '08:06:*',
+                  '09:00:00', 'e0:01:01']
+        operators = ['', 'one-of ', 'all-of ', 'none-of ', 'equals ',
+                     'equals-ordered ']
+        policy = []
+        for _ in range(300):
+            rule = random.choice(['allow', 'block'])
+            if random.random() < 0.2:
+                rule += ' hash "%d"' % random.randrange(3)
+            if random.random() < 0.9:
+                rule += ' with-interface %s{ %s }' % (
+                    random.choice(operators),
+                    ' '.join(random.sample(ifaces, random.randint(1, 3))))
+            policy.append(RuleParser.parse(rule))
+
+        expected = []
+        first_by_attributes = {}
+        for index, rule in enumerate(policy):
+            identical_index = first_by_attributes.setdefault(
+                frozenset(rule.attributes.values()), index)
+            if identical_index != index:
+                expected.append(PolicyIssue(
+                    PolicyIssueType.DUPLICATE
+                    if policy[identical_index].target is rule.target
+                    else PolicyIssueType.SHADOWED,
+                    index, identical_index))
+            else:
+                expected.extend(policy_analysis._compare_with_earlier_rules(
+                    policy, index, rule, range(index)))
+
+        self.assertEqual(analyze_policy(policy), expected)
+
+    def test_interface_only_policy_is_not_quadratic(self):
+        compared = []
+        compare = policy_analysis._compare_with_earlier_rules
+
+        def counting_compare(policy, index, rule, candidates):
+            candidates = list(candidates)
+            compared.append(len(candidates))
+            return compare(policy, index, rule, candidates)
+
+        policy = [
+            RuleParser.parse(
+                f'allow with-interface equals {{ {i % 256:02x}:'
+                f'{i // 256:02x}:* }}')
+            for i in range(2000)
+        ]
+        policy_analysis._compare_with_earlier_rules = counting_compare
+        try:
+            self.assertEqual(analyze_policy(policy), [])
+        finally:
+            policy_analysis._compare_with_earlier_rules = compare
+        # Only the rules of the same interface class are compared
+        self.assertLessEqual(max(compared), 2000 // 256)
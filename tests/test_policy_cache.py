@@ -0,0 +1,91 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.policy_cache import (DEFAULT_RULE_ID,
+                                                    IMPLICIT_RULE_ID,
+                                                    is_reserved_rule_id,
+                                                    LAST_RULE_ID,
+                                                    PolicyCache,
+                                                    ROOT_RULE_ID)
+from usbguard_simple_gui_py_qt.rule_parsing import (RuleParser,
+                                                    RuleParsingError)
+
+
+class TestPolicyCache(TestCase):
+    def setUp(self):
+        self.rule_1 = RuleParser.parse('allow id 046d:c52b')
+        self.rule_2 = RuleParser.parse('block with-interface 08:*:*')
+        self.cache = PolicyCache()
+        self.cache.load([
+            (1, self.rule_1),
+            (2, self.rule_2),
+            (3, RuleParsingError('invalid rule')),
+        ])
+
+    def test_unloaded(self):
+        cache = PolicyCache()
+        self.assertFalse(cache.is_loaded)
+        self.assertEqual(len(cache), 0)
+        self.assertFalse(cache.contains(1))
+        self.assertIsNone(cache.get(1))
+        cache.add(1, self.rule_1)
+        cache.remove(1)
+        self.assertFalse(cache.is_loaded)
+
+    def test_get(self):
+        self.assertTrue(self.cache.is_loaded)
+        self.assertEqual(len(self.cache), 3)
+        self.assertIs(self.cache.get(1), self.rule_1)
+        self.assertIs(self.cache.get(2), self.rule_2)
+        self.assertIsNone(self.cache.get(4))
+
+    def test_unparsable_rule_is_known(self):
+        self.assertTrue(self.cache.contains(3))
+        self.assertIsNone(self.cache.get(3))
+
+    def test_add_and_remove(self):
+        rule_4 = RuleParser.parse('reject id *:*')
+        self.cache.add(4, rule_4)
+        self.assertIs(self.cache.get(4), rule_4)
+        self.cache.remove(1)
+        self.assertFalse(self.cache.contains(1))
+        self.cache.remove(1)
+        self.assertEqual(len(self.cache), 3)
+
+    def test_load_replaces_rules(self):
+        self.cache.load([(5, self.rule_1)])
+        self.assertFalse(self.cache.contains(1))
+        self.assertIs(self.cache.get(5), self.rule_1)
+
+    def test_invalidate(self):
+        self.cache.invalidate()
+        self.assertFalse(self.cache.is_loaded)
+        self.assertIsNone(self.cache.get(1))
+
+
+class TestReservedRuleIds(TestCase):
+    def test_reserved(self):
+        for rule_id in (DEFAULT_RULE_ID, ROOT_RULE_ID, LAST_RULE_ID,
+                        IMPLICIT_RULE_ID):
+            self.assertTrue(is_reserved_rule_id(rule_id))
+
+    def test_regular(self):
+        for rule_id in (0, 1, 1000, IMPLICIT_RULE_ID - 1):
+            self.assertFalse(is_reserved_rule_id(rule_id))
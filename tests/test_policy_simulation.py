@@ -0,0 +1,138 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+import os
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from types import SimpleNamespace
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.policy_simulation import (
+    load_device_inventory,
+    main,
+    simulate_policy,
+    write_device_inventory)
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser, RuleParsingError
+from usbguard_simple_gui_py_qt.rules import RuleTarget
+
+INVENTORY = [
+    (1, RuleParser.parse(
+        'allow id 1d6b:0002 name "Root Hub" with-interface 09:00:00')),
+    (4, RuleParser.parse(
+        'block id 046d:c52b name "Receiver" '
+        'with-interface { 03:01:01 03:01:02 }')),
+    (7, RuleParser.parse(
+        'allow id 0781:5581 name "Flash Drive" with-interface 08:06:50')),
+]
+
+POLICY = '''
+allow with-interface equals { 09:00:00 }
+allow id 046d:*
+
+reject with-interface one-of { 08:*:* }
+'''
+
+
+class TestPolicySimulation(TestCase):
+    def _write_file(self, content: str) -> str:
+        with NamedTemporaryFile('w', delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_simulate_policy(self):
+        policy = [rule for _, rule in RuleParser.parse_many(
+            POLICY.splitlines())]
+        changes = simulate_policy(policy, INVENTORY)
+        self.assertEqual(
+            [(c.device_id, c.old_target, c.new_target, c.rule_index)
+             for c in changes],
+            [(4, RuleTarget.BLOCK, RuleTarget.ALLOW, 1),
+             (7, RuleTarget.ALLOW, RuleTarget.REJECT, 2)])
+
+    def test_implicit_target(self):
+        changes = simulate_policy([], INVENTORY, RuleTarget.ALLOW)
+        self.assertEqual([(c.device_id, c.rule_index) for c in changes],
+                         [(4, None)])
+
+    def test_identical_devices_share_results(self):
+        inventory = INVENTORY * 3
+        policy = [RuleParser.parse('reject id 0781:*')]
+        self.assertEqual(
+            [c.device_id for c in simulate_policy(policy, inventory)],
+            [1, 7, 1, 7, 1, 7])
+
+    def test_inventory_round_trip(self):
+        stream = StringIO()
+        write_device_inventory(
+            [SimpleNamespace(device_id=i, rule=r) for i, r in INVENTORY],
+            stream)
+        path = self._write_file(stream.getvalue())
+        self.assertEqual(load_device_inventory(path), INVENTORY)
+
+    def test_invalid_inventory(self):
+        path = self._write_file('1: allow\nallow id 1234:5678\n')
+        with self.assertRaisesRegex(RuleParsingError, ':2: '):
+            load_device_inventory(path)
+
+    def test_main(self):
+        rules_path = self._write_file(POLICY)
+        stream = StringIO()
+        write_device_inventory(
+            [SimpleNamespace(device_id=i, rule=r) for i, r in INVENTORY],
+            stream)
+        inventory_path = self._write_file(stream.getvalue())
+
+        stdout = StringIO()
+        with redirect_stdout(stdout), redirect_stderr(StringIO()):
+            exit_code = main([rules_path, inventory_path])
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(stdout.getvalue().splitlines(), [
+            f'4 "Receiver": block -> allow ({rules_path}:3)',
+            f'7 "Flash Drive": allow -> reject ({rules_path}:5)',
+        ])
+
+    def test_main_with_invalid_policy(self):
+        rules_path = self._write_file('allow\nfoo\n')
+        inventory_path = self._write_file('')
+        stderr = StringIO()
+        with redirect_stdout(StringIO()), redirect_stderr(stderr):
+            exit_code = main([rules_path, inventory_path])
+        self.assertEqual(exit_code, 1)
+        self.assertIn(f'{rules_path}:2:', stderr.getvalue())
+
+    def test_main_with_unreadable_files(self):
+        rules_path = self._write_file(POLICY)
+        missing_path = rules_path + '.missing'
+        undecodable_path = self._write_file('')
+        with open(undecodable_path, 'wb') as file:
+            file.write(b'1: allow name "\xff"\n')
+
+        for args, bad_path in [
+            ([missing_path, rules_path], missing_path),
+            ([rules_path, missing_path], missing_path),
+            ([rules_path, undecodable_path], undecodable_path),
+        ]:
+            stderr = StringIO()
+            with redirect_stdout(StringIO()), redirect_stderr(stderr):
+                exit_code = main(args)
+            self.assertEqual(exit_code, 1)
+            self.assertEqual(len(stderr.getvalue().splitlines()), 1)
+            self.assertTrue(stderr.getvalue().startswith(f'{bad_path}: '))
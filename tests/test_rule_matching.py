@@ -0,0 +1,162 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from random import Random
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.rule_matching import (RuleMatcher,
+                                                     rule_applies_to)
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+from usbguard_simple_gui_py_qt.rules import RuleTarget
+
+DEVICE = RuleParser.parse(
+    'allow id 046d:c52b serial "" name "USB Receiver" hash "h1" '
+    'parent-hash "h0" via-port "1-2" '
+    'with-interface { 03:01:01 03:01:02 03:00:00 } '
+    'with-connect-type "hotplug"')
+
+
+def _applies(rule_string: str, device=DEVICE) -> bool:
+    return rule_applies_to(RuleParser.parse(rule_string), device)
+
+
+class TestRuleAppliesTo(TestCase):
+    def test_no_attributes(self):
+        self.assertTrue(_applies('block'))
+
+    def test_device_id_wildcards(self):
+        self.assertTrue(_applies('allow id 046d:c52b'))
+        self.assertTrue(_applies('allow id 046d:*'))
+        self.assertTrue(_applies('allow id *:*'))
+        self.assertFalse(_applies('allow id 046d:c52c'))
+        self.assertFalse(_applies('allow id 046e:*'))
+
+    def test_interface_type_wildcards(self):
+        self.assertTrue(_applies('allow with-interface one-of { 03:01:* }'))
+        self.assertTrue(_applies('allow with-interface one-of { 03:*:* }'))
+        self.assertFalse(_applies('allow with-interface one-of { 08:*:* }'))
+        self.assertFalse(_applies('allow with-interface one-of { 03:02:* }'))
+
+    def test_implicit_equals(self):
+        self.assertTrue(
+            _applies('allow with-interface { 03:00:00 03:01:* 03:01:02 }'))
+        self.assertFalse(_applies('allow with-interface 03:01:01'))
+        self.assertFalse(
+            _applies('allow with-interface { 03:01:01 03:01:02 }'))
+
+    def test_equals(self):
+        self.assertTrue(_applies(
+            'allow with-interface equals { 03:00:00 03:01:02 03:01:01 }'))
+        self.assertFalse(_applies(
+            'allow with-interface equals { 03:00:00 03:01:02 08:01:01 }'))
+
+    def test_equals_ordered(self):
+        self.assertTrue(_applies(
+            'allow with-interface equals-ordered '
+            '{ 03:01:01 03:01:* 03:*:* }'))
+        self.assertFalse(_applies(
+            'allow with-interface equals-ordered '
+            '{ 03:01:02 03:01:01 03:*:* }'))
+
+    def test_all_of(self):
+        self.assertTrue(_applies('allow with-interface all-of { 03:01:* }'))
+        self.assertTrue(
+            _applies('allow with-interface all-of { 03:00:00 03:01:02 }'))
+        self.assertFalse(
+            _applies('allow with-interface all-of { 03:00:00 08:06:50 }'))
+
+    def test_one_of(self):
+        self.assertTrue(_applies('allow name one-of { "Foo" "USB Receiver" }'))
+        self.assertFalse(_applies('allow name one-of { "Foo" "Bar" }'))
+
+    def test_none_of(self):
+        self.assertTrue(_applies('allow with-interface none-of { 08:*:* }'))
+        self.assertFalse(
+            _applies('allow with-interface none-of { 08:*:* 03:00:* }'))
+
+    def test_all_attributes_must_match(self):
+        self.assertTrue(_applies('allow id 046d:* hash "h1" via-port "1-2"'))
+        self.assertFalse(_applies('allow id 046d:* hash "h1" via-port "1-3"'))
+
+    def test_missing_device_attribute(self):
+        device = RuleParser.parse('allow id 046d:c52b')
+        self.assertFalse(_applies('allow serial "x"', device))
+        self.assertTrue(_applies('allow serial none-of { "x" }', device))
+
+
+class TestRuleMatcher(TestCase):
+    def test_first_matching_rule_wins(self):
+        policy = [RuleParser.parse(rule) for rule in [
+            'allow id 1234:*',
+            'reject with-interface one-of { 03:01:* }',
+            'allow id 046d:c52b',
+            'block',
+        ]]
+        matcher = RuleMatcher(policy)
+        self.assertEqual(matcher.match(DEVICE), (1, policy[1]))
+        self.assertEqual(matcher.target_for(DEVICE), RuleTarget.REJECT)
+
+    def test_no_match_gives_implicit_target(self):
+        matcher = RuleMatcher([RuleParser.parse('allow id 1234:*')])
+        self.assertIsNone(matcher.match(DEVICE))
+        self.assertEqual(matcher.target_for(DEVICE), RuleTarget.BLOCK)
+        self.assertEqual(
+            matcher.target_for(DEVICE, implicit_target=RuleTarget.ALLOW),
+            RuleTarget.ALLOW)
+
+    def test_index_agrees_with_linear_scan(self):
+        random = Random(7)
+        vendors = ['046d', '1d6b', '8087']
+        products = ['0001', '0002', '*']
+        hashes = ['"h1"', '"h2"', '"h3"']
+        ifaces = ['03:01:01', '03:00:*', '09:00:00', '08:*:*']
+        operators = ['', 'one-of ', 'all-of ', 'none-of ', 'equals ']
+
+        def random_rule(target: str) -> str:
+            parts = [target]
+            if random.random() < 0.5:
+                vendor = random.choice(vendors + ['*'])
+                product = '*' if vendor == '*' else random.choice(products)
+                parts.append(f'id {vendor}:{product}')
+            if random.random() < 0.3:
+                parts.append('hash %s{ %s }' % (
+                    random.choice(operators),
+                    ' '.join(random.sample(hashes, random.randint(1, 2)))))
+            if random.random() < 0.5:
+                parts.append('with-interface %s{ %s }' % (
+                    random.choice(operators),
+                    ' '.join(random.sample(ifaces, random.randint(1, 3)))))
+            return ' '.join(parts)
+
+        policy = [RuleParser.parse(random_rule(random.choice(
+            ['allow', 'block', 'reject']))) for _ in range(300)]
+        matcher = RuleMatcher(policy)
+
+        for _ in range(300):
+            device = RuleParser.parse(
+                'allow id %s:%s hash %s with-interface { %s }' % (
+                    random.choice(vendors), random.choice(products[:2]),
+                    random.choice(hashes),
+                    ' '.join(random.sample(
+                        ['03:01:01', '03:00:01', '09:00:00', '08:06:50'],
+                        random.randint(1, 3)))))
+            expected = next(
+                ((index, rule) for index, rule in enumerate(policy)
+                 if rule_applies_to(rule, device)),
+                None)
+            self.assertEqual(matcher.match(device), expected)
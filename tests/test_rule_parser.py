@@ -17,6 +17,9 @@
 # along with "USBGuard Simple GUI Py/Qt".  If not, see
 # <https://www.gnu.org/licenses/>.
 
+import os
+from dataclasses import FrozenInstanceError
+from tempfile import NamedTemporaryFile
 from unittest import TestCase
 from usbguard_simple_gui_py_qt.rules import (DeviceAttribute,
                                              DeviceAttributeName,
@@ -24,7 +27,10 @@ from usbguard_simple_gui_py_qt.rules import (DeviceAttribute,
                                              DeviceId,
                                              DeviceInterfaceType,
                                              RuleTarget)
-from usbguard_simple_gui_py_qt.rule_parsing import RuleParser, RuleParsingError
+from usbguard_simple_gui_py_qt.rule_parsing import (RuleParseCache,
+                                                    RuleParser,
+                                                    RuleParsingError,
+                                                    ValueInterner)
 
 
 class TestParseRule(TestCase):
@@ -484,3 +490,269 @@ class TestParseRule(TestCase):
                 name=DeviceAttributeName.WITH_CONNECT_TYPE,
                 operator=None,
                 values=['hotplug']))
+
+
+class TestRuleParseCache(TestCase):
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            RuleParseCache(0)
+
+    def test_miss_then_hit_returns_same_instance(self):
+        cache = RuleParseCache(2)
+        first = cache.parse('allow id dead:beef')
+        second = cache.parse('allow id dead:beef')
+        self.assertIs(first, second)
+        self.assertEqual(first, RuleParser.parse('allow id dead:beef'))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions),
+                         (1, 1, 0))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = RuleParseCache(2)
+        cache.parse('allow')
+        cache.parse('block')
+        cache.parse('allow')
+        cache.parse('reject')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+        cache.parse('allow')
+        self.assertEqual(cache.hits, 2)
+        cache.parse('block')
+        self.assertEqual(cache.misses, 4)
+
+    def test_errors_are_not_cached(self):
+        cache = RuleParseCache(2)
+        for _ in range(2):
+            with self.assertRaises(RuleParsingError):
+                cache.parse('foo')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.misses, 2)
+
+    def test_cached_rules_are_immutable(self):
+        rule = RuleParseCache(2).parse('allow hash { "foo" "bar" }')
+        with self.assertRaises(FrozenInstanceError):
+            rule.target = RuleTarget.BLOCK
+        with self.assertRaises(TypeError):
+            rule.attributes[DeviceAttributeName.NAME] = None
+        with self.assertRaises(TypeError):
+            rule.hash.values[0] = 'baz'
+
+
+class TestParseMany(TestCase):
+    def test_skips_blank_lines_and_comments(self):
+        results = list(RuleParser.parse_many([
+            '# a comment',
+            '',
+            '   ',
+            'allow id dead:beef',
+            '  # an indented comment',
+            'block',
+        ]))
+        self.assertEqual(
+            [(line_no, rule.target) for line_no, rule in results],
+            [(4, RuleTarget.ALLOW), (6, RuleTarget.BLOCK)])
+
+    def test_continues_after_invalid_lines(self):
+        results = list(RuleParser.parse_many(
+            ['allow', 'foo', 'allow id 123:1234', 'reject'],
+            first_line_no=10))
+        self.assertEqual([line_no for line_no, _ in results],
+                         [10, 11, 12, 13])
+        self.assertIsInstance(results[1][1], RuleParsingError)
+        self.assertIsInstance(results[2][1], RuleParsingError)
+        self.assertEqual(results[3][1].target, RuleTarget.REJECT)
+
+    def test_is_lazy(self):
+        def lines():
+            yield 'allow'
+            raise AssertionError('consumed too much')
+
+        line_no, rule = next(RuleParser.parse_many(lines()))
+        self.assertEqual((line_no, rule.target), (1, RuleTarget.ALLOW))
+
+
+class TestIterFile(TestCase):
+    def _write_file(self, content: bytes) -> str:
+        with NamedTemporaryFile(suffix='.conf', delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_empty_file(self):
+        path = self._write_file(b'')
+        self.assertEqual(list(RuleParser.iter_file(path)), [])
+
+    def test_parses_lines_and_reports_errors(self):
+        path = self._write_file(
+            b'# rules.conf\n'
+            b'allow id dead:beef name "Foo"\r\n'
+            b'\n'
+            b'allow id beef\n'
+            b'block with-interface one-of { 03:00:01 03:01:* }\n'
+            b'reject')
+        results = list(RuleParser.iter_file(path))
+
+        self.assertEqual([line_no for line_no, _ in results], [2, 4, 5, 6])
+        self.assertEqual(
+            results[0][1].name,
+            DeviceAttribute(
+                name=DeviceAttributeName.NAME,
+                operator=None,
+                values=['Foo']))
+        self.assertIsInstance(results[1][1], RuleParsingError)
+        self.assertEqual(
+            results[2][1].with_interface.values,
+            (DeviceInterfaceType(3, 0, 1), DeviceInterfaceType(3, 1, None)))
+        self.assertEqual(results[3][1].target, RuleTarget.REJECT)
+
+    def test_decoding_errors_are_reported_per_line(self):
+        path = self._write_file(b'allow name "\xff"\nblock\n')
+        results = list(RuleParser.iter_file(path))
+        self.assertIsInstance(results[0][1], RuleParsingError)
+        self.assertEqual(results[1], (2, RuleParser.parse('block')))
+
+
+class TestValueInterning(TestCase):
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            ValueInterner(0)
+
+    def test_repeated_values_are_shared(self):
+        interner = ValueInterner()
+        first = RuleParser.parse(
+            'allow id dead:beef name "Foo" with-interface { 03:01:02 }',
+            interner)
+        second = RuleParser.parse(
+            'block id { cafe:babe dead:beef } name "Foo" '
+            'with-interface { 03:01:02 }',
+            interner)
+        self.assertIs(first.id.values[0], second.id.values[1])
+        self.assertIs(first.name.values[0], second.name.values[0])
+        self.assertIs(first.name, second.name)
+        self.assertIs(first.with_interface, second.with_interface)
+
+    def test_default_interner_is_shared(self):
+        first = RuleParser.parse('allow serial "ABC123" id 0001:0002')
+        second = RuleParser.parse('block id 0001:0002 serial "ABC123"')
+        self.assertIs(first.serial, second.serial)
+        self.assertIs(first.id, second.id)
+
+    def test_long_attributes_only_share_values(self):
+        interner = ValueInterner()
+        interfaces = ' '.join(f'03:01:{i:02x}' for i in range(10))
+        value = f'allow with-interface one-of {{ {interfaces} }}'
+        first = RuleParser.parse(value, interner)
+        second = RuleParser.parse(value, interner)
+        self.assertEqual(first.with_interface, second.with_interface)
+        self.assertIsNot(first.with_interface, second.with_interface)
+        for first_value, second_value in zip(
+                first.with_interface.values, second.with_interface.values):
+            self.assertIs(first_value, second_value)
+
+    def test_values_are_shared_across_spellings(self):
+        interner = ValueInterner()
+        first = RuleParser.parse('allow id 0A0b:*', interner)
+        second = RuleParser.parse('allow id 0a0B:*', interner)
+        self.assertIs(first.id.values[0], second.id.values[0])
+        self.assertIs(interner.intern(DeviceId(0x0a0b, None)),
+                      first.id.values[0])
+
+    def test_pool_is_bounded(self):
+        interner = ValueInterner(max_size=10)
+        for i in range(100):
+            RuleParser.parse(f'allow id {i:04x}:0000', interner)
+            self.assertLessEqual(len(interner), 10)
+
+
+def _signal_attributes(rule):
+    # The dictionary sent by USBGuard along with a device rule
+    attributes = {}
+    for name, attribute in rule.attributes.items():
+        if name is DeviceAttributeName.WITH_INTERFACE:
+            values = [v.to_rule_string() for v in attribute.values]
+            attributes[name.value] = values[0] if len(values) == 1 \
+                else '{ %s }' % ' '.join(values)
+        elif name is DeviceAttributeName.ID:
+            attributes[name.value] = attribute.values[0].to_rule_string()
+        else:
+            attributes[name.value] = attribute.values[0]
+    return attributes
+
+
+class TestFromAttributes(TestCase):
+    DEVICE_RULES = [
+        'allow id 1d6b:0002 serial "0000:00:14.0" name "xHCI Host Controller" '
+        'hash "jEP/6WzviqdJ5VSeTUY8PatCNBKeaREvo2OqdplND/o=" parent-hash '
+        '"rV9bfLq7c2eA4tYjVjwO4bxhm+y6GgZpl9J60L0fBkY=" via-port "usb1" '
+        'with-interface 09:00:00 with-connect-type ""',
+        'block id 046d:c52b serial "" name "USB Receiver" hash "h2" '
+        'parent-hash "h1" via-port "1-2" '
+        'with-interface { 03:01:01 03:01:02 03:00:00 } '
+        'with-connect-type "hotplug"',
+        'reject id 0bda:8153 serial "" name "" hash "h3" parent-hash "h1" '
+        'via-port "2-1" with-interface { ff:ff:00 02:06:00 0a:00:00 }',
+    ]
+
+    def test_same_rule_as_parsing(self):
+        for value in self.DEVICE_RULES:
+            with self.subTest(value=value):
+                expected = RuleParser.parse(value)
+                actual = RuleParser.from_attributes(
+                    value, _signal_attributes(expected))
+                self.assertEqual(actual, expected)
+
+    def test_values_are_interned(self):
+        value = self.DEVICE_RULES[0]
+        expected = RuleParser.parse(value)
+        actual = RuleParser.from_attributes(
+            value, _signal_attributes(expected))
+        self.assertIs(actual.id, expected.id)
+        self.assertIs(actual.with_interface, expected.with_interface)
+
+    def _assert_needs_parsing(self, value, change):
+        attributes = _signal_attributes(RuleParser.parse(value))
+        change(attributes)
+        self.assertIsNone(RuleParser.from_attributes(value, attributes))
+
+    def test_missing_attribute(self):
+        self._assert_needs_parsing(
+            self.DEVICE_RULES[0], lambda a: a.pop('hash'))
+
+    def test_missing_connect_type_in_rule(self):
+        self._assert_needs_parsing(
+            self.DEVICE_RULES[1], lambda a: a.pop('with-connect-type'))
+
+    def test_malformed_values(self):
+        value = self.DEVICE_RULES[1]
+        self._assert_needs_parsing(
+            value, lambda a: a.update({'id': '046d'}))
+        self._assert_needs_parsing(
+            value, lambda a: a.update({'with-interface': '03:01'}))
+        self._assert_needs_parsing(
+            value, lambda a: a.update({'with-interface': ''}))
+        self._assert_needs_parsing(
+            value, lambda a: a.update({'name': 'USB "Receiver"'}))
+
+    def test_escaped_strings(self):
+        # USBGuard escapes these bytes in the rule string, while the
+        # dictionary holds them as they are
+        value = ('allow id 0781:5581 serial "4C53\\x0a0001" '
+                 'name "Caf\\xc3\\xa9 Key" hash "h4" parent-hash "h1" '
+                 'via-port "1-3" with-interface 08:06:50')
+        expected = RuleParser.parse(value)
+        for serial, name in [('4C53\n0001', 'Caf\u00e9 Key'),
+                             ('4C53\\x0a0001', 'Caf\\xc3\\xa9 Key')]:
+            with self.subTest(serial=serial, name=name):
+                attributes = _signal_attributes(expected)
+                attributes.update({'serial': serial, 'name': name})
+                actual = RuleParser.from_attributes(value, attributes) \
+                    or RuleParser.parse(value)
+                self.assertEqual(actual, expected)
+
+    def test_invalid_target(self):
+        value = self.DEVICE_RULES[2]
+        attributes = _signal_attributes(RuleParser.parse(value))
+        self.assertIsNone(RuleParser.from_attributes('', attributes))
+        self.assertIsNone(RuleParser.from_attributes('  ', attributes))
+        self.assertIsNone(RuleParser.from_attributes(
+            'foo' + value[len('reject'):], attributes))
@@ -0,0 +1,141 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from io import StringIO
+from random import Random
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.rules import (DeviceAttribute,
+                                             DeviceAttributeName,
+                                             DeviceAttributeOperator,
+                                             DeviceId,
+                                             DeviceInterfaceType,
+                                             Rule,
+                                             RuleTarget,
+                                             write_rules)
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+
+def _random_device_id(random: Random) -> DeviceId:
+    if random.random() < 0.1:
+        return DeviceId(None, None)
+    product_id = None if random.random() < 0.2 else random.randrange(0x10000)
+    return DeviceId(random.randrange(0x10000), product_id)
+
+
+def _random_interface_type(random: Random) -> DeviceInterfaceType:
+    iface_class = random.randrange(0x100)
+    if random.random() < 0.1:
+        return DeviceInterfaceType(iface_class, None, None)
+    iface_protocol = None if random.random() < 0.2 else random.randrange(0x100)
+    return DeviceInterfaceType(
+        iface_class, random.randrange(0x100), iface_protocol)
+
+
+def _random_string(random: Random) -> str:
+    alphabet = 'abcXYZ019 :-_/.+={}*\t#\''
+    return ''.join(random.choice(alphabet)
+                   for _ in range(random.randrange(12)))
+
+
+def _random_rule(random: Random) -> Rule:
+    attributes = {}
+
+    for name in random.sample(list(DeviceAttributeName),
+                              random.randrange(len(DeviceAttributeName))):
+        if name is DeviceAttributeName.ID:
+            random_value = _random_device_id
+        elif name is DeviceAttributeName.WITH_INTERFACE:
+            random_value = _random_interface_type
+        else:
+            random_value = _random_string
+
+        operator = random.choice([None, *DeviceAttributeOperator])
+        values = [random_value(random) for _ in range(random.randint(1, 4))]
+        attributes[name] = DeviceAttribute(name, operator, values)
+
+    return Rule(target=random.choice(list(RuleTarget)), attributes=attributes)
+
+
+class TestRuleSerialization(TestCase):
+    def test_round_trip_of_random_rules(self):
+        random = Random(42)
+        for _ in range(2000):
+            rule = _random_rule(random)
+            rule_string = rule.to_rule_string()
+            self.assertEqual(RuleParser.parse(rule_string), rule, rule_string)
+
+    def test_canonical_strings_are_preserved(self):
+        for rule_string in [
+            'allow',
+            'block id dead:beef',
+            'reject id *:*',
+            'allow id cafe:* serial ""',
+            'allow id { dead:beef cafe:babe } name one-of { "a" "b c" }',
+            'allow hash "x" parent-hash "y" via-port "1-2" '
+            'with-interface equals-ordered { 03:01:02 08:*:* 09:00:* } '
+            'with-connect-type "hotplug"',
+            'block with-interface all-of { 03:01:02 }',
+        ]:
+            self.assertEqual(
+                RuleParser.parse(rule_string).to_rule_string(), rule_string)
+
+    def test_attributes_are_written_in_canonical_order(self):
+        rule = RuleParser.parse('allow serial "s" hash "h" id 0001:0002')
+        self.assertEqual(rule.to_rule_string(),
+                         'allow id 0001:0002 hash "h" serial "s"')
+
+    def test_invalid_rules(self):
+        for attribute in [
+            DeviceAttribute(DeviceAttributeName.NAME, None, []),
+            DeviceAttribute(DeviceAttributeName.NAME, None, ['a"b']),
+            DeviceAttribute(DeviceAttributeName.NAME, None, ['a\nb']),
+            DeviceAttribute(DeviceAttributeName.SERIAL, None, ['a\rb']),
+            DeviceAttribute(DeviceAttributeName.ID, None,
+                            [DeviceId(None, 1)]),
+            DeviceAttribute(DeviceAttributeName.WITH_INTERFACE, None,
+                            [DeviceInterfaceType(1, None, 2)]),
+        ]:
+            rule = Rule(RuleTarget.ALLOW, {attribute.name: attribute})
+            with self.assertRaises(ValueError):
+                rule.to_rule_string()
+
+    def test_write_rules(self):
+        rules = [RuleParser.parse('allow id dead:beef'),
+                 RuleParser.parse('block')]
+        stream = StringIO()
+        self.assertEqual(write_rules(rules, stream), 2)
+        self.assertEqual(stream.getvalue(), 'allow id dead:beef\nblock\n')
+        self.assertEqual(
+            [rule for _, rule in RuleParser.parse_many(
+                stream.getvalue().splitlines())],
+            rules)
+
+    def test_write_rules_with_line_breaks(self):
+        name = DeviceAttribute(DeviceAttributeName.NAME, None, ['a\nblock'])
+        rules = [RuleParser.parse('allow id dead:beef'),
+                 Rule(RuleTarget.ALLOW, {name.name: name})]
+        stream = StringIO()
+        # Rather than writing a rule which would be read back as two rules
+        with self.assertRaises(ValueError):
+            write_rules(rules, stream)
+        self.assertEqual(stream.getvalue(), 'allow id dead:beef\n')
+        self.assertEqual(
+            [rule for _, rule in RuleParser.parse_many(
+                stream.getvalue().splitlines())],
+            rules[:1])
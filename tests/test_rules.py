@@ -0,0 +1,83 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+import pickle
+from dataclasses import FrozenInstanceError
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.rules import (DeviceAttribute,
+                                             DeviceAttributeName,
+                                             DeviceId,
+                                             DeviceInterfaceType,
+                                             Rule,
+                                             RuleTarget)
+from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+
+RULE_STRING = (
+    'allow id dead:beef hash "h" parent-hash "p" name "n" serial "s" '
+    'via-port "1-2" with-interface one-of { 03:01:02 08:*:* } '
+    'with-connect-type "hotplug"')
+
+
+class TestRules(TestCase):
+    def test_instances_have_no_dict(self):
+        rule = RuleParser.parse(RULE_STRING)
+        for value in [rule, rule.id, rule.id.values[0],
+                      rule.with_interface.values[0]]:
+            self.assertFalse(hasattr(value, '__dict__'), value)
+
+    def test_instances_are_frozen(self):
+        rule = RuleParser.parse(RULE_STRING)
+        for value, field_name in [(rule, 'target'),
+                                  (rule.id, 'values'),
+                                  (rule.id.values[0], 'vendor_id'),
+                                  (rule.with_interface.values[0], 'cc')]:
+            with self.assertRaises(FrozenInstanceError):
+                setattr(value, field_name, None)
+
+    def test_equal_rules_have_equal_hashes(self):
+        rule = RuleParser.parse(RULE_STRING)
+        other = RuleParser.parse(RULE_STRING)
+        self.assertEqual(rule, other)
+        self.assertEqual(hash(rule), hash(other))
+        self.assertEqual(len({rule, other, RuleParser.parse('allow')}), 2)
+
+    def test_pickle(self):
+        rule = RuleParser.parse(RULE_STRING)
+        self.assertEqual(pickle.loads(pickle.dumps(rule)), rule)
+
+    def test_default_attributes(self):
+        self.assertEqual(Rule(RuleTarget.BLOCK).attributes, {})
+
+    def test_accessors(self):
+        rule = RuleParser.parse(RULE_STRING)
+        self.assertEqual(rule.id.values, (DeviceId(0xdead, 0xbeef),))
+        self.assertEqual(rule.hash.values, ('h',))
+        self.assertEqual(rule.parent_hash.values, ('p',))
+        self.assertEqual(rule.name.values, ('n',))
+        self.assertEqual(rule.serial.values, ('s',))
+        self.assertEqual(rule.via_port.values, ('1-2',))
+        self.assertEqual(
+            rule.with_interface.values,
+            (DeviceInterfaceType(3, 1, 2), DeviceInterfaceType(8, None, None)))
+        self.assertEqual(rule.with_connect_type.values, ('hotplug',))
+        self.assertIsNone(RuleParser.parse('allow').name)
+
+    def test_values_are_stored_as_tuples(self):
+        attribute = DeviceAttribute(DeviceAttributeName.NAME, None, ['a'])
+        self.assertEqual(attribute.values, ('a',))
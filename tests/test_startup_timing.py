@@ -0,0 +1,42 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from io import StringIO
+from unittest import TestCase
+from usbguard_simple_gui_py_qt.startup_timing import StartupTimer
+
+
+class TestStartupTimer(TestCase):
+    def setUp(self):
+        self.now = 100.0
+
+    def test_marks_are_relative_to_start(self):
+        timer = StartupTimer(clock=lambda: self.now)
+        self.now = 100.25
+        self.assertEqual(timer.mark('first'), 0.25)
+        self.now = 101.5
+        timer.mark('second')
+        self.assertEqual(timer.marks, [('first', 0.25), ('second', 1.5)])
+
+    def test_marks_are_printed(self):
+        stream = StringIO()
+        timer = StartupTimer(stream, clock=lambda: self.now)
+        self.now = 100.0125
+        timer.mark('tray icon shown')
+        self.assertEqual(stream.getvalue(), '      12.5 ms  tray icon shown\n')
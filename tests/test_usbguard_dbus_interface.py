@@ -0,0 +1,371 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+import shutil
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+from unittest import skipUnless, TestCase
+
+try:
+    from dbus.bus import BusConnection
+    from dbus.mainloop.glib import DBusGMainLoop
+    from gi.repository import GLib
+    from PySide2.QtCore import QCoreApplication
+    from usbguard_simple_gui_py_qt.device_events import \
+        EventPresenceChangeType
+    from usbguard_simple_gui_py_qt.policy_cache import IMPLICIT_RULE_ID
+    from usbguard_simple_gui_py_qt.rule_parsing import RuleParser
+    from usbguard_simple_gui_py_qt.rules import RuleTarget
+    from usbguard_simple_gui_py_qt.usbguard_dbus_interface import \
+        CallbackEventType, UsbguardDbusInterface
+    from .fake_usbguard_daemon import (BUS_NAME,
+                                       DEFAULT_RULES,
+                                       DEVICES_IFACE_NAME,
+                                       DEVICES_PATH,
+                                       private_fake_daemon,
+                                       signal_attributes,
+                                       start_fake_daemon,
+                                       STORM_FIRST_DEVICE_ID)
+    _HAS_DEPENDENCIES = shutil.which('dbus-daemon') is not None
+except ImportError:
+    _HAS_DEPENDENCIES = False
+
+# Reply delay of the fake daemon
+_DELAY = 0.5
+# Interval of a timer standing for the UI event processing
+_TICK = 0.01
+
+
+class _FakeDaemonTestCase(TestCase):
+    DAEMON_ARGS = ()
+
+    def setUp(self):
+        fake_daemon = private_fake_daemon(*self.DAEMON_ARGS)
+        self.address = fake_daemon.__enter__()
+        self.addCleanup(fake_daemon.__exit__, None, None, None)
+
+        self.bus = BusConnection(self.address, mainloop=DBusGMainLoop())
+        self.addCleanup(self.bus.close)
+        self.usbguard_dbus = UsbguardDbusInterface(bus=self.bus)
+
+
+@skipUnless(_HAS_DEPENDENCIES, 'requires dbus-python, PyGObject, PySide2 '
+                               'and dbus-daemon')
+class TestAsyncCallsLatency(_FakeDaemonTestCase):
+    DAEMON_ARGS = ('--delay', str(_DELAY))
+
+    def _run_until_reply(self, start_call) -> dict:
+        loop = GLib.MainLoop()
+        result = {'ticks': 0}
+
+        def tick():
+            result['ticks'] += 1
+            return True
+
+        def on_reply(value):
+            result['latency'] = perf_counter() - start
+            result['value'] = value
+            loop.quit()
+
+        def on_error(error):
+            result['error'] = error
+            loop.quit()
+
+        GLib.timeout_add(int(_TICK * 1000), tick)
+        GLib.timeout_add(10_000, loop.quit)
+
+        start = perf_counter()
+        start_call(on_reply, on_error)
+        result['call_time'] = perf_counter() - start
+        loop.run()
+        return result
+
+    def _assert_non_blocking(self, result: dict) -> None:
+        self.assertNotIn('error', result)
+        self.assertLess(result['call_time'], _DELAY / 5)
+        self.assertGreaterEqual(result['latency'], _DELAY)
+        # The event loop kept running while waiting for the reply
+        self.assertGreater(result['ticks'], _DELAY / _TICK / 2)
+
+    def test_list_devices_async(self):
+        result = self._run_until_reply(
+            lambda on_reply, on_error:
+                self.usbguard_dbus.list_devices_async(on_reply, on_error))
+        self._assert_non_blocking(result)
+        self.assertEqual([d.device_id for d in result['value']], [1, 2])
+        self.assertIs(result['value'][1].rule.target, RuleTarget.BLOCK)
+
+    def test_apply_device_policy_async(self):
+        result = self._run_until_reply(
+            lambda on_reply, on_error:
+                self.usbguard_dbus.apply_device_policy_async(
+                    2, RuleTarget.ALLOW, False, on_reply, on_error))
+        self._assert_non_blocking(result)
+        self.assertIsNone(result['value'])
+
+    def test_list_devices_blocks(self):
+        start = perf_counter()
+        devices = self.usbguard_dbus.list_devices()
+        self.assertGreaterEqual(perf_counter() - start, _DELAY)
+        self.assertEqual(len(devices), 2)
+
+    def test_apply_device_policies_pipelined(self):
+        changes = [(i % 2 + 1, RuleTarget.ALLOW, False) for i in range(8)]
+        result = self._run_until_reply(
+            lambda on_reply, _on_error:
+                self.usbguard_dbus.apply_device_policies(changes, on_reply))
+        self._assert_non_blocking(result)
+        batch_result = result['value']
+        self.assertEqual(
+            [r.device_id for r in batch_result.results],
+            [device_id for device_id, _, _ in changes])
+        self.assertEqual(batch_result.failures, [])
+        # The calls did not wait for each other
+        self.assertLess(batch_result.elapsed, _DELAY * 2)
+
+
+@skipUnless(_HAS_DEPENDENCIES, 'requires dbus-python, PyGObject, PySide2 '
+                               'and dbus-daemon')
+class TestConnection(_FakeDaemonTestCase):
+    def test_call_when_available(self):
+        loop = GLib.MainLoop()
+        calls = []
+
+        def callback():
+            calls.append(True)
+            GLib.timeout_add(200, loop.quit)
+
+        self.usbguard_dbus.call_when_available(callback)
+        GLib.timeout_add(10_000, loop.quit)
+        loop.run()
+        self.assertEqual(calls, [True])
+
+    def test_slow_callbacks_are_reported(self):
+        slow = []
+        usbguard_dbus = UsbguardDbusInterface(
+            bus=self.bus,
+            callback_time_budget=0,
+            on_slow_callback=lambda *args: slow.append(args))
+        usbguard_dbus.register_callback(
+            CallbackEventType.DAEMON_RECONNECTED, lambda: None)
+        usbguard_dbus.callback_dispatcher.dispatch(
+            CallbackEventType.DAEMON_RECONNECTED)
+        self.assertEqual(
+            [event_type for event_type, _callback, _duration in slow],
+            [CallbackEventType.DAEMON_RECONNECTED])
+
+    def test_reconnect(self):
+        with NamedTemporaryFile('w', suffix='.txt') as inventory:
+            inventory.write('7: allow id 0781:5581 name "Ultra"\n')
+            inventory.flush()
+
+            self.usbguard_dbus.list_rules()
+            loop = GLib.MainLoop()
+            events = []
+            self.usbguard_dbus.register_callback(
+                CallbackEventType.DAEMON_DISCONNECTED,
+                lambda: events.append('disconnected'))
+            self.usbguard_dbus.register_callback(
+                CallbackEventType.DAEMON_RECONNECTED,
+                lambda: (events.append('reconnected'), loop.quit()))
+
+            # Waiting for the name behind the current daemon
+            new_daemon = start_fake_daemon(
+                self.address, '--inventory', inventory.name)
+            self.addCleanup(new_daemon.wait)
+            self.addCleanup(new_daemon.terminate)
+            GLib.timeout_add(
+                500,
+                lambda: self.bus.get_object(BUS_NAME, DEVICES_PATH).exit(
+                    dbus_interface=DEVICES_IFACE_NAME) and False)
+            GLib.timeout_add(10_000, loop.quit)
+            loop.run()
+
+        # The name went straight to the new daemon
+        self.assertEqual(events, ['reconnected'])
+        self.assertFalse(self.usbguard_dbus.policy_cache.is_loaded)
+        self.assertEqual(
+            [d.device_id for d in self.usbguard_dbus.list_devices()], [7])
+
+
+@skipUnless(_HAS_DEPENDENCIES, 'requires dbus-python, PyGObject, PySide2 '
+                               'and dbus-daemon')
+class TestPolicy(_FakeDaemonTestCase):
+    def test_list_rules(self):
+        rules = self.usbguard_dbus.list_rules()
+        self.assertEqual(
+            rules,
+            [(i, RuleParser.parse(r)) for i, r in enumerate(DEFAULT_RULES, 1)])
+        self.assertTrue(self.usbguard_dbus.policy_cache.is_loaded)
+
+    def test_get_rule(self):
+        self.assertEqual(
+            self.usbguard_dbus.get_rule(1),
+            RuleParser.parse(DEFAULT_RULES[0]))
+        self.assertIsNone(self.usbguard_dbus.get_rule(IMPLICIT_RULE_ID))
+        self.assertIsNone(self.usbguard_dbus.get_rule(1000))
+
+    def test_get_cached_rule(self):
+        # Not loaded yet: not waiting for USBGuard, but loading it
+        self.assertIsNone(self.usbguard_dbus.get_cached_rule(1))
+        self.assertIsNone(
+            self.usbguard_dbus.get_cached_rule(IMPLICIT_RULE_ID))
+
+        loop = GLib.MainLoop()
+
+        def quit_when_loaded():
+            if self.usbguard_dbus.policy_cache.is_loaded:
+                loop.quit()
+                return False
+            return True
+
+        GLib.timeout_add(50, quit_when_loaded)
+        GLib.timeout_add(10_000, loop.quit)
+        loop.run()
+
+        self.assertEqual(
+            self.usbguard_dbus.get_cached_rule(1),
+            RuleParser.parse(DEFAULT_RULES[0]))
+
+    def test_append_and_remove_rule(self):
+        self.usbguard_dbus.list_rules()
+        rule = RuleParser.parse('reject id dead:beef')
+        rule_id = self.usbguard_dbus.append_rule(rule)
+        self.assertIs(self.usbguard_dbus.policy_cache.get(rule_id), rule)
+        self.assertEqual(self.usbguard_dbus.list_rules()[-1], (rule_id, rule))
+
+        self.usbguard_dbus.remove_rule(rule_id)
+        self.assertIsNone(self.usbguard_dbus.policy_cache.get(rule_id))
+        self.assertEqual(len(self.usbguard_dbus.list_rules()),
+                         len(DEFAULT_RULES))
+
+    def test_permanent_device_policy_invalidates_cache(self):
+        self.usbguard_dbus.list_rules()
+        rule_id = self.usbguard_dbus.apply_device_policy(
+            2, RuleTarget.ALLOW, True)
+        self.assertFalse(self.usbguard_dbus.policy_cache.is_loaded)
+        self.assertIs(
+            self.usbguard_dbus.get_rule(rule_id).target, RuleTarget.ALLOW)
+
+
+@skipUnless(_HAS_DEPENDENCIES, 'requires dbus-python, PyGObject, PySide2 '
+                               'and dbus-daemon')
+class TestSignalStorm(_FakeDaemonTestCase):
+    def test_all_signals_received(self):
+        count = 300
+        received = {'presence': 0, 'policy': 0}
+        loop = GLib.MainLoop()
+
+        def on_presence(device, _event, _target):
+            self.assertGreaterEqual(device.device_id, STORM_FIRST_DEVICE_ID)
+            received['presence'] += 1
+
+        def on_policy(_device, _old, new, _rule_id):
+            self.assertIs(new, RuleTarget.ALLOW)
+            received['policy'] += 1
+
+        self.usbguard_dbus.register_callback(
+            CallbackEventType.DEVICE_PRESENCE_CHANGED, on_presence)
+        self.usbguard_dbus.register_callback(
+            CallbackEventType.DEVICE_POLICY_CHANGED, on_policy)
+        self.bus.add_signal_receiver(
+            lambda _count: loop.quit(), 'SignalStormDone')
+        GLib.timeout_add(10_000, loop.quit)
+
+        self.bus.get_object(BUS_NAME, DEVICES_PATH).startSignalStorm(
+            count, 5000.0, dbus_interface=DEVICES_IFACE_NAME)
+        loop.run()
+
+        self.assertEqual(received['presence'] + received['policy'], count)
+        self.assertEqual(received['policy'], count // 3)
+
+
+@skipUnless(_HAS_DEPENDENCIES, 'requires dbus-python, PyGObject, PySide2 '
+                               'and dbus-daemon')
+class TestPresenceCoalescing(_FakeDaemonTestCase):
+    def test_policy_change_after_pending_insert(self):
+        app = QCoreApplication.instance() or QCoreApplication([])
+        usbguard_dbus = UsbguardDbusInterface(
+            bus=self.bus, presence_coalescing_window=0.25)
+        self.addCleanup(usbguard_dbus.close)
+        targets = []
+        usbguard_dbus.register_callback(
+            CallbackEventType.DEVICE_PRESENCE_CHANGED,
+            lambda device, event, _target: targets.append(
+                (event, device.rule.target)))
+        usbguard_dbus.register_callback(
+            CallbackEventType.DEVICE_POLICY_CHANGED,
+            lambda device, _old, _new, _rule_id: targets.append(
+                ('policy', device.rule.target)))
+
+        block_rule = 'block id 0781:5581 name "Ultra"'
+        allow_rule = 'allow id 0781:5581 name "Ultra"'
+        usbguard_dbus._on_device_presence_changed(
+            7, 1, 1, block_rule, signal_attributes(block_rule))
+        usbguard_dbus._on_device_policy_changed(
+            7, 1, 0, allow_rule, IMPLICIT_RULE_ID,
+            signal_attributes(allow_rule))
+
+        # Waiting for the end of the coalescing window
+        loop = GLib.MainLoop()
+        GLib.timeout_add(500, loop.quit)
+        loop.run()
+        app.processEvents()
+
+        # The insert was delivered before the policy change, not after
+        self.assertEqual(targets, [
+            (EventPresenceChangeType.INSERT, RuleTarget.BLOCK),
+            ('policy', RuleTarget.ALLOW),
+        ])
+
+
+@skipUnless(_HAS_DEPENDENCIES, 'requires dbus-python, PyGObject, PySide2 '
+                               'and dbus-daemon')
+class TestPolicyChangeErrors(_FakeDaemonTestCase):
+    def _assert_error_reported(self, usbguard_dbus, wait: bool) -> None:
+        app = QCoreApplication.instance() or QCoreApplication([])
+        errors = []
+        usbguard_dbus.register_callback(
+            CallbackEventType.DEVICE_POLICY_CHANGED_ERROR, errors.append)
+        usbguard_dbus.register_callback(
+            CallbackEventType.DEVICE_POLICY_CHANGED,
+            lambda *args: self.fail(f'unexpected policy change {args}'))
+
+        rule = 'allow id 0781:5581 name "Ultra"'
+        # 9 is not a valid target
+        usbguard_dbus._on_device_policy_changed(
+            7, 1, 9, rule, IMPLICIT_RULE_ID, signal_attributes(rule))
+
+        if wait:
+            # Waiting for the delivery from the worker thread
+            deadline = perf_counter() + 5
+            while not errors and perf_counter() < deadline:
+                app.processEvents()
+
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], KeyError)
+
+    def test_invalid_target_inline(self):
+        self._assert_error_reported(self.usbguard_dbus, wait=False)
+
+    def test_invalid_target_on_worker_thread(self):
+        usbguard_dbus = UsbguardDbusInterface(
+            bus=self.bus, worker_thread=True)
+        self.addCleanup(usbguard_dbus.close)
+        self._assert_error_reported(usbguard_dbus, wait=True)
@@ -0,0 +1,238 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+import sys
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from typing import (Any,
+                    Callable,
+                    Dict,
+                    Generic,
+                    Hashable,
+                    List,
+                    Mapping,
+                    Optional,
+                    Sequence,
+                    Tuple,
+                    TypeVar)
+
+# Upper bounds, in seconds, of the buckets of `LatencyHistogram`; the last
+# bucket has no upper bound.
+DEFAULT_LATENCY_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+E = TypeVar('E', bound=Hashable)
+
+
+class LatencyHistogram:
+    """Distribution of durations over fixed buckets."""
+
+    def __init__(
+        self,
+        bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> None:
+        self.bounds: Tuple[float, ...] = tuple(bounds)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, duration: float) -> None:
+        self.counts[bisect_left(self.bounds, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        :return: The upper bound of the bucket holding the `q` quantile (or
+            the maximum, for the last bucket).
+        """
+        if not self.count:
+            return 0.0
+        threshold = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(bound, self.max)
+        return self.max
+
+
+class CallbackError(Exception):
+    """Exception raised by a callback, as reported by `CallbackDispatcher`."""
+
+    def __init__(self, event_type: Any, callback: Callable, error: Exception):
+        super().__init__(
+            f'{callback_name(callback)} failed on {event_type}: '
+            f'{type(error).__name__} - {error}')
+        self.event_type = event_type
+        self.callback = callback
+        self.error = error
+
+
+def callback_name(callback: Callable) -> str:
+    return getattr(callback, '__qualname__', None) or repr(callback)
+
+
+class CallbackDispatcher(Generic[E]):
+    """
+    Registry of callbacks by event type, invoking them in registration order.
+
+    Each callback is isolated from the others: its exceptions are caught and
+    reported as a `CallbackError` to the callbacks of the corresponding error
+    event type, so the following callbacks are still invoked. The duration
+    of every call is recorded in a histogram per callback, and the calls
+    taking longer than the time budget are reported to `on_slow_callback`.
+
+    Callbacks can be (un)registered from any thread.
+    """
+
+    def __init__(
+        self,
+        event_types: Sequence[E],
+        error_event_types: Mapping[E, E],
+        time_budget: float = 0.05,
+        on_slow_callback: Optional[
+            Callable[[E, Callable, float], None]] = None,
+        on_unhandled_error: Optional[Callable[[CallbackError], None]] = None,
+        clock: Callable[[], float] = perf_counter
+    ) -> None:
+        """
+        :param event_types: All the event types.
+        :param error_event_types: The event type where the errors of the
+            callbacks of each event type are reported, if any.
+        :param time_budget: Maximum expected duration of a call, in seconds.
+        :param on_slow_callback: Invoked with the event type, callback and
+            duration of the calls over budget.
+        :param on_unhandled_error: Invoked with the errors which could not
+            be reported to any callback; by default, they are printed to
+            stderr.
+        """
+        self.time_budget: float = time_budget
+        self._error_event_types = dict(error_event_types)
+        self._on_slow_callback = on_slow_callback
+        self._on_unhandled_error = \
+            on_unhandled_error or self._print_unhandled_error
+        self._clock = clock
+        self._lock = Lock()
+        # Dictionaries are used as ordered sets
+        self._callbacks: Dict[E, Dict[Callable, None]] = \
+            {e: {} for e in event_types}
+        self.latencies: Dict[Tuple[E, Callable], LatencyHistogram] = {}
+        self.slow_calls: Dict[Tuple[E, Callable], int] = {}
+        self.errors: Dict[Tuple[E, Callable], int] = {}
+
+    def register(self, event_type: E, callback: Callable) -> None:
+        with self._lock:
+            callbacks = self._callbacks[event_type]
+            if callback in callbacks:
+                raise Exception(f'callback {callback} already registered')
+            callbacks[callback] = None
+
+    def unregister(self, event_type: E, callback: Callable) -> None:
+        """Forgets the callback, along with its statistics."""
+        key = (event_type, callback)
+        with self._lock:
+            del self._callbacks[event_type][callback]
+            self.latencies.pop(key, None)
+            self.slow_calls.pop(key, None)
+            self.errors.pop(key, None)
+
+    def dispatch(self, event_type: E, *args: Any) -> None:
+        with self._lock:
+            callbacks = tuple(self._callbacks[event_type])
+
+        clock = self._clock
+        for callback in callbacks:
+            started = clock()
+            try:
+                callback(*args)
+            except Exception as error:
+                self._report_error(event_type, callback, error)
+            finally:
+                self._record(event_type, callback, clock() - started)
+
+    def report(self) -> str:
+        """:return: A table of the statistics of each callback."""
+        lines = [
+            f'{"event / callback":<60} {"calls":>7} {"mean ms":>8} '
+            f'{"p95 ms":>8} {"max ms":>8} {"slow":>5} {"errors":>6}'
+        ]
+        for (event_type, callback), histogram in self.latencies.items():
+            key = (event_type, callback)
+            label = f'{getattr(event_type, "name", event_type)} / ' \
+                    f'{callback_name(callback)}'
+            lines.append(
+                f'{label:<60.60} {histogram.count:>7} '
+                f'{histogram.mean * 1000:>8.2f} '
+                f'{histogram.quantile(0.95) * 1000:>8.2f} '
+                f'{histogram.max * 1000:>8.2f} '
+                f'{self.slow_calls.get(key, 0):>5} '
+                f'{self.errors.get(key, 0):>6}')
+        return '\n'.join(lines)
+
+    def _record(self, event_type: E, callback: Callable, duration: float):
+        slow = duration > self.time_budget
+
+        # Not keeping the statistics (and so the callback) of a callback
+        # unregistered while being called
+        if callback in self._callbacks[event_type]:
+            key = (event_type, callback)
+            histogram = self.latencies.get(key)
+            if histogram is None:
+                self.latencies[key] = histogram = LatencyHistogram()
+            histogram.add(duration)
+            if slow:
+                self.slow_calls[key] = self.slow_calls.get(key, 0) + 1
+
+        if slow and self._on_slow_callback is not None:
+            self._on_slow_callback(event_type, callback, duration)
+
+    def _report_error(
+        self,
+        event_type: E,
+        callback: Callable,
+        error: Exception
+    ) -> None:
+        if callback in self._callbacks[event_type]:
+            key = (event_type, callback)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+        callback_error = CallbackError(event_type, callback, error)
+        callback_error.__cause__ = error
+
+        error_event_type = self._error_event_types.get(event_type)
+        if error_event_type is None or not self._callbacks[error_event_type]:
+            # Errors of the error callbacks end up here as well, since error
+            # event types have no error event type themselves
+            self._on_unhandled_error(callback_error)
+        else:
+            self.dispatch(error_event_type, callback_error)
+
+    @staticmethod
+    def _print_unhandled_error(error: CallbackError) -> None:
+        original = error.error
+        sys.excepthook(type(original), original, original.__traceback__)
@@ -18,13 +18,22 @@
 # <https://www.gnu.org/licenses/>.
 
 from dataclasses import dataclass
-from typing import Any, List, Optional
-from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt
+from typing import Any, Dict, List, Optional, Set, Tuple
+from PySide2.QtCore import (QAbstractItemModel,
+                            QAbstractTableModel,
+                            QModelIndex,
+                            QSortFilterProxyModel,
+                            Qt)
+from .device_events import diff_device_inventories
+from .device_search import DeviceSearchIndex
+from .device_topology import DeviceTopology, DeviceTopologyListener
 from .rules import DeviceAttribute, DeviceAttributeName, Rule
 
 
-@dataclass
+@dataclass(frozen=True)
 class Device:
+    __slots__ = ('device_id', 'rule')
+
     device_id: int
     rule: Rule
 
@@ -62,22 +71,60 @@ class DeviceModel(QAbstractTableModel):
 
     def __init__(self, devices: List[Device]) -> None:
         super().__init__()
+        # Read-only outside of the model, which keeps `_rows` in sync
         self.devices: List[Device] = devices
+        self._rows: Dict[int, int] = {}
+        # The display strings of the cells of each row, rendered only when
+        # a device is added or updated
+        self._rendered_rows: List[Tuple[str, ...]] = []
+        # Read-only outside of the model, like `devices`
+        self.search_index = DeviceSearchIndex()
+        self._rebuild_rows()
+
+    def reset_devices(self, devices: List[Device]) -> None:
+        self.beginResetModel()
+        self.devices = devices
+        self._rebuild_rows()
+        self.endResetModel()
+
+    def sync_devices(self, devices: List[Device]) -> None:
+        """
+        Updates the model to the given devices, only touching the rows of the
+        devices which were inserted, removed or changed, unlike
+        `reset_devices`.
+        """
+        diff = diff_device_inventories(self.devices, devices)
+
+        for device in diff.removed:
+            self.remove_device(device)
+
+        for device in diff.changed + diff.inserted:
+            self.update_or_add_device(device)
 
     def update_or_add_device(self, device: Device) -> None:
-        row = self._find_row_by_device_id(device.device_id)
+        row = self._rows.get(device.device_id)
         if row is None:
             self._add_new_device(device)
         else:
             self._update_device_at_row(device, row)
 
     def remove_device(self, device: Device) -> None:
-        row = self._find_row_by_device_id(device.device_id)
+        row = self._rows.get(device.device_id)
+        if row is None:
+            return
 
-        if row is not None:
-            del self.devices[row]
-            self.headerDataChanged.emit(Qt.Vertical, row, row)
-            self.dataChanged.emit(row, row)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.devices[row]
+        del self._rendered_rows[row]
+        del self._rows[device.device_id]
+        self.search_index.remove(device.device_id)
+        # Only the rows after the removed one are shifted
+        for shifted_row in range(row, len(self.devices)):
+            self._rows[self.devices[shifted_row].device_id] = shifted_row
+        self.endRemoveRows()
+
+    def row_of_device(self, device_id: int) -> Optional[int]:
+        return self._rows.get(device_id)
 
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
         return len(self.devices)
@@ -106,32 +153,60 @@ class DeviceModel(QAbstractTableModel):
         if role != Qt.DisplayRole:
             return None
 
-        row = index.row()
-        column = index.column()
-        device = self.devices[row]
-
-        if column == 0:
-            return device.rule.target.value
-        else:
-            attribute = self._ATTRIBUTES[column - 1]
-            value = device.rule.attributes.get(attribute)
-            return self._attribute_repr(value)
+        return self._rendered_rows[index.row()][index.column()]
 
     def _add_new_device(self, device: Device) -> None:
         row = len(self.devices)
+        self.beginInsertRows(QModelIndex(), row, row)
         self.devices.append(device)
-        self.headerDataChanged.emit(Qt.Vertical, row, row)
-        self.dataChanged.emit(row, row)
+        self._rendered_rows.append(self._render(device))
+        self._rows[device.device_id] = row
+        self.search_index.add(device.device_id, device.rule)
+        self.endInsertRows()
 
     def _update_device_at_row(self, device: Device, row: int) -> None:
+        old_rule = self.devices[row].rule
+        new_rule = device.rule
         self.devices[row] = device
-        self.dataChanged.emit(row, row)
+        self.search_index.add(device.device_id, new_rule)
 
-    def _find_row_by_device_id(self, device_id: int) -> Optional[int]:
-        for row, device in enumerate(self.devices):
-            if device.device_id == device_id:
-                return row
-        return None
+        # Only the cells of the attributes which changed are rendered again
+        # and reported to the views: most of the times it's just the target.
+        cells = list(self._rendered_rows[row])
+        changed_columns = []
+        if new_rule.target is not old_rule.target:
+            cells[0] = new_rule.target.value
+            changed_columns.append(0)
+        for column, attribute in enumerate(self._ATTRIBUTES, 1):
+            value = new_rule.attributes.get(attribute)
+            if value != old_rule.attributes.get(attribute):
+                cells[column] = self._attribute_repr(value)
+                changed_columns.append(column)
+        self._rendered_rows[row] = tuple(cells)
+
+        for first, last in _contiguous_ranges(changed_columns):
+            self.dataChanged.emit(
+                self.index(row, first), self.index(row, last))
+
+    def _rebuild_rows(self) -> None:
+        self._rows = {
+            device.device_id: row for row, device in enumerate(self.devices)
+        }
+        self._rendered_rows = [self._render(device) for device in self.devices]
+        self.search_index.clear()
+        for device in self.devices:
+            self.search_index.add(device.device_id, device.rule)
+
+    @classmethod
+    def _render(cls, device: Device) -> Tuple[str, ...]:
+        attributes = device.rule.attributes
+        return (
+            device.rule.target.value,
+            *[
+                cls._attribute_repr(attributes.get(attribute))
+                for attribute in cls._ATTRIBUTES
+            ]
+        )
 
     @staticmethod
     def _attribute_repr(value: Optional[DeviceAttribute]) -> str:
@@ -148,3 +223,253 @@ class DeviceModel(QAbstractTableModel):
         else:
             values_repr = '\n'.join(f'    {str(v)}' for v in values)
             return f'{operator.value}:\n{values_repr}'
+
+
+class DeviceFilterProxyModel(QSortFilterProxyModel):
+    """
+    Shows only the devices of a `DeviceModel` matching a search text, looked
+    up in the search index of the model rather than in the cells of each
+    row.
+    """
+
+    def __init__(self, source_model: DeviceModel) -> None:
+        super().__init__()
+        self._search_text = ''
+        self._matches: Optional[Set[int]] = None
+        self._matches_version = -1
+        self.setSourceModel(source_model)
+
+    @property
+    def search_text(self) -> str:
+        return self._search_text
+
+    def set_search_text(self, text: str) -> None:
+        if text == self._search_text:
+            return
+        self._search_text = text
+        self._matches = None
+        self.invalidateFilter()
+
+    def filterAcceptsRow(
+        self,
+        source_row: int,
+        source_parent: QModelIndex
+    ) -> bool:
+        if not self._search_text.strip():
+            return True
+
+        source_model: DeviceModel = self.sourceModel()
+        search_index = source_model.search_index
+        # Searched again only when the text or the devices change, not for
+        # each row.
+        if self._matches is None \
+                or self._matches_version != search_index.version:
+            self._matches = search_index.search(self._search_text)
+            self._matches_version = search_index.version
+
+        device = source_model.devices[source_row]
+        return device.device_id in self._matches
+
+
+class DeviceTreeModel(QAbstractItemModel):
+    """
+    The devices as a tree following their `parent-hash`, i.e. under the hub
+    (or dock, etc.) they're plugged into, with the same columns as
+    `DeviceModel`. See `DeviceTopology`.
+    """
+
+    def __init__(self, devices: List[Device]) -> None:
+        super().__init__()
+        self._devices: Dict[int, Device] = {}
+        self._rendered_rows: Dict[int, Tuple[str, ...]] = {}
+        self._topology = DeviceTopology()
+        self._topology_listener = _TreeModelTopologyListener(self)
+        self._set_devices(devices)
+
+    def reset_devices(self, devices: List[Device]) -> None:
+        self.beginResetModel()
+        self._set_devices(devices)
+        self.endResetModel()
+
+    def sync_devices(self, devices: List[Device]) -> None:
+        """The same as `DeviceModel.sync_devices`."""
+        diff = diff_device_inventories(self._devices.values(), devices)
+
+        for device in diff.removed:
+            self.remove_device(device)
+
+        for device in diff.changed + diff.inserted:
+            self.update_or_add_device(device)
+
+    def update_or_add_device(self, device: Device) -> None:
+        device_id = device.device_id
+        old_device = self._devices.get(device_id)
+        if old_device is not None \
+                and _hashes_of(old_device) != _hashes_of(device):
+            # Moving to its new place, along with its children
+            self.remove_device(old_device)
+            old_device = None
+
+        old_cells = self._rendered_rows.get(device_id)
+        cells = DeviceModel._render(device)
+        # Set beforehand, since views may ask for it as soon as it's inserted
+        self._devices[device_id] = device
+        self._rendered_rows[device_id] = cells
+
+        if old_device is None:
+            self._topology.add(device_id, *_hashes_of(device))
+            return
+
+        row = self._topology.row_of(device_id)
+        changed_columns = [
+            column for column, (old_cell, cell)
+            in enumerate(zip(old_cells, cells)) if old_cell != cell
+        ]
+        for first, last in _contiguous_ranges(changed_columns):
+            self.dataChanged.emit(
+                self.createIndex(row, first, device_id),
+                self.createIndex(row, last, device_id))
+
+    def remove_device(self, device: Device) -> None:
+        device_id = device.device_id
+        if device_id not in self._devices:
+            return
+
+        self._topology.remove(device_id)
+        del self._devices[device_id]
+        del self._rendered_rows[device_id]
+
+    def device_at(self, index: QModelIndex) -> Device:
+        return self._devices[index.internalId()]
+
+    def index_of_device(self, device_id: int) -> QModelIndex:
+        if device_id not in self._devices:
+            return QModelIndex()
+        return self.createIndex(
+            self._topology.row_of(device_id), 0, device_id)
+
+    def index(
+        self,
+        row: int,
+        column: int,
+        parent: QModelIndex = QModelIndex()
+    ) -> QModelIndex:
+        children = self._topology.children_of(self._device_id_of(parent))
+        if not 0 <= row < len(children) \
+                or not 0 <= column < len(DeviceModel._HEADER):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+
+        parent_id = self._topology.parent_of(index.internalId())
+        if parent_id is None:
+            return QModelIndex()
+        return self.createIndex(
+            self._topology.row_of(parent_id), 0, parent_id)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        return len(self._topology.children_of(self._device_id_of(parent)))
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(DeviceModel._HEADER)
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.DisplayRole
+    ) -> Any:
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        return DeviceModel._HEADER[section]
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if role != Qt.DisplayRole:
+            return None
+
+        return self._rendered_rows[index.internalId()][index.column()]
+
+    @staticmethod
+    def _device_id_of(index: QModelIndex) -> Optional[int]:
+        return index.internalId() if index.isValid() else None
+
+    def _set_devices(self, devices: List[Device]) -> None:
+        # Built without notifying the views, which are reset as a whole
+        self._topology.listener = DeviceTopologyListener()
+        self._topology.clear()
+        self._devices = {device.device_id: device for device in devices}
+        self._rendered_rows = {
+            device_id: DeviceModel._render(device)
+            for device_id, device in self._devices.items()
+        }
+        for device in devices:
+            self._topology.add(device.device_id, *_hashes_of(device))
+        self._topology.listener = self._topology_listener
+
+
+class _TreeModelTopologyListener(DeviceTopologyListener):
+    """Forwards the changes of the topology to the views of the model."""
+
+    def __init__(self, model: DeviceTreeModel) -> None:
+        self._model = model
+
+    def before_insert(self, parent: Optional[int], row: int) -> None:
+        self._model.beginInsertRows(self._parent_index(parent), row, row)
+
+    def after_insert(self) -> None:
+        self._model.endInsertRows()
+
+    def before_move(
+        self,
+        parent: Optional[int],
+        row: int,
+        new_parent: Optional[int],
+        new_row: int
+    ) -> None:
+        self._model.beginMoveRows(
+            self._parent_index(parent), row, row,
+            self._parent_index(new_parent), new_row)
+
+    def after_move(self) -> None:
+        self._model.endMoveRows()
+
+    def before_remove(self, parent: Optional[int], row: int) -> None:
+        self._model.beginRemoveRows(self._parent_index(parent), row, row)
+
+    def after_remove(self) -> None:
+        self._model.endRemoveRows()
+
+    def _parent_index(self, parent: Optional[int]) -> QModelIndex:
+        if parent is None:
+            return QModelIndex()
+        return self._model.index_of_device(parent)
+
+
+def _hashes_of(device: Device) -> Tuple[Optional[str], Optional[str]]:
+    device_hash = device.rule.hash
+    parent_hash = device.rule.parent_hash
+    return (
+        device_hash.values[0]
+        if device_hash and len(device_hash.values) == 1 else None,
+        parent_hash.values[0]
+        if parent_hash and len(parent_hash.values) == 1 else None,
+    )
+
+
+def _contiguous_ranges(numbers: List[int]) -> List[Tuple[int, int]]:
+    """
+    Returns the (first, last) ranges of consecutive numbers in the given
+    sorted list, e.g. `[(0, 0), (3, 5)]` for `[0, 3, 4, 5]`.
+    """
+    ranges: List[Tuple[int, int]] = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+    return ranges
@@ -0,0 +1,180 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from dataclasses import dataclass
+from enum import IntEnum, unique
+from typing import (Any,
+                    Callable,
+                    Dict,
+                    Generic,
+                    Iterable,
+                    List,
+                    NamedTuple,
+                    Optional,
+                    TypeVar)
+
+
+@unique
+class EventPresenceChangeType(IntEnum):
+    PRESENT = 0
+    INSERT = 1
+    UPDATE = 2
+    REMOVE = 3
+
+
+class PendingPresenceEvent(NamedTuple):
+    device_id: int
+    event: EventPresenceChangeType
+    target: int
+    # Whatever is needed to build the device later (e.g. the device rule)
+    payload: Any
+
+
+_APPEARANCE_EVENTS = (EventPresenceChangeType.PRESENT,
+                      EventPresenceChangeType.INSERT)
+
+
+class PresenceEventCoalescer:
+    """
+    Collects the device presence events received within a short time window
+    and hands them over as a single batch, at most one event per device:
+
+    - an update following an insert (or any other event) supersedes it,
+      keeping the kind of the first event;
+    - an insert followed by a remove cancels out, but a device reported
+      as present (which may already be known) is still removed;
+    - a remove followed by a new appearance becomes an update.
+
+    Events are kept in order of first appearance of each device.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        on_batch: Callable[[List[PendingPresenceEvent]], None],
+        schedule: Callable[[float, Callable[[], None]], None]
+    ) -> None:
+        """
+        :param window: Time in seconds between the first event of a batch
+            and the delivery of the batch.
+        :param on_batch: Invoked with each non-empty batch of events.
+        :param schedule: Function invoking a callback after a delay in
+            seconds, e.g. backed by a Qt timer.
+        """
+        self.window: float = window
+        self._on_batch = on_batch
+        self._schedule = schedule
+        self._pending: Dict[int, PendingPresenceEvent] = {}
+        self._flush_scheduled: bool = False
+
+    def add(self, event: PendingPresenceEvent) -> None:
+        previous = self._pending.get(event.device_id)
+        merged = event if previous is None else self._merge(previous, event)
+
+        # Assigning to an existing key keeps its position in the batch
+        if merged is None:
+            del self._pending[event.device_id]
+        else:
+            self._pending[event.device_id] = merged
+
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._schedule(self.window, self.flush)
+
+    def flush_device(self, device_id: int) -> None:
+        """
+        Hands over the pending event of a device right away, as a batch of
+        its own, e.g. before another event about the device which must not
+        be overtaken by it. The other events keep waiting.
+        """
+        event = self._pending.pop(device_id, None)
+        if event is not None:
+            self._on_batch([event])
+
+    def flush(self) -> None:
+        self._flush_scheduled = False
+        batch = list(self._pending.values())
+        self._pending.clear()
+        if batch:
+            self._on_batch(batch)
+
+    @staticmethod
+    def _merge(
+        previous: PendingPresenceEvent,
+        event: PendingPresenceEvent
+    ) -> Optional[PendingPresenceEvent]:
+        if previous.event in _APPEARANCE_EVENTS:
+            if event.event is not EventPresenceChangeType.REMOVE:
+                return event._replace(event=previous.event)
+            if previous.event is EventPresenceChangeType.INSERT:
+                return None
+            return event
+
+        if previous.event is EventPresenceChangeType.REMOVE \
+                and event.event is not EventPresenceChangeType.REMOVE:
+            return event._replace(event=EventPresenceChangeType.UPDATE)
+
+        return event
+
+
+# Any device type with `device_id` and `rule` attributes, e.g. `Device`
+_D = TypeVar('_D')
+
+
+@dataclass
+class DeviceInventoryDiff(Generic[_D]):
+    """Differences between two inventories of devices, by device id."""
+
+    inserted: List[_D]
+    removed: List[_D]
+    # The new version of each device whose rule changed
+    changed: List[_D]
+
+    def __bool__(self) -> bool:
+        return bool(self.inserted or self.removed or self.changed)
+
+
+def diff_device_inventories(
+    old: Iterable[_D],
+    new: Iterable[_D]
+) -> DeviceInventoryDiff[_D]:
+    """
+    Compares an inventory of devices with a newer one, e.g. to update a view
+    without rebuilding it. Devices are kept in the order of the inventory
+    they come from.
+    """
+    old_by_id = {device.device_id: device for device in old}
+    new_by_id = {device.device_id: device for device in new}
+
+    inserted = []
+    changed = []
+
+    for device_id, device in new_by_id.items():
+        old_device = old_by_id.get(device_id)
+        if old_device is None:
+            inserted.append(device)
+        elif old_device.rule != device.rule:
+            changed.append(device)
+
+    removed = [
+        device for device_id, device in old_by_id.items()
+        if device_id not in new_by_id
+    ]
+
+    return DeviceInventoryDiff(inserted, removed, changed)
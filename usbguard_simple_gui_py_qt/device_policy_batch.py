@@ -0,0 +1,118 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, List, Optional, Sequence, Tuple
+from .rules import RuleTarget
+
+# `(device id, target, permanent)`, as for `apply_device_policy`
+DevicePolicyChange = Tuple[int, RuleTarget, bool]
+
+
+@dataclass
+class DevicePolicyResult:
+    device_id: int
+    target: RuleTarget
+    permanent: bool
+    # The id of the new rule, for successful permanent changes
+    rule_id: Optional[int] = None
+    error: Optional[Exception] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class DevicePolicyBatchResult:
+    # In the same order as the requested changes
+    results: List[DevicePolicyResult]
+    # Wall time in seconds, from the first request to the last answer
+    elapsed: float
+
+    @property
+    def failures(self) -> List[DevicePolicyResult]:
+        return [result for result in self.results if not result.succeeded]
+
+
+class DevicePolicyBatch:
+    """
+    Collects the answers to a set of device policy changes sent at once,
+    and reports all of them when the last one arrives, whatever their
+    order.
+    """
+
+    def __init__(
+        self,
+        changes: Sequence[DevicePolicyChange],
+        on_done: Callable[[DevicePolicyBatchResult], None],
+        clock: Callable[[], float] = monotonic
+    ) -> None:
+        self._results = [
+            DevicePolicyResult(device_id, target, permanent)
+            for device_id, target, permanent in changes
+        ]
+        self._pending: int = len(self._results)
+        self._answered: List[bool] = [False] * self._pending
+        self._on_done = on_done
+        self._clock = clock
+        self._started: Optional[float] = None
+
+    @property
+    def results(self) -> List[DevicePolicyResult]:
+        return self._results
+
+    def start(self) -> None:
+        """Must be called right before sending the requests."""
+        self._started = self._clock()
+        if not self._pending:
+            self._finish()
+
+    def reply_handler(self, index: int) -> Callable[[Optional[int]], None]:
+        def handler(rule_id: Optional[int]) -> None:
+            self._answer(index, rule_id=rule_id)
+        return handler
+
+    def error_handler(self, index: int) -> Callable[[Exception], None]:
+        def handler(error: Exception) -> None:
+            self._answer(index, error=error)
+        return handler
+
+    def _answer(
+        self,
+        index: int,
+        rule_id: Optional[int] = None,
+        error: Optional[Exception] = None
+    ) -> None:
+        if self._answered[index]:
+            raise Exception(f'change #{index} already answered')
+        self._answered[index] = True
+
+        result = self._results[index]
+        result.rule_id = rule_id
+        result.error = error
+
+        self._pending -= 1
+        if not self._pending:
+            self._finish()
+
+    def _finish(self) -> None:
+        self._on_done(DevicePolicyBatchResult(
+            self._results, self._clock() - self._started))
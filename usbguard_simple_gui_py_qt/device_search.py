@@ -0,0 +1,190 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .rules import DeviceAttributeName, Rule
+
+# Length of the substrings indexed for the text attributes
+_NGRAM_LENGTH = 3
+
+_TEXT_ATTRIBUTES = (DeviceAttributeName.NAME,
+                    DeviceAttributeName.SERIAL,
+                    DeviceAttributeName.HASH)
+
+
+class DeviceSearchIndex:
+    """
+    Index of the devices by the attributes the user is most likely to search
+    them for, so that a query doesn't need to go through every device:
+
+    - `name`, `serial` and `hash` are matched by (case-insensitive)
+      substring, looking up the candidates by their n-grams;
+    - `id` is matched exactly, either as a whole (`0781:5581`) or by vendor
+      or product only (`0781`, `0781:`, `:5581`).
+
+    A query is split on whitespace, and a device matches it if it matches
+    all of its terms.
+    """
+
+    def __init__(self) -> None:
+        self._texts: Dict[int, str] = {}
+        self._id_keys: Dict[int, Tuple[str, ...]] = {}
+        self._ngrams: Dict[str, Set[int]] = {}
+        self._ids: Dict[str, Set[int]] = {}
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """A number changing whenever the indexed devices change."""
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, device_id: int) -> bool:
+        return device_id in self._texts
+
+    def add(self, device_id: int, rule: Rule) -> None:
+        """Indexes a device, replacing any previous entry with its id."""
+        text = self._text_of(rule)
+        id_keys = self._id_keys_of(rule)
+        if self._texts.get(device_id) == text \
+                and self._id_keys.get(device_id) == id_keys:
+            return
+
+        self.remove(device_id)
+        self._texts[device_id] = text
+        self._id_keys[device_id] = id_keys
+        for ngram in _ngrams_of(text):
+            self._ngrams.setdefault(ngram, set()).add(device_id)
+        for key in id_keys:
+            self._ids.setdefault(key, set()).add(device_id)
+        self._version += 1
+
+    def remove(self, device_id: int) -> None:
+        text = self._texts.pop(device_id, None)
+        if text is None:
+            return
+
+        for ngram in _ngrams_of(text):
+            _discard(self._ngrams, ngram, device_id)
+        for key in self._id_keys.pop(device_id):
+            _discard(self._ids, key, device_id)
+        self._version += 1
+
+    def clear(self) -> None:
+        self._texts.clear()
+        self._id_keys.clear()
+        self._ngrams.clear()
+        self._ids.clear()
+        self._version += 1
+
+    def search(self, query: str) -> Set[int]:
+        """
+        Returns the ids of the devices matching the query; all of them if
+        the query is blank.
+        """
+        terms = set(query.lower().split())
+        if not terms:
+            return set(self._texts)
+
+        # Starting from the most selective term, then only checking the
+        # devices matching so far against the other ones
+        matches: Optional[Set[int]] = None
+        for term in sorted(terms, key=self._estimate_matches):
+            matches = self._search_term(term, matches)
+            if not matches:
+                return set()
+        return matches or set()
+
+    def _estimate_matches(self, term: str) -> int:
+        """Returns an upper bound of the number of devices matching a term."""
+        id_matches = len(self._ids.get(term, ()))
+        if len(term) < _NGRAM_LENGTH:
+            return id_matches + len(self._texts)
+        return id_matches + min(
+            len(self._ngrams.get(ngram, ())) for ngram in _ngrams_of(term))
+
+    def _search_term(
+        self,
+        term: str,
+        restrict_to: Optional[Set[int]]
+    ) -> Set[int]:
+        matches = set(self._ids.get(term, ()))
+
+        candidates: Iterable[int]
+        if restrict_to is not None:
+            matches &= restrict_to
+            candidates = restrict_to
+        elif len(term) < _NGRAM_LENGTH:
+            # Too short to be looked up
+            candidates = self._texts
+        else:
+            candidate_sets = sorted(
+                (self._ngrams.get(ngram, set())
+                 for ngram in _ngrams_of(term)),
+                key=len)
+            candidates = set.intersection(*candidate_sets)
+
+        texts = self._texts
+        matches.update(
+            device_id for device_id in candidates
+            if term in texts[device_id])
+        return matches
+
+    @staticmethod
+    def _text_of(rule: Rule) -> str:
+        # Terms have no whitespace, so they can't match across the values
+        texts: List[str] = []
+        for name in _TEXT_ATTRIBUTES:
+            attribute = rule.attributes.get(name)
+            if attribute is not None:
+                texts.extend(str(value).lower() for value in attribute.values)
+        return '\n'.join(texts)
+
+    @staticmethod
+    def _id_keys_of(rule: Rule) -> Tuple[str, ...]:
+        attribute = rule.id
+        if attribute is None:
+            return ()
+
+        keys: List[str] = []
+        for device_id in attribute.values:
+            vendor = device_id.vendor_repr
+            product = device_id.product_repr
+            if device_id.vendor_id is not None:
+                keys += [vendor, f'{vendor}:']
+            if device_id.product_id is not None:
+                keys += [product, f':{product}', f'{vendor}:{product}']
+        return tuple(keys)
+
+
+def _ngrams_of(text: str) -> Set[str]:
+    return {
+        text[i:i + _NGRAM_LENGTH]
+        for i in range(len(text) - _NGRAM_LENGTH + 1)
+    }
+
+
+def _discard(index: Dict[str, Set[int]], key: str, device_id: int) -> None:
+    device_ids = index.get(key)
+    if device_ids is not None:
+        device_ids.discard(device_id)
+        if not device_ids:
+            del index[key]
@@ -0,0 +1,245 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from typing import Dict, List, Optional, Sequence
+
+
+class DeviceTopologyListener:
+    """
+    Notified of each change of a `DeviceTopology`, right before and after
+    it's made (e.g. to forward it to a Qt item model). Parents are device
+    ids, and `None` stands for the root of the tree; rows are as before the
+    change.
+    """
+
+    def before_insert(self, parent: Optional[int], row: int) -> None:
+        pass
+
+    def after_insert(self) -> None:
+        pass
+
+    def before_move(
+        self,
+        parent: Optional[int],
+        row: int,
+        new_parent: Optional[int],
+        new_row: int
+    ) -> None:
+        pass
+
+    def after_move(self) -> None:
+        pass
+
+    def before_remove(self, parent: Optional[int], row: int) -> None:
+        pass
+
+    def after_remove(self) -> None:
+        pass
+
+
+class DeviceTopology:
+    """
+    Tree of the devices, where the parent of a device is the device whose
+    `hash` is the `parent-hash` of the former, i.e. the hub (or dock, etc.)
+    it's plugged into.
+
+    The tree is updated incrementally, in time proportional to the direct
+    children of the added or removed device (and to its siblings, whose rows
+    shift):
+
+    - a device whose parent is not known (yet) is at the root, and it's
+      moved under its parent as soon as the latter is added;
+    - when a device is removed, its children are moved to another device
+      with the same hash, if any, or to the root.
+
+    Since several identical devices may have the same hash, the parent is
+    the first of them to be added which doesn't make a cycle.
+    """
+
+    def __init__(
+        self,
+        listener: Optional[DeviceTopologyListener] = None
+    ) -> None:
+        # Can be replaced at any time
+        self.listener = listener or DeviceTopologyListener()
+        self._hashes: Dict[int, Optional[str]] = {}
+        self._parent_hashes: Dict[int, Optional[str]] = {}
+        self._by_hash: Dict[str, List[int]] = {}
+        # The values are used as insertion-ordered sets
+        self._by_parent_hash: Dict[str, Dict[int, None]] = {}
+        self._parents: Dict[int, Optional[int]] = {}
+        self._children: Dict[Optional[int], List[int]] = {None: []}
+        self._rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._parents)
+
+    def __contains__(self, device_id: int) -> bool:
+        return device_id in self._parents
+
+    def parent_of(self, device_id: int) -> Optional[int]:
+        """
+        :raises KeyError: If the device is not in the tree.
+        """
+        return self._parents[device_id]
+
+    def children_of(self, device_id: Optional[int]) -> Sequence[int]:
+        """
+        Returns the ids of the children of a device (of the root if `None`),
+        in their order. The sequence must not be modified.
+
+        :raises KeyError: If the device is not in the tree.
+        """
+        return self._children[device_id]
+
+    def row_of(self, device_id: int) -> int:
+        """
+        Returns the position of a device among the children of its parent.
+
+        :raises KeyError: If the device is not in the tree.
+        """
+        return self._rows[device_id]
+
+    def add(
+        self,
+        device_id: int,
+        device_hash: Optional[str],
+        parent_hash: Optional[str]
+    ) -> None:
+        """
+        Adds a device to the tree. If the device is already there with
+        different hashes, it's removed and added again.
+        """
+        if device_id in self._parents:
+            if self._hashes[device_id] == device_hash \
+                    and self._parent_hashes[device_id] == parent_hash:
+                return
+            self.remove(device_id)
+
+        self._attach(device_id, self._find_parent(device_id, parent_hash))
+
+        self._hashes[device_id] = device_hash
+        self._parent_hashes[device_id] = parent_hash
+        if device_hash is not None:
+            self._by_hash.setdefault(device_hash, []).append(device_id)
+        if parent_hash is not None:
+            self._by_parent_hash.setdefault(parent_hash, {})[device_id] = None
+
+        # Adopting the devices which were waiting for this one
+        if device_hash is not None:
+            for child in list(self._by_parent_hash.get(device_hash, ())):
+                if self._parents[child] is None \
+                        and self._find_parent(child, device_hash) \
+                        == device_id:
+                    self._move(child, device_id)
+
+    def remove(self, device_id: int) -> None:
+        """Removes a device from the tree, if it's there."""
+        if device_id not in self._parents:
+            return
+
+        device_hash = self._hashes.pop(device_id)
+        parent_hash = self._parent_hashes.pop(device_id)
+        if device_hash is not None:
+            holders = self._by_hash[device_hash]
+            holders.remove(device_id)
+            if not holders:
+                del self._by_hash[device_hash]
+        if parent_hash is not None:
+            waiting = self._by_parent_hash[parent_hash]
+            del waiting[device_id]
+            if not waiting:
+                del self._by_parent_hash[parent_hash]
+
+        for child in list(self._children[device_id]):
+            self._move(
+                child, self._find_parent(child, self._parent_hashes[child]))
+
+        parent = self._parents[device_id]
+        self.listener.before_remove(parent, self._rows[device_id])
+        self._unlink(device_id)
+        del self._parents[device_id]
+        del self._children[device_id]
+        self.listener.after_remove()
+
+    def clear(self) -> None:
+        """Empties the tree, without notifying the listener."""
+        self._hashes.clear()
+        self._parent_hashes.clear()
+        self._by_hash.clear()
+        self._by_parent_hash.clear()
+        self._parents.clear()
+        self._children = {None: []}
+        self._rows.clear()
+
+    def _find_parent(
+        self,
+        device_id: int,
+        parent_hash: Optional[str]
+    ) -> Optional[int]:
+        if parent_hash is None:
+            return None
+        for candidate in self._by_hash.get(parent_hash, ()):
+            if not self._is_ancestor_or_self(device_id, candidate):
+                return candidate
+        return None
+
+    def _is_ancestor_or_self(
+        self,
+        ancestor: int,
+        device_id: Optional[int]
+    ) -> bool:
+        while device_id is not None:
+            if device_id == ancestor:
+                return True
+            device_id = self._parents.get(device_id)
+        return False
+
+    def _attach(self, device_id: int, parent: Optional[int]) -> None:
+        siblings = self._children[parent]
+        row = len(siblings)
+        self.listener.before_insert(parent, row)
+        siblings.append(device_id)
+        self._parents[device_id] = parent
+        self._children[device_id] = []
+        self._rows[device_id] = row
+        self.listener.after_insert()
+
+    def _move(self, device_id: int, new_parent: Optional[int]) -> None:
+        parent = self._parents[device_id]
+        if new_parent == parent:
+            return
+
+        new_siblings = self._children[new_parent]
+        new_row = len(new_siblings)
+        self.listener.before_move(
+            parent, self._rows[device_id], new_parent, new_row)
+        self._unlink(device_id)
+        new_siblings.append(device_id)
+        self._parents[device_id] = new_parent
+        self._rows[device_id] = new_row
+        self.listener.after_move()
+
+    def _unlink(self, device_id: int) -> None:
+        siblings = self._children[self._parents[device_id]]
+        row = self._rows.pop(device_id)
+        del siblings[row]
+        # Only the devices after the unlinked one are shifted
+        for shifted_row in range(row, len(siblings)):
+            self._rows[siblings[shifted_row]] = shifted_row
@@ -0,0 +1,100 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from queue import Queue
+from threading import Thread
+from typing import Any, Callable, Optional
+
+# Work done on the worker thread, returning the work to be done back on the
+# delivering side (e.g. the GUI thread), if any
+Job = Callable[[], Optional[Callable[[], Any]]]
+
+_STOP = object()
+
+
+class EventWorker:
+    """
+    Background thread running jobs in submission order.
+
+    Whatever a job returns is handed to `deliver`, from the worker thread:
+    it is expected to marshal it to the right thread (e.g. through a queued
+    Qt signal) and call it there.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[Callable[[], Any]], None],
+        on_error: Callable[[Exception], None],
+        name: str = 'event-worker'
+    ) -> None:
+        """
+        :param deliver: Receives the callables returned by the jobs.
+        :param on_error: Invoked through `deliver` with any exception raised
+            by a job.
+        """
+        self._deliver = deliver
+        self._on_error = on_error
+        self._queue: 'Queue[Any]' = Queue()
+        self._thread = Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Job) -> None:
+        self._queue.put(job)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stops the thread after the jobs already submitted."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            try:
+                result = job()
+            except Exception as error:
+                self._deliver(lambda error=error: self._on_error(error))
+                continue
+            if result is not None:
+                self._deliver(result)
+
+
+class TimingStats:
+    """Running count, total and maximum of a set of durations."""
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def clear(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
@@ -19,6 +19,7 @@
 
 import signal
 import sys
+from typing import List, Tuple
 
 from PySide2.QtCore import QSize, QItemSelection
 from PySide2.QtGui import Qt
@@ -28,12 +29,20 @@ from PySide2.QtWidgets import (QApplication,
                                QHeaderView,
                                QHBoxLayout,
                                QAbstractItemView,
+                               QLineEdit,
+                               QMessageBox,
                                QStyle,
+                               QTabWidget,
+                               QTreeView,
                                QVBoxLayout,
                                QPushButton,
                                QWidget)
 from . import APP_NAME
-from .device import Device, DeviceModel
+from .device import (Device,
+                     DeviceFilterProxyModel,
+                     DeviceModel,
+                     DeviceTreeModel)
+from .device_policy_batch import DevicePolicyBatchResult
 from .rules import RuleTarget
 from .usbguard_dbus_interface import (CallbackEventType,
                                       EventPresenceChangeType,
@@ -52,11 +61,22 @@ class MainWindow(QDialog):
         self._usbguard_dbus = usbguard_dbus
 
         self._register_dbus_callbacks()
-        self._device_model = DeviceModel(self._usbguard_dbus.list_devices())
+        self._device_model = DeviceModel([])
+        self._device_filter = DeviceFilterProxyModel(self._device_model)
+        self._filter_bar = self._create_filter_bar()
         self._device_table = self._create_device_table()
+        self._device_tree_model = DeviceTreeModel([])
+        self._device_tree = self._create_device_tree()
+        self._device_views = self._create_device_views()
         self._controls_section = self._create_controls_section()
         self._init_window_content_and_aspect()
 
+        # The device list is filled as soon as USBGuard is running and
+        # replies, without blocking the construction of the window.
+        self._usbguard_dbus.call_when_available(
+            lambda: self._usbguard_dbus.list_devices_async(
+                self._on_list_devices_reply, self._on_list_devices_error))
+
     def _register_dbus_callbacks(self) -> None:
         self._usbguard_dbus.register_callback(
             CallbackEventType.DEVICE_PRESENCE_CHANGED,
@@ -66,11 +86,23 @@ class MainWindow(QDialog):
             CallbackEventType.DEVICE_POLICY_CHANGED,
             self._on_device_policy_changed)
 
+        self._usbguard_dbus.register_callback(
+            CallbackEventType.DAEMON_RECONNECTED,
+            self._on_daemon_reconnected)
+
+    def _create_filter_bar(self) -> QLineEdit:
+        filter_bar = QLineEdit()
+        filter_bar.setPlaceholderText(
+            'Filter by name, serial, hash or vendor:product ID')
+        filter_bar.setClearButtonEnabled(True)
+        filter_bar.textChanged.connect(self._device_filter.set_search_text)
+        return filter_bar
+
     def _create_device_table(self) -> QTableView:
         device_table = QTableView()
-        device_table.setModel(self._device_model)
+        device_table.setModel(self._device_filter)
         device_table.setSelectionBehavior(QAbstractItemView.SelectRows)
-        device_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        device_table.setSelectionMode(QAbstractItemView.ExtendedSelection)
 
         device_table.selectionModel().selectionChanged.connect(
             self._on_device_table_selection_changed)
@@ -83,6 +115,47 @@ class MainWindow(QDialog):
 
         return device_table
 
+    def _create_device_tree(self) -> QTreeView:
+        device_tree = QTreeView()
+        device_tree.setModel(self._device_tree_model)
+        device_tree.setSelectionBehavior(QAbstractItemView.SelectRows)
+        device_tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        device_tree.setUniformRowHeights(True)
+
+        device_tree.selectionModel().selectionChanged.connect(
+            self._on_device_table_selection_changed)
+        # Newly plugged devices are shown with their hub expanded
+        self._device_tree_model.rowsInserted.connect(
+            lambda parent, _first, _last: device_tree.expand(parent))
+        self._device_tree_model.rowsMoved.connect(
+            lambda _parent, _first, _last, new_parent, _row:
+                device_tree.expand(new_parent))
+        self._device_tree_model.modelReset.connect(device_tree.expandAll)
+
+        # The device names first, where the tree is drawn
+        header = device_tree.header()
+        header.moveSection(2, 0)
+        device_tree.setTreePosition(2)
+        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+
+        return device_tree
+
+    def _create_device_views(self) -> QTabWidget:
+        list_layout = QVBoxLayout()
+        list_layout.addWidget(self._filter_bar)
+        list_layout.addWidget(self._device_table)
+        list_layout.setContentsMargins(0, 0, 0, 0)
+
+        list_page = QWidget()
+        list_page.setLayout(list_layout)
+
+        device_views = QTabWidget()
+        device_views.addTab(list_page, 'Devices')
+        device_views.addTab(self._device_tree, 'Hubs')
+        device_views.currentChanged.connect(self._on_device_view_changed)
+
+        return device_views
+
     def _create_controls_section(self) -> QWidget:
         btn_allow = QPushButton('Allow')
         btn_allow.clicked.connect(self._on_allow_click)
@@ -107,7 +180,7 @@ class MainWindow(QDialog):
 
     def _init_window_content_and_aspect(self) -> None:
         window_layout = QVBoxLayout()
-        window_layout.addWidget(self._device_table)
+        window_layout.addWidget(self._device_views)
         window_layout.addWidget(self._controls_section)
         self.setLayout(window_layout)
 
@@ -123,7 +196,10 @@ class MainWindow(QDialog):
         selected: QItemSelection,
         _deselected: QItemSelection
     ) -> None:
-        self._controls_section.setVisible(not selected.isEmpty())
+        self._controls_section.setVisible(bool(self._get_selected_devices()))
+
+    def _on_device_view_changed(self, _index: int) -> None:
+        self._controls_section.setVisible(bool(self._get_selected_devices()))
 
     def _on_device_presence_changed(
         self,
@@ -131,10 +207,11 @@ class MainWindow(QDialog):
         event: EventPresenceChangeType,
         _target: int
     ) -> None:
-        if event is EventPresenceChangeType.REMOVE:
-            self._device_model.remove_device(device)
-        else:
-            self._device_model.update_or_add_device(device)
+        for model in self._device_models:
+            if event is EventPresenceChangeType.REMOVE:
+                model.remove_device(device)
+            else:
+                model.update_or_add_device(device)
 
     def _on_device_policy_changed(
         self,
@@ -143,28 +220,91 @@ class MainWindow(QDialog):
         _target_new: RuleTarget,
         _rule_id: int
     ) -> None:
-        self._device_model.update_or_add_device(device)
+        for model in self._device_models:
+            model.update_or_add_device(device)
+
+    def _on_list_devices_reply(self, devices: List[Device]) -> None:
+        for model in self._device_models:
+            model.reset_devices(devices)
+
+    def _on_daemon_reconnected(self) -> None:
+        # Signals may have been missed while USBGuard was away: resyncing,
+        # while keeping the rows (and the selection) of unchanged devices.
+        self._usbguard_dbus.list_devices_async(
+            self._sync_devices, self._on_list_devices_error)
+
+    def _sync_devices(self, devices: List[Device]) -> None:
+        for model in self._device_models:
+            model.sync_devices(devices)
+
+    @property
+    def _device_models(self) -> Tuple[DeviceModel, DeviceTreeModel]:
+        return self._device_model, self._device_tree_model
+
+    def _on_list_devices_error(self, error: Exception) -> None:
+        self._show_error_message('Cannot list the USB devices.', error)
 
     def _on_allow_click(self):
-        device = self._get_selected_device()
-        self._usbguard_dbus.apply_device_policy(
-            device.device_id, RuleTarget.ALLOW, False)
+        self._apply_policy_to_selected_devices(RuleTarget.ALLOW)
 
     def _on_block_click(self):
-        device = self._get_selected_device()
-        self._usbguard_dbus.apply_device_policy(
-            device.device_id, RuleTarget.BLOCK, False)
+        self._apply_policy_to_selected_devices(RuleTarget.BLOCK)
 
     def _on_reject_click(self):
-        device = self._get_selected_device()
-        self._usbguard_dbus.apply_device_policy(
-            device.device_id, RuleTarget.REJECT, False)
-
-    def _get_selected_device(self) -> Device:
-        selection = self._device_table.selectionModel().selection()
-        row = selection.first().topLeft().row()
-        device = self._device_model.devices[row]
-        return device
+        self._apply_policy_to_selected_devices(RuleTarget.REJECT)
+
+    def _apply_policy_to_selected_devices(self, target: RuleTarget) -> None:
+        # The model is updated by the policy change signals, so only the
+        # errors are handled on reply.
+        self._usbguard_dbus.apply_device_policies(
+            [
+                (device.device_id, target, False)
+                for device in self._get_selected_devices()
+            ],
+            self._on_apply_device_policies_done)
+
+    def _on_apply_device_policies_done(
+        self,
+        batch_result: DevicePolicyBatchResult
+    ) -> None:
+        failures = batch_result.failures
+        if not failures:
+            return
+
+        if len(failures) == 1:
+            self._show_error_message(
+                'Cannot apply the device policy.', failures[0].error)
+            return
+
+        QMessageBox.warning(
+            self,
+            APP_NAME,
+            f'Cannot apply the policy of {len(failures)} devices.\n\n'
+            'Details:\n' + '\n'.join(
+                f'#{failure.device_id}: '
+                f'{type(failure.error).__name__} - {failure.error}'
+                for failure in failures))
+
+    def _show_error_message(self, description: str, error: Exception) -> None:
+        QMessageBox.warning(
+            self,
+            APP_NAME,
+            f'{description}\n\nDetails:\n{type(error).__name__} - {error}')
+
+    def _get_selected_devices(self) -> List[Device]:
+        if self._device_views.currentWidget() is self._device_tree:
+            return [
+                self._device_tree_model.device_at(index)
+                for index in self._device_tree.selectionModel().selectedRows()
+            ]
+
+        rows = self._device_table.selectionModel().selectedRows()
+        return [
+            self._device_model.devices[row]
+            for row in sorted(
+                self._device_filter.mapToSource(index).row()
+                for index in rows)
+        ]
 
 
 def main() -> None:
@@ -0,0 +1,281 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Parallel parsing of large policies, splitting the input into line-aligned
+chunks which are parsed in a `ProcessPoolExecutor`.
+
+Results travel back from the worker processes in a compact tuple-based
+representation, and are returned in the original order.
+"""
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple
+from .rule_parsing import (DEFAULT_VALUE_INTERNER,
+                           iter_file_lines,
+                           ParsedLine,
+                           RuleParser,
+                           RuleParsingError,
+                           ValueInterner)
+from .rules import (DeviceAttribute,
+                    DeviceAttributeName,
+                    DeviceAttributeOperator,
+                    DeviceId,
+                    DeviceInterfaceType,
+                    Rule,
+                    RuleTarget)
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # bytes
+DEFAULT_MIN_PARALLEL_SIZE = 4 << 20  # bytes
+DEFAULT_CHUNK_LINES = 16_384
+DEFAULT_MIN_PARALLEL_LINES = 65_536
+
+CompactRule = Tuple[
+    str, Tuple[Tuple[str, Optional[str], Tuple[Any, ...]], ...]]
+
+# Either a compact rule or the message of a `RuleParsingError`
+_CompactParsedLine = Tuple[int, Any]
+
+
+def parse_file_parallel(
+    path: str,
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    min_parallel_size: int = DEFAULT_MIN_PARALLEL_SIZE,
+    encoding: str = 'utf-8'
+) -> List[ParsedLine]:
+    """
+    Parallel equivalent of `RuleParser.iter_file`.
+
+    See `parse_files_parallel` for the description of the parameters.
+    """
+    return parse_files_parallel(
+        [path], max_workers, chunk_size, min_parallel_size, encoding)[0]
+
+
+def parse_files_parallel(
+    paths: Sequence[str],
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    min_parallel_size: int = DEFAULT_MIN_PARALLEL_SIZE,
+    encoding: str = 'utf-8'
+) -> List[List[ParsedLine]]:
+    """
+    Parses many `rules.conf` files, sharing the same pool of processes.
+
+    :param paths: The files to parse.
+    :param max_workers: Maximum amount of worker processes; by default, the
+        amount of CPUs. With a single worker, parsing happens in the current
+        process.
+    :param chunk_size: Approximate size in bytes of each chunk handed to a
+        worker; chunks are always extended up to the end of a line.
+    :param min_parallel_size: If the total size of the files is below this
+        value, they are parsed in the current process, where it's cheaper
+        than starting the workers.
+    :param encoding: Encoding of the files.
+    :return: For each path, the same results that `RuleParser.iter_file`
+        would produce.
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+
+    if sum(sizes) < min_parallel_size or _is_single_worker(max_workers):
+        return [list(RuleParser.iter_file(path, encoding)) for path in paths]
+
+    chunks = [
+        (file_index, path, start, end, encoding)
+        for file_index, (path, size) in enumerate(zip(paths, sizes))
+        for start, end in _split_file(path, size, chunk_size)
+    ]
+
+    results: List[List[ParsedLine]] = [[] for _ in paths]
+    line_offsets = [0] * len(paths)
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        chunk_results = executor.map(_parse_file_chunk, chunks)
+        for (file_index, *_), (line_count, parsed_lines) in \
+                zip(chunks, chunk_results):
+            offset = line_offsets[file_index]
+            results[file_index].extend(
+                _decode_parsed_lines(parsed_lines, offset))
+            line_offsets[file_index] = offset + line_count
+
+    return results
+
+
+def parse_many_parallel(
+    lines: Sequence[str],
+    first_line_no: int = 1,
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_LINES,
+    min_parallel_size: int = DEFAULT_MIN_PARALLEL_LINES
+) -> List[ParsedLine]:
+    """
+    Parallel equivalent of `RuleParser.parse_many`, for lines already in
+    memory. Here `chunk_size` and `min_parallel_size` are amounts of lines.
+    """
+    if len(lines) < min_parallel_size or _is_single_worker(max_workers):
+        return list(RuleParser.parse_many(lines, first_line_no))
+
+    chunks = [
+        (lines[start:start + chunk_size], first_line_no + start)
+        for start in range(0, len(lines), chunk_size)
+    ]
+
+    results: List[ParsedLine] = []
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        for parsed_lines in executor.map(_parse_lines_chunk, chunks):
+            results.extend(_decode_parsed_lines(parsed_lines, 0))
+
+    return results
+
+
+def encode_rule(rule: Rule) -> CompactRule:
+    """
+    Returns a compact representation of the rule, made only of tuples,
+    strings and integers, which is cheap to pickle.
+    """
+    return (
+        rule.target.value,
+        tuple(
+            (
+                attribute.name.value,
+                attribute.operator.value if attribute.operator else None,
+                tuple(map(_encode_value, attribute.values))
+            )
+            for attribute in rule.attributes.values()
+        )
+    )
+
+
+def decode_rule(
+    compact_rule: CompactRule,
+    interner: Optional[ValueInterner] = None
+) -> Rule:
+    """
+    The inverse of `encode_rule`.
+
+    :param interner: The pool of shared values used for the decoded rule, as
+        for `RuleParser.parse`.
+    """
+    if interner is None:
+        interner = DEFAULT_VALUE_INTERNER
+    intern = interner.intern
+    target, attributes = compact_rule
+    decoded_attributes = {}
+
+    for name, operator, values in attributes:
+        attribute_name = DeviceAttributeName(name)
+        decode_value = _VALUE_DECODERS.get(attribute_name, str)
+        attribute = DeviceAttribute(
+            attribute_name,
+            DeviceAttributeOperator(operator) if operator else None,
+            [intern(decode_value(value)) for value in values])
+        decoded_attributes[attribute_name] = \
+            interner.intern_attribute(attribute)
+
+    return Rule(target=RuleTarget(target), attributes=decoded_attributes)
+
+
+def _is_single_worker(max_workers: Optional[int]) -> bool:
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    return max_workers == 1
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, DeviceId):
+        return value.vendor_id, value.product_id
+    elif isinstance(value, DeviceInterfaceType):
+        return value.iface_class, value.iface_subclass, value.iface_protocol
+    return value
+
+
+_VALUE_DECODERS = {
+    DeviceAttributeName.ID: lambda value: DeviceId(*value),
+    DeviceAttributeName.WITH_INTERFACE:
+        lambda value: DeviceInterfaceType(*value),
+}
+
+
+def _split_file(
+    path: str,
+    size: int,
+    chunk_size: int
+) -> List[Tuple[int, int]]:
+    if size == 0:
+        return []
+
+    chunks = []
+
+    with open(path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            newline = mm.find(b'\n', start + chunk_size)
+            end = size if newline == -1 else newline + 1
+            chunks.append((start, end))
+            start = end
+
+    return chunks
+
+
+def _parse_file_chunk(
+    chunk: Tuple[int, str, int, int, str]
+) -> Tuple[int, List[_CompactParsedLine]]:
+    _file_index, path, start, end, encoding = chunk
+    line_count = 0
+
+    def counted_lines():
+        nonlocal line_count
+        for line in iter_file_lines(path, start, end):
+            line_count += 1
+            yield line
+
+    parsed_lines = _encode_parsed_lines(
+        RuleParser.parse_byte_lines(counted_lines(), encoding))
+    return line_count, parsed_lines
+
+
+def _parse_lines_chunk(
+    chunk: Tuple[Sequence[str], int]
+) -> List[_CompactParsedLine]:
+    lines, first_line_no = chunk
+    return _encode_parsed_lines(RuleParser.parse_many(lines, first_line_no))
+
+
+def _encode_parsed_lines(parsed_lines) -> List[_CompactParsedLine]:
+    return [
+        (line_no, str(result) if isinstance(result, RuleParsingError)
+            else encode_rule(result))
+        for line_no, result in parsed_lines
+    ]
+
+
+def _decode_parsed_lines(
+    parsed_lines: List[_CompactParsedLine],
+    line_offset: int
+) -> List[ParsedLine]:
+    return [
+        (line_no + line_offset, RuleParsingError(result)
+            if isinstance(result, str) else decode_rule(result))
+        for line_no, result in parsed_lines
+    ]
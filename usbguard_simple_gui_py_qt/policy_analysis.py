@@ -0,0 +1,479 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Static analysis of USBGuard policies, looking for duplicate, shadowed and
+conflicting rules.
+
+USBGuard applies the first matching rule, so a rule is dead (shadowed) if
+an earlier rule matches every device it would match, and two rules with
+different targets conflict if some device could match both, without one
+being a plain special case of the other.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from enum import Enum, unique
+from heapq import merge
+from typing import (Any,
+                    DefaultDict,
+                    Dict,
+                    FrozenSet,
+                    Iterable,
+                    List,
+                    Optional,
+                    Sequence,
+                    Tuple)
+from .rule_matching import unique_sorted, value_covers
+from .rules import (DeviceAttribute,
+                    DeviceAttributeName,
+                    DeviceAttributeOperator,
+                    DeviceId,
+                    DeviceInterfaceType,
+                    Rule)
+
+_ALL_OF = DeviceAttributeOperator.ALL_OF
+_ONE_OF = DeviceAttributeOperator.ONE_OF
+_NONE_OF = DeviceAttributeOperator.NONE_OF
+_EQUALS = DeviceAttributeOperator.EQUALS
+_EQUALS_ORDERED = DeviceAttributeOperator.EQUALS_ORDERED
+
+# Operators which make a device match only if, for every rule value, it has
+# a value matched by it
+_CONTAINS_ALL_OPERATORS = frozenset([_ALL_OF, _EQUALS, _EQUALS_ORDERED])
+
+# Attributes for which a device always has exactly one value
+_SINGLE_VALUED_ATTRIBUTES = frozenset(DeviceAttributeName) \
+    - {DeviceAttributeName.WITH_INTERFACE}
+
+
+@unique
+class PolicyIssueType(Enum):
+    # The rule has the same attributes and target of an earlier rule
+    DUPLICATE = 'duplicate'
+    # An earlier rule matches every device matched by the rule
+    SHADOWED = 'shadowed'
+    # An earlier rule with a different target matches some of the devices
+    # matched by the rule, without covering all of them
+    CONFLICT = 'conflict'
+
+
+@dataclass(frozen=True)
+class PolicyIssue:
+    __slots__ = ('issue_type', 'rule_index', 'other_rule_index')
+
+    issue_type: PolicyIssueType
+    rule_index: int
+    # The earlier rule causing the issue
+    other_rule_index: int
+
+
+def analyze_policy(policy: Sequence[Rule]) -> List[PolicyIssue]:
+    """
+    Finds duplicate, shadowed and conflicting rules.
+
+    Rather than comparing all the pairs of rules, each rule is compared
+    only with the earlier rules which could match a common device according
+    to an index of the rules by device id (or by hash, for rules without a
+    specific id, or by interface class, for rules without a hash either).
+    Only rules constraining none of them are compared with every earlier
+    rule.
+
+    The analysis is conservative: rules are reported as shadowed only if
+    they are certainly dead, and as conflicting only if they cannot be
+    proven disjoint.
+
+    :return: The issues, sorted by rule index. Each rule is reported at most
+        once as duplicate or shadowed, but it may conflict with many rules.
+    """
+    issues = []
+    first_by_attributes: Dict[FrozenSet[DeviceAttribute], int] = {}
+    id_index = _KeyIndex(DeviceAttributeName.ID)
+    hash_index = _KeyIndex(DeviceAttributeName.HASH)
+    interface_index = _InterfaceClassIndex()
+
+    for index, rule in enumerate(policy):
+        attributes_key = frozenset(rule.attributes.values())
+        identical_index = first_by_attributes.setdefault(attributes_key, index)
+
+        if identical_index != index:
+            issue_type = PolicyIssueType.DUPLICATE \
+                if policy[identical_index].target is rule.target \
+                else PolicyIssueType.SHADOWED
+            issues.append(PolicyIssue(issue_type, index, identical_index))
+        else:
+            if id_index.has_keys(rule):
+                candidates = id_index.candidates(rule)
+            elif hash_index.has_keys(rule):
+                candidates = hash_index.candidates(rule)
+            else:
+                candidates = interface_index.candidates(rule)
+            issues.extend(_compare_with_earlier_rules(
+                policy, index, rule, candidates))
+
+        id_index.add(index, rule)
+        hash_index.add(index, rule)
+        interface_index.add(index, rule)
+
+    return issues
+
+
+def rule_covers(rule: Rule, other: Rule) -> bool:
+    """
+    Tells whether every device matched by `other` is certainly matched by
+    `rule` too.
+    """
+    other_attributes = other.attributes
+    for name, attribute in rule.attributes.items():
+        other_attribute = other_attributes.get(name)
+        if other_attribute is None \
+                or not attribute_covers(attribute, other_attribute):
+            return False
+    return True
+
+
+def rules_may_overlap(rule: Rule, other: Rule) -> bool:
+    """
+    Tells whether some device could be matched by both rules, i.e. whether
+    they cannot be proven disjoint.
+    """
+    other_attributes = other.attributes
+    for name, attribute in rule.attributes.items():
+        other_attribute = other_attributes.get(name)
+        if other_attribute is not None \
+                and not attribute_may_overlap(attribute, other_attribute):
+            return False
+    return True
+
+
+def attribute_covers(
+    attribute: DeviceAttribute,
+    other: DeviceAttribute
+) -> bool:
+    """
+    Tells whether every device satisfying `other` certainly satisfies
+    `attribute` too. The two attributes must have the same name.
+    """
+    if attribute == other:
+        return True
+
+    operator = attribute.operator or _EQUALS
+    other_operator = other.operator or _EQUALS
+    values = attribute.values
+    other_values = other.values
+
+    if operator is _ONE_OF:
+        if other_operator in _CONTAINS_ALL_OPERATORS:
+            return any(_covers_any(value, other_values) for value in values)
+        if other_operator is _ONE_OF:
+            return all(_covered_by_any(other_value, values)
+                       for other_value in other_values)
+    elif operator is _ALL_OF:
+        if other_operator in _CONTAINS_ALL_OPERATORS:
+            return all(_covers_any(value, other_values) for value in values)
+        if other_operator is _ONE_OF:
+            return all(value_covers(value, other_value)
+                       for value in values for other_value in other_values)
+    elif operator is _NONE_OF:
+        if other_operator is _NONE_OF:
+            return all(_covered_by_any(value, other_values)
+                       for value in values)
+    elif operator is _EQUALS:
+        if other_operator in (_EQUALS, _EQUALS_ORDERED):
+            return len(values) == len(other_values) \
+                and all(_covers_any(value, other_values) for value in values)
+    elif operator is _EQUALS_ORDERED:
+        if other_operator is _EQUALS_ORDERED:
+            return len(values) == len(other_values) and all(
+                value_covers(value, other_value)
+                for value, other_value in zip(values, other_values))
+
+    return False
+
+
+def attribute_may_overlap(
+    attribute: DeviceAttribute,
+    other: DeviceAttribute
+) -> bool:
+    """
+    Tells whether some device could satisfy both attributes, i.e. whether
+    they cannot be proven disjoint. The two attributes must have the same
+    name.
+    """
+    operator = attribute.operator or _EQUALS
+    other_operator = other.operator or _EQUALS
+    values = attribute.values
+    other_values = other.values
+
+    if operator is _NONE_OF and other_operator is _NONE_OF:
+        return True
+
+    if operator is _NONE_OF or other_operator is _NONE_OF:
+        if operator is _NONE_OF:
+            operator, other_operator = other_operator, operator
+            values, other_values = other_values, values
+        # Now only `values` is a positive constraint: a device must have a
+        # value matched by one of them (by each of them, for operators other
+        # than one-of), which must not be matched by any of `other_values`.
+        excluded = [_covered_by_any(value, other_values) for value in values]
+        return not (all(excluded) if operator is _ONE_OF else any(excluded))
+
+    if operator in (_EQUALS, _EQUALS_ORDERED) \
+            and other_operator in (_EQUALS, _EQUALS_ORDERED) \
+            and len(values) != len(other_values):
+        return False
+
+    if attribute.name in _SINGLE_VALUED_ATTRIBUTES:
+        # The only value of the device must be matched by both attributes
+        return any(_values_intersect(value, other_value)
+                   for value in values for other_value in other_values)
+
+    if _matches_all_device_values(other_operator, other_values):
+        operator, other_operator = other_operator, operator
+        values, other_values = other_values, values
+
+    if _matches_all_device_values(operator, values):
+        # Every value of the device is matched by one of `values`, and one
+        # (or each) of `other_values` must match a value of the device
+        intersecting = [
+            any(_values_intersect(value, other_value) for value in values)
+            for other_value in other_values
+        ]
+        return any(intersecting) if other_operator is _ONE_OF \
+            else all(intersecting)
+
+    return True
+
+
+class _KeyIndex:
+    """
+    Index of rules by the values of a single-valued attribute (`id` or
+    `hash`), used to find the earlier rules which could match a common
+    device.
+    """
+
+    def __init__(self, attribute_name: DeviceAttributeName) -> None:
+        self._attribute_name = attribute_name
+        # Rules without usable keys, which may overlap with any rule
+        self._unkeyed: List[int] = []
+        self._by_key: DefaultDict[Any, List[int]] = defaultdict(list)
+        # Device ids only: rules keyed by `vendor:*` and by specific ids,
+        # grouped by vendor id
+        self._by_vendor_wildcard: DefaultDict[int, List[int]] = \
+            defaultdict(list)
+        self._by_vendor: DefaultDict[int, List[int]] = defaultdict(list)
+        self._all: List[int] = []
+
+    def has_keys(self, rule: Rule) -> bool:
+        return self._keys(rule) is not None
+
+    def add(self, index: int, rule: Rule) -> None:
+        self._all.append(index)
+        keys = self._keys(rule)
+
+        if keys is None:
+            self._unkeyed.append(index)
+            return
+
+        for key in keys:
+            if isinstance(key, DeviceId):
+                if key.product_id is None:
+                    self._by_vendor_wildcard[key.vendor_id].append(index)
+                else:
+                    self._by_key[key].append(index)
+                    self._by_vendor[key.vendor_id].append(index)
+            else:
+                self._by_key[key].append(index)
+
+    def candidates(self, rule: Rule) -> Iterable[int]:
+        keys = self._keys(rule)
+
+        if keys is None:
+            return list(self._all)
+
+        buckets = [self._unkeyed]
+        for key in keys:
+            if isinstance(key, DeviceId):
+                buckets.append(self._by_vendor_wildcard.get(key.vendor_id, ()))
+                if key.product_id is None:
+                    buckets.append(self._by_vendor.get(key.vendor_id, ()))
+                else:
+                    buckets.append(self._by_key.get(key, ()))
+            else:
+                buckets.append(self._by_key.get(key, ()))
+
+        return unique_sorted(merge(*buckets))
+
+    def _keys(self, rule: Rule) -> Optional[Tuple[Any, ...]]:
+        attribute = rule.attributes.get(self._attribute_name)
+
+        if attribute is None or not attribute.values \
+                or attribute.operator is _NONE_OF:
+            return None
+
+        values = attribute.values
+        if self._attribute_name is DeviceAttributeName.ID \
+                and any(value.vendor_id is None for value in values):
+            return None
+
+        return values
+
+
+class _InterfaceClassIndex:
+    """
+    Index of rules by the interface classes of their `with-interface`
+    attribute, used like `_KeyIndex`.
+
+    Unlike `id` and `hash`, a device has many interfaces, so two rules
+    requiring interfaces of different classes may still match a common
+    device, unless one of them also requires all the interfaces of the
+    device to be of its classes (see `_matches_all_device_values`).
+    """
+
+    def __init__(self) -> None:
+        # Rules without positive interface constraints
+        self._unkeyed: List[int] = []
+        # Rules requiring an interface of one of the classes...
+        self._by_required_class: DefaultDict[int, List[int]] = \
+            defaultdict(list)
+        # ... and whether they require all of them to be of those classes
+        self._by_confining_class: DefaultDict[int, List[int]] = \
+            defaultdict(list)
+        self._not_confining: List[int] = []
+        self._all: List[int] = []
+
+    def has_keys(self, rule: Rule) -> bool:
+        return self._classes(rule) is not None
+
+    def add(self, index: int, rule: Rule) -> None:
+        self._all.append(index)
+        classes = self._classes(rule)
+
+        if classes is None:
+            self._unkeyed.append(index)
+            return
+
+        for iface_class in classes:
+            self._by_required_class[iface_class].append(index)
+        if self._is_confining(rule):
+            for iface_class in classes:
+                self._by_confining_class[iface_class].append(index)
+        else:
+            self._not_confining.append(index)
+
+    def candidates(self, rule: Rule) -> Iterable[int]:
+        classes = self._classes(rule)
+
+        if classes is None:
+            return list(self._all)
+
+        buckets = [self._unkeyed]
+        if self._is_confining(rule):
+            # Only rules requiring an interface of one of these classes
+            buckets.extend(self._by_required_class.get(iface_class, ())
+                           for iface_class in classes)
+        else:
+            buckets.append(self._not_confining)
+            buckets.extend(self._by_confining_class.get(iface_class, ())
+                           for iface_class in classes)
+
+        return unique_sorted(merge(*buckets))
+
+    @staticmethod
+    def _classes(rule: Rule) -> Optional[FrozenSet[int]]:
+        attribute = rule.with_interface
+
+        if attribute is None or not attribute.values \
+                or attribute.operator is _NONE_OF:
+            return None
+
+        return frozenset(value.iface_class for value in attribute.values)
+
+    @staticmethod
+    def _is_confining(rule: Rule) -> bool:
+        attribute = rule.with_interface
+        return _matches_all_device_values(
+            attribute.operator or _EQUALS, attribute.values)
+
+
+def _compare_with_earlier_rules(
+    policy: Sequence[Rule],
+    index: int,
+    rule: Rule,
+    candidates: Iterable[int]
+) -> List[PolicyIssue]:
+    conflicts = []
+
+    for other_index in candidates:
+        other = policy[other_index]
+
+        if rule_covers(other, rule):
+            return [PolicyIssue(
+                PolicyIssueType.SHADOWED, index, other_index)]
+
+        if other.target is not rule.target \
+                and not rule_covers(rule, other) \
+                and rules_may_overlap(other, rule):
+            conflicts.append(PolicyIssue(
+                PolicyIssueType.CONFLICT, index, other_index))
+
+    return conflicts
+
+
+def _covers_any(value: Any, other_values: Sequence[Any]) -> bool:
+    return any(value_covers(value, other_value)
+               for other_value in other_values)
+
+
+def _covered_by_any(value: Any, other_values: Sequence[Any]) -> bool:
+    return any(value_covers(other_value, value)
+               for other_value in other_values)
+
+
+def _values_intersect(value: Any, other: Any) -> bool:
+    if isinstance(value, DeviceId):
+        return _optional_equal(value.vendor_id, other.vendor_id) \
+            and _optional_equal(value.product_id, other.product_id)
+    elif isinstance(value, DeviceInterfaceType):
+        return value.iface_class == other.iface_class \
+            and _optional_equal(value.iface_subclass, other.iface_subclass) \
+            and _optional_equal(value.iface_protocol, other.iface_protocol)
+    return value == other
+
+
+def _matches_all_device_values(
+    operator: DeviceAttributeOperator,
+    values: Sequence[Any]
+) -> bool:
+    """
+    Tells whether an attribute guarantees that every value of a matching
+    device is matched by one of its values. This holds for `equals` and
+    `equals-ordered` only if no two values can match the same device value,
+    as they only require each rule value to match some device value and the
+    amount of values to be the same.
+    """
+    if operator is not _EQUALS and operator is not _EQUALS_ORDERED:
+        return False
+    return not any(_values_intersect(value, other_value)
+                   for i, value in enumerate(values)
+                   for other_value in values[i + 1:])
+
+
+def _optional_equal(value: Optional[int], other: Optional[int]) -> bool:
+    return value is None or other is None or value == other
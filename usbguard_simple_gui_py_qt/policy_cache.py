@@ -0,0 +1,85 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from typing import Dict, Iterable, Optional, Tuple, Union
+from .rule_parsing import RuleParsingError
+from .rules import Rule
+
+# Rule ids reserved by USBGuard, used for instance as the `rule_id` of the
+# `DevicePolicyChanged` signal when no rule of the policy was matched, or
+# as the `parent_id` of `appendRule`.
+DEFAULT_RULE_ID = 0xffffffff
+ROOT_RULE_ID = 0xfffffffe
+LAST_RULE_ID = 0xfffffffd
+IMPLICIT_RULE_ID = 0xfffffffc
+
+# `(rule id, Rule or RuleParsingError)`, as for `RuleParser.parse_many`
+PolicyRule = Tuple[int, Union[Rule, RuleParsingError]]
+
+
+def is_reserved_rule_id(rule_id: int) -> bool:
+    return rule_id >= IMPLICIT_RULE_ID
+
+
+class PolicyCache:
+    """
+    Index of the rules of the USBGuard policy by rule id.
+
+    The cache starts unloaded; it is filled at once by `load` with the whole
+    rule list, and then kept up to date incrementally with `add` and
+    `remove`. Whenever it may be stale, it is `invalidate`d and must be
+    loaded again.
+    """
+
+    def __init__(self) -> None:
+        self._rules: Optional[Dict[int, Union[Rule, RuleParsingError]]] = None
+
+    def __len__(self) -> int:
+        return 0 if self._rules is None else len(self._rules)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._rules is not None
+
+    def load(self, rules: Iterable[PolicyRule]) -> None:
+        self._rules = dict(rules)
+
+    def invalidate(self) -> None:
+        self._rules = None
+
+    def contains(self, rule_id: int) -> bool:
+        return self._rules is not None and rule_id in self._rules
+
+    def get(self, rule_id: int) -> Optional[Rule]:
+        """
+        :return: The rule with the given id, or `None` if it is unknown or
+            it could not be parsed.
+        """
+        if self._rules is None:
+            return None
+        rule = self._rules.get(rule_id)
+        return rule if isinstance(rule, Rule) else None
+
+    def add(self, rule_id: int, rule: Union[Rule, RuleParsingError]) -> None:
+        if self._rules is not None:
+            self._rules[rule_id] = rule
+
+    def remove(self, rule_id: int) -> None:
+        if self._rules is not None:
+            self._rules.pop(rule_id, None)
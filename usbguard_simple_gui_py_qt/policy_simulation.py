@@ -0,0 +1,201 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+"What-if" simulation of a candidate policy over a device inventory: which
+devices would have their target changed by the new policy?
+"""
+
+import argparse
+import sys
+from dataclasses import dataclass
+from typing import (Dict,
+                    FrozenSet,
+                    Iterable,
+                    List,
+                    Optional,
+                    Sequence,
+                    TextIO,
+                    Tuple)
+from .rule_matching import RuleMatcher
+from .rule_parsing import RuleParser, RuleParsingError
+from .rules import DeviceAttribute, Rule, RuleTarget
+
+InventoryEntry = Tuple[int, Rule]
+
+
+@dataclass(frozen=True)
+class TargetChange:
+    __slots__ = ('device_id', 'device_rule', 'old_target', 'new_target',
+                 'rule_index')
+
+    device_id: int
+    device_rule: Rule
+    old_target: RuleTarget
+    new_target: RuleTarget
+    # Index in the policy of the matching rule, or `None` for the implicit
+    # policy target
+    rule_index: Optional[int]
+
+
+def simulate_policy(
+    policy: Sequence[Rule],
+    inventory: Iterable[InventoryEntry],
+    implicit_target: RuleTarget = RuleTarget.BLOCK
+) -> List[TargetChange]:
+    """
+    Evaluates the policy against every device of the inventory.
+
+    All the devices are matched against the same `RuleMatcher`, and devices
+    with identical attributes (the same model plugged in several machines
+    or ports, once `hash`, `serial` and `via-port` coincide) are evaluated
+    only once.
+
+    :param policy: The candidate policy.
+    :param inventory: `(device id, device rule)` pairs, where the target of
+        each device rule is the current target of the device.
+    :param implicit_target: The target of devices matching no rule.
+    :return: The devices whose target would change, in inventory order.
+    """
+    matcher = RuleMatcher(policy)
+    results: Dict[FrozenSet[DeviceAttribute],
+                  Tuple[RuleTarget, Optional[int]]] = {}
+    changes = []
+
+    for device_id, device_rule in inventory:
+        key = frozenset(device_rule.attributes.values())
+        result = results.get(key)
+
+        if result is None:
+            match = matcher.match(device_rule)
+            result = (implicit_target, None) if match is None \
+                else (match[1].target, match[0])
+            results[key] = result
+
+        new_target, rule_index = result
+        if new_target is not device_rule.target:
+            changes.append(TargetChange(
+                device_id, device_rule, device_rule.target, new_target,
+                rule_index))
+
+    return changes
+
+
+def load_device_inventory(path: str) -> List[InventoryEntry]:
+    """
+    Reads a device inventory saved with `write_device_inventory`: one
+    `<device id>: <device rule>` line per device, the same format printed by
+    `usbguard list-devices`.
+
+    :raises RuleParsingError: If a line is invalid.
+    """
+    inventory = []
+
+    with open(path, encoding='utf-8') as file:
+        for line_no, line in enumerate(file, 1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+
+            device_id, separator, device_rule = stripped.partition(':')
+            try:
+                if not separator:
+                    raise RuleParsingError('device id expected')
+                inventory.append(
+                    (int(device_id), RuleParser.parse(device_rule)))
+            except (RuleParsingError, ValueError) as error:
+                raise RuleParsingError(f'{path}:{line_no}: {error}')
+
+    return inventory
+
+
+def write_device_inventory(devices: Iterable, stream: TextIO) -> None:
+    """
+    Saves devices (e.g. the result of `UsbguardDbusInterface.list_devices`)
+    in the format read by `load_device_inventory`.
+    """
+    for device in devices:
+        stream.write(f'{device.device_id}: {device.rule.to_rule_string()}\n')
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Reports how the target of every device of a saved '
+                    'inventory would change with a candidate policy.')
+    parser.add_argument('rules_file', help='candidate rules.conf file')
+    parser.add_argument('inventory_file', help='saved device inventory')
+    parser.add_argument(
+        '--implicit-target',
+        choices=[target.value for target in RuleTarget],
+        default=RuleTarget.BLOCK.value,
+        help='target of devices matching no rule (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    policy = []
+    line_numbers = []
+    errors = 0
+
+    try:
+        for line_no, rule in RuleParser.iter_file(args.rules_file):
+            if isinstance(rule, RuleParsingError):
+                print(f'{args.rules_file}:{line_no}: {rule}',
+                      file=sys.stderr)
+                errors += 1
+            else:
+                policy.append(rule)
+                line_numbers.append(line_no)
+    except OSError as error:
+        print(f'{args.rules_file}: {error.strerror or error}',
+              file=sys.stderr)
+        return 1
+
+    if errors:
+        return 1
+
+    try:
+        inventory = load_device_inventory(args.inventory_file)
+    except RuleParsingError as error:
+        print(error, file=sys.stderr)
+        return 1
+    except (OSError, UnicodeDecodeError) as error:
+        print(f'{args.inventory_file}: '
+              f'{getattr(error, "strerror", None) or error}',
+              file=sys.stderr)
+        return 1
+
+    changes = simulate_policy(
+        policy, inventory, RuleTarget(args.implicit_target))
+
+    for change in changes:
+        matched_by = 'implicit target' if change.rule_index is None \
+            else f'{args.rules_file}:{line_numbers[change.rule_index]}'
+        name = change.device_rule.name
+        name_repr = f' "{name.values[0]}"' \
+            if name and len(name.values) == 1 else ''
+        print(f'{change.device_id}{name_repr}: '
+              f'{change.old_target.value} -> {change.new_target.value} '
+              f'({matched_by})')
+
+    print(f'{len(changes)} of {len(inventory)} devices would change target',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
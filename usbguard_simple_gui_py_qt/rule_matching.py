@@ -0,0 +1,218 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+"""
+Local evaluation of USBGuard policies: which rule of a policy would a device
+match?
+"""
+
+from collections import defaultdict
+from heapq import merge
+from typing import (Any,
+                    DefaultDict,
+                    Iterable,
+                    Iterator,
+                    List,
+                    Optional,
+                    Sequence,
+                    Tuple)
+from .rules import (DeviceAttribute,
+                    DeviceAttributeOperator,
+                    Rule,
+                    RuleTarget)
+
+RuleMatch = Tuple[int, Rule]
+
+# Operators requiring at least one of the rule values to match a device value
+_POSITIVE_OPERATORS = frozenset([
+    None,
+    DeviceAttributeOperator.ALL_OF,
+    DeviceAttributeOperator.ONE_OF,
+    DeviceAttributeOperator.EQUALS,
+    DeviceAttributeOperator.EQUALS_ORDERED,
+])
+
+
+def value_covers(rule_value: Any, other_value: Any) -> bool:
+    """
+    Tells whether a rule value matches (or, if `other_value` contains
+    wildcards, includes) another value of the same attribute.
+    """
+    if isinstance(rule_value, str):
+        return rule_value == other_value
+    return rule_value.covers(other_value)
+
+
+def attribute_applies_to(
+    attribute: DeviceAttribute,
+    device_values: Sequence[Any]
+) -> bool:
+    """
+    Evaluates a rule attribute against the values that a device has for the
+    same attribute, following the USBGuard set operators semantics. When no
+    operator is given, `equals` is implied.
+    """
+    operator = attribute.operator
+    values = attribute.values
+
+    if operator is DeviceAttributeOperator.ONE_OF:
+        return any(_matches_any(value, device_values) for value in values)
+    elif operator is DeviceAttributeOperator.NONE_OF:
+        return not any(_matches_any(value, device_values) for value in values)
+    elif operator is DeviceAttributeOperator.ALL_OF:
+        return all(_matches_any(value, device_values) for value in values)
+    elif operator is DeviceAttributeOperator.EQUALS_ORDERED:
+        return len(values) == len(device_values) and all(
+            value_covers(value, device_value)
+            for value, device_value in zip(values, device_values))
+    else:  # None or EQUALS
+        return len(values) == len(device_values) and all(
+            _matches_any(value, device_values) for value in values)
+
+
+def rule_applies_to(rule: Rule, device_rule: Rule) -> bool:
+    """
+    Tells whether a policy rule matches a device, described by its device
+    rule (as returned by `UsbguardDbusInterface.list_devices`).
+    """
+    device_attributes = device_rule.attributes
+    for name, attribute in rule.attributes.items():
+        device_attribute = device_attributes.get(name)
+        device_values = device_attribute.values if device_attribute else ()
+        if not attribute_applies_to(attribute, device_values):
+            return False
+    return True
+
+
+class RuleMatcher:
+    """
+    Finds the first rule of a policy matching a device, as USBGuard does.
+
+    The rules are indexed by device id, vendor id, hash and interface class,
+    so that only a few candidate rules have to be evaluated for each device,
+    in policy order, regardless of the size of the policy. Rules that cannot
+    be indexed (e.g. `allow id *:*`, or `none-of` constraints only) are
+    evaluated for every device.
+    """
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        self.rules: Sequence[Rule] = rules
+
+        self._by_id: DefaultDict[Tuple[int, int], List[int]] = \
+            defaultdict(list)
+        self._by_vendor: DefaultDict[int, List[int]] = defaultdict(list)
+        self._by_hash: DefaultDict[str, List[int]] = defaultdict(list)
+        self._by_iface_class: DefaultDict[int, List[int]] = defaultdict(list)
+        self._unindexed: List[int] = []
+
+        for index, rule in enumerate(rules):
+            self._index_rule(index, rule)
+
+    def match(self, device_rule: Rule) -> Optional[RuleMatch]:
+        """
+        :return: The index in the policy and the first rule matching the
+            device, or `None` if no rule matches.
+        """
+        rules = self.rules
+        for index in self._candidates(device_rule):
+            rule = rules[index]
+            if rule_applies_to(rule, device_rule):
+                return index, rule
+        return None
+
+    def target_for(
+        self,
+        device_rule: Rule,
+        implicit_target: RuleTarget = RuleTarget.BLOCK
+    ) -> RuleTarget:
+        """
+        :return: The target of the first rule matching the device, or the
+            implicit policy target if no rule matches.
+        """
+        match = self.match(device_rule)
+        return implicit_target if match is None else match[1].target
+
+    def _index_rule(self, index: int, rule: Rule) -> None:
+        id_attribute = rule.id
+        if _is_positive(id_attribute) and all(
+                value.vendor_id is not None for value in id_attribute.values):
+            for value in id_attribute.values:
+                if value.product_id is None:
+                    self._by_vendor[value.vendor_id].append(index)
+                else:
+                    self._by_id[value.vendor_id, value.product_id]\
+                        .append(index)
+            return
+
+        hash_attribute = rule.hash
+        if _is_positive(hash_attribute):
+            for value in hash_attribute.values:
+                self._by_hash[value].append(index)
+            return
+
+        with_interface_attribute = rule.with_interface
+        if _is_positive(with_interface_attribute):
+            for value in with_interface_attribute.values:
+                self._by_iface_class[value.iface_class].append(index)
+            return
+
+        self._unindexed.append(index)
+
+    def _candidates(self, device_rule: Rule) -> Iterator[int]:
+        buckets = [self._unindexed]
+
+        for device_id in _values(device_rule.id):
+            buckets.append(self._by_id.get(
+                (device_id.vendor_id, device_id.product_id), ()))
+            buckets.append(self._by_vendor.get(device_id.vendor_id, ()))
+
+        for device_hash in _values(device_rule.hash):
+            buckets.append(self._by_hash.get(device_hash, ()))
+
+        for iface_class in {v.iface_class
+                            for v in _values(device_rule.with_interface)}:
+            buckets.append(self._by_iface_class.get(iface_class, ()))
+
+        buckets = [bucket for bucket in buckets if bucket]
+        if len(buckets) == 1:
+            return iter(buckets[0])
+        return unique_sorted(merge(*buckets))
+
+
+def _is_positive(attribute: Optional[DeviceAttribute]) -> bool:
+    return attribute is not None and bool(attribute.values) \
+        and attribute.operator in _POSITIVE_OPERATORS
+
+
+def _values(attribute: Optional[DeviceAttribute]) -> Sequence[Any]:
+    return attribute.values if attribute else ()
+
+
+def _matches_any(value: Any, device_values: Sequence[Any]) -> bool:
+    return any(value_covers(value, device_value)
+               for device_value in device_values)
+
+
+def unique_sorted(indexes: Iterable[int]) -> Iterator[int]:
+    """Skips the repeated values of a sorted iterable, e.g. merged buckets."""
+    previous = None
+    for index in indexes:
+        if index != previous:
+            yield index
+            previous = index
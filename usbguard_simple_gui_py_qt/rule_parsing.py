@@ -17,8 +17,23 @@
 # along with "USBGuard Simple GUI Py/Qt".  If not, see
 # <https://www.gnu.org/licenses/>.
 
-from string import ascii_lowercase, whitespace
-from typing import List, Optional, Union
+import mmap
+import os
+import re
+from collections import OrderedDict
+from typing import (Any,
+                    Callable,
+                    Dict,
+                    Hashable,
+                    Iterable,
+                    Iterator,
+                    List,
+                    Mapping,
+                    Match,
+                    Optional,
+                    Tuple,
+                    TypeVar,
+                    Union)
 from .rules import (DeviceAttribute,
                     DeviceAttributeName,
                     DeviceAttributeOperator,
@@ -32,43 +47,332 @@ class RuleParsingError(Exception):
     pass
 
 
+ParsedLine = Tuple[int, Union[Rule, RuleParsingError]]
+
+_RULE_TARGETS = {t.value: t for t in RuleTarget}
+
+# Attributes which USBGuard always puts in the signals' dictionaries; the
+# others are only there with recent versions, so when they are missing the
+# rule string is checked before assuming the device doesn't have them.
+_REQUIRED_DICT_ATTRIBUTES = frozenset((
+    DeviceAttributeName.ID,
+    DeviceAttributeName.HASH,
+    DeviceAttributeName.PARENT_HASH,
+    DeviceAttributeName.NAME,
+    DeviceAttributeName.SERIAL,
+    DeviceAttributeName.VIA_PORT,
+    DeviceAttributeName.WITH_INTERFACE,
+))
+
+_ATTRIBUTES_FROM_DICT = tuple(
+    (name, name.value, name in _REQUIRED_DICT_ATTRIBUTES)
+    for name in DeviceAttributeName)
+
+_T = TypeVar('_T')
+
+# Hashing an attribute hashes all of its values: beyond this amount of
+# values, it costs more than sharing the attribute saves.
+_MAX_INTERNED_ATTRIBUTE_VALUES = 4
+
+
+class ValueInterner:
+    """
+    Bounded pool of shared immutable values (device ids, interface types,
+    strings and whole attributes).
+
+    Interning a value returns the instance already in the pool which is
+    equal to it, if any (values of different types must never compare as
+    equal), so that the many repeated values of a large
+    inventory or policy share the same objects. When the pool is full it is
+    emptied, so it never holds more than `max_size` entries.
+    """
+
+    def __init__(self, max_size: int = 8192) -> None:
+        if max_size <= 0:
+            raise ValueError(f'invalid pool size {max_size}')
+        self.max_size: int = max_size
+        self._values: Dict[Any, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def intern(self, value: _T) -> _T:
+        values = self._values
+        interned = values.get(value)
+
+        if interned is None:
+            if len(values) >= self.max_size:
+                values.clear()
+            values[value] = interned = value
+
+        return interned
+
+    def intern_by_key(self, key: Hashable, build: Callable[[], _T]) -> _T:
+        """
+        Like `intern`, but looking the value up by a key which is cheaper to
+        hash (e.g. its type and source text), so that it is only built, and
+        hashed itself, when missing from the pool. Keys must never compare
+        as equal to values, nor to the keys of different values.
+        """
+        values = self._values
+        interned = values.get(key)
+
+        if interned is None:
+            interned = self.intern(build())
+            if len(values) >= self.max_size:
+                values.clear()
+            values[key] = interned
+
+        return interned
+
+    def intern_attribute(self, attribute: DeviceAttribute) -> DeviceAttribute:
+        """
+        Interns the attribute if it has only a few values; the values of the
+        others should be interned one by one instead.
+        """
+        if len(attribute.values) > _MAX_INTERNED_ATTRIBUTE_VALUES:
+            return attribute
+        return self.intern(attribute)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+DEFAULT_VALUE_INTERNER = ValueInterner()
+
+
 class RuleParser:
+    """
+    Recursive-descent parser for USBGuard rules.
+
+    The input string is never copied or re-sliced while parsing: the parser
+    only moves an integer cursor (`_pos`) forward over the original value,
+    extracting substrings just for the tokens it actually returns.
+    """
+
     @staticmethod
-    def parse(value: str) -> Rule:
-        parser = RuleParser(value)
+    def parse(value: str, interner: Optional[ValueInterner] = None) -> Rule:
+        """
+        :param value: The rule string.
+        :param interner: The pool of shared values used for the parsed rule;
+            by default, `DEFAULT_VALUE_INTERNER`.
+        """
+        parser = RuleParser(value, interner)
         parser._parse()
         return parser._rule
 
-    def __init__(self, value: str) -> None:
-        self._input_value: str = value
+    @staticmethod
+    def parse_many(
+        lines: Iterable[str],
+        first_line_no: int = 1
+    ) -> Iterator[ParsedLine]:
+        """
+        Lazily parses one rule per line, as found in a `rules.conf` file.
+
+        Blank lines and comments (lines starting with `#`) are skipped.
+        Invalid lines do not stop the iteration: the `RuleParsingError` is
+        yielded in place of the `Rule`.
+
+        :param lines: The lines to parse.
+        :param first_line_no: The number of the first line, used to report
+            the line number of each result.
+        :return: Iterator of `(line number, Rule or RuleParsingError)`.
+        """
+        for line_no, line in enumerate(lines, first_line_no):
+            stripped = line.strip()
+            if stripped and not stripped.startswith('#'):
+                yield line_no, RuleParser._parse_line(stripped)
+
+    @staticmethod
+    def iter_file(path: str, encoding: str = 'utf-8') -> Iterator[ParsedLine]:
+        """
+        Like `parse_many`, but lazily reading the lines of a memory-mapped
+        file: only the line being parsed is ever decoded to a string.
+        """
+        return RuleParser.parse_byte_lines(iter_file_lines(path), encoding)
+
+    @staticmethod
+    def parse_byte_lines(
+        lines: Iterable[bytes],
+        encoding: str = 'utf-8'
+    ) -> Iterator[ParsedLine]:
+        """
+        Like `parse_many`, but decoding each line (without line terminator)
+        right before parsing it. Lines which cannot be decoded are reported
+        as a `RuleParsingError`, and lines are always numbered from 1.
+        """
+        for line_no, line in enumerate(lines, 1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith(b'#'):
+                continue
+            try:
+                value = stripped.decode(encoding)
+            except UnicodeDecodeError as error:
+                yield line_no, RuleParsingError(f'decoding error: {error}')
+                continue
+            yield line_no, RuleParser._parse_line(value)
+
+    @staticmethod
+    def from_attributes(
+        value: str,
+        attributes: Mapping[str, str],
+        interner: Optional[ValueInterner] = None
+    ) -> Optional[Rule]:
+        """
+        Builds the rule of a device from the dictionary of attributes sent by
+        USBGuard along with its device rule (e.g. in the
+        `DevicePresenceChanged` signal), without parsing the whole rule.
+
+        Only the target is read from the rule string. If the dictionary
+        cannot faithfully represent the rule (missing or malformed
+        attributes, or strings which USBGuard escapes in the rule string),
+        `None` is returned and the rule should be parsed.
+
+        :param value: The device rule string.
+        :param attributes: The attribute names mapped to their values, with
+            strings not quoted.
+        :param interner: See `parse`.
+        """
+        words = value.split(None, 1)
+        target = _RULE_TARGETS.get(words[0]) if words else None
+        if target is None:
+            return None
+
+        if interner is None:
+            interner = DEFAULT_VALUE_INTERNER
+        intern = interner.intern
+        parsed: Dict[DeviceAttributeName, DeviceAttribute] = {}
+
+        for name, key, required in _ATTRIBUTES_FROM_DICT:
+            raw_value = attributes.get(key)
+
+            if raw_value is None:
+                if required or key in value:
+                    return None
+                continue
+
+            if name is DeviceAttributeName.ID:
+                values = RuleParser._device_ids_from_string(raw_value)
+            elif name is DeviceAttributeName.WITH_INTERFACE:
+                values = RuleParser._interface_types_from_string(raw_value)
+            elif RuleParser._ESCAPED_STRING_CHAR_RE.search(raw_value):
+                return None
+            else:
+                values = (raw_value,)
+
+            if not values:
+                return None
+
+            parsed[name] = interner.intern_attribute(DeviceAttribute(
+                name, None, [intern(v) for v in values]))
+
+        return Rule(target=target, attributes=parsed)
+
+    @staticmethod
+    def _device_ids_from_string(value: str) -> Optional[Tuple[DeviceId]]:
+        match = RuleParser._USB_DEVICE_ID_RE.fullmatch(value)
+        if match is None:
+            return None
+        return (RuleParser._device_id_from_match(match),)
+
+    @staticmethod
+    def _interface_types_from_string(
+        value: str
+    ) -> Optional[List[DeviceInterfaceType]]:
+        # Either a single value, or `{ value value ... }`
+        value = value.strip()
+        if value.startswith('{') and value.endswith('}'):
+            value = value[1:-1]
+
+        values = []
+        for item in value.split():
+            match = RuleParser._INTERFACE_TYPE_RE.fullmatch(item)
+            if match is None:
+                return None
+            values.append(RuleParser._interface_type_from_match(match))
+
+        return values
+
+    @staticmethod
+    def _device_id_from_match(match: Match) -> DeviceId:
+        vendor_id, product_id = match.group(1, 2)
+        return DeviceId(
+            None if vendor_id is None else int(vendor_id, 16),
+            None if product_id in (None, '*') else int(product_id, 16))
+
+    @staticmethod
+    def _interface_type_from_match(match: Match) -> DeviceInterfaceType:
+        cc, ss, pp = match.group(1, 2, 3)
+        return DeviceInterfaceType(
+            int(cc, 16),
+            None if ss is None else int(ss, 16),
+            None if pp in (None, '*') else int(pp, 16))
+
+    @staticmethod
+    def _parse_line(value: str) -> Union[Rule, RuleParsingError]:
+        try:
+            return RuleParser.parse(value)
+        except RuleParsingError as error:
+            return error
+
+    def __init__(
+        self,
+        value: str,
+        interner: Optional[ValueInterner] = None
+    ) -> None:
+        if interner is None:
+            interner = DEFAULT_VALUE_INTERNER
+        self._intern = interner.intern
+        self._intern_by_key = interner.intern_by_key
+        self._intern_attribute = interner.intern_attribute
         self._value: str = value
+        self._pos: int = 0
+        self._end: int = len(value)
+        self._target: Optional[RuleTarget] = None
+        self._attributes: Dict[DeviceAttributeName, DeviceAttribute] = {}
         self._rule: Optional[Rule] = None
 
-    _RESERVED_WORD_CHARS = f'{ascii_lowercase}-'
+    _WHITESPACES_RE = re.compile(r'[ \t\n\r\x0b\x0c]*')
+    _RESERVED_WORD_RE = re.compile(r'[a-z-]*')
+    _WHITESPACE_CHARS = frozenset(' \t\n\r\x0b\x0c')
+    _OPERATORS = tuple((o.value, o) for o in DeviceAttributeOperator)
+
+    # USBGuard escapes the non-printable and non-ASCII characters of the
+    # strings in a rule (e.g. `\xff`), and the parser keeps the escapes.
+    _ESCAPED_STRING_CHAR_RE = re.compile(r'[^ -~]|["\\]')
+
+    # Fast paths for well-formed values; anything they don't match is handed
+    # to the token-by-token consumers, which produce the detailed errors.
+    _USB_DEVICE_ID_RE = re.compile(
+        r'(?:([0-9a-fA-F]{4}):([0-9a-fA-F]{4}|\*)|\*:\*)'
+        r'(?=[ \t\n\r\x0b\x0c}]|$)')
+    _INTERFACE_TYPE_RE = re.compile(
+        r'([0-9a-fA-F]{2}):(?:([0-9a-fA-F]{2}):([0-9a-fA-F]{2}|\*)|\*:\*)'
+        r'(?=[ \t\n\r\x0b\x0c}]|$)')
 
     def _parse(self) -> None:
         self._consume_optional_whitespaces()
-        self._consume_target_and_init_rule()
+        self._consume_target()
         self._consume_attributes()
+        self._rule = Rule(target=self._target, attributes=self._attributes)
 
-    def _consume_target_and_init_rule(self) -> None:
+    def _consume_target(self) -> None:
         word = self._consume_reserved_word()
         try:
-            target = RuleTarget(word)
-            self._rule = Rule(target=target)
+            self._target = RuleTarget(word)
         except ValueError as error:
             self._raise_error(str(error))
 
     def _consume_attributes(self) -> None:
         self._consume_optional_whitespaces()
-        while self._value:
+        while self._pos < self._end:
             self._consume_attribute()
             self._consume_optional_whitespaces()
 
     def _consume_attribute(self):
         name = self._consume_attribute_name()
 
-        if name in self._rule.attributes:
+        if name in self._attributes:
             self._raise_error(f'attribute {name} already set')
 
         self._consume_mandatory_whitespaces()
@@ -81,8 +385,8 @@ class RuleParser:
         else:
             values = self._consume_single_or_multi_attribute_values(name)
 
-        attribute = DeviceAttribute(name, operator, values)
-        self._rule.attributes[name] = attribute
+        self._attributes[name] = self._intern_attribute(
+            DeviceAttribute(name, operator, values))
 
     def _consume_attribute_name(self) -> DeviceAttributeName:
         word = self._consume_reserved_word()
@@ -93,10 +397,9 @@ class RuleParser:
             self._raise_error(str(error))
 
     def _consume_optional_operator(self) -> Optional[DeviceAttributeOperator]:
-        for operator in DeviceAttributeOperator:
-            word = operator.value
+        for word, operator in self._OPERATORS:
             if self._can_consume_exact_word(word):
-                self._yank(len(word))
+                self._pos += len(word)
                 return operator
         return None
 
@@ -104,7 +407,7 @@ class RuleParser:
         self,
         attribute_name: DeviceAttributeName
     ) -> List[Union[DeviceId, DeviceInterfaceType, str]]:
-        if self._value.startswith('{'):
+        if self._value.startswith('{', self._pos):
             return self._consume_multi_attributes_values(attribute_name)
         else:
             return [self._consume_single_attribute_value(attribute_name)]
@@ -117,10 +420,10 @@ class RuleParser:
         self._consume_optional_whitespaces()
 
         values = []
+        value = self._value
 
-        while self._value and not self._value.startswith('}'):
-            value = self._consume_single_attribute_value(attribute_name)
-            values.append(value)
+        while self._pos < self._end and value[self._pos] != '}':
+            values.append(self._consume_single_attribute_value(attribute_name))
             self._consume_optional_whitespaces()
 
         if not values:
@@ -142,6 +445,13 @@ class RuleParser:
             return self._consume_string_attribute_value()
 
     def _consume_usb_device_id(self) -> DeviceId:
+        match = self._USB_DEVICE_ID_RE.match(self._value, self._pos)
+        if match:
+            self._pos = match.end()
+            return self._intern_by_key(
+                (DeviceId, match.group()),
+                lambda: self._device_id_from_match(match))
+
         vendor_id = self._consume_hex_number_or_asterisk(4)
         self._yank_expected(':')
 
@@ -151,9 +461,16 @@ class RuleParser:
         else:
             product_id = self._consume_hex_number_or_asterisk(4)
 
-        return DeviceId(vendor_id, product_id)
+        return self._intern(DeviceId(vendor_id, product_id))
 
     def _consume_interface_type(self) -> DeviceInterfaceType:
+        match = self._INTERFACE_TYPE_RE.match(self._value, self._pos)
+        if match:
+            self._pos = match.end()
+            return self._intern_by_key(
+                (DeviceInterfaceType, match.group()),
+                lambda: self._interface_type_from_match(match))
+
         iface_class = self._consume_hex_number(2)
         self._yank_expected(':')
         iface_subclass = self._consume_hex_number_or_asterisk(2)
@@ -165,20 +482,21 @@ class RuleParser:
         else:
             iface_protocol = self._consume_hex_number_or_asterisk(2)
 
-        return DeviceInterfaceType(iface_class, iface_subclass, iface_protocol)
+        return self._intern(DeviceInterfaceType(
+            iface_class, iface_subclass, iface_protocol))
 
     def _consume_string_attribute_value(self) -> str:
         self._yank_expected('"')
-        quotes_index = self._value.find('"')
+        quotes_index = self._value.find('"', self._pos, self._end)
         if quotes_index == -1:
             self._raise_error('cannot find end of string')
-        content = self._yank(quotes_index)
+        content = self._yank(quotes_index - self._pos)
         self._yank_expected('"')
-        return content
+        return self._intern(content)
 
     def _consume_hex_number_or_asterisk(self, length: int) -> Optional[int]:
-        if self._value.startswith('*'):
-            self._yank()
+        if self._value.startswith('*', self._pos):
+            self._pos += 1
             return None
 
         return self._consume_hex_number(length)
@@ -191,46 +509,114 @@ class RuleParser:
             return self._raise_error(str(error))
 
     def _consume_reserved_word(self) -> str:
-        length = 0
-        for char in self._value:
-            if char in self._RESERVED_WORD_CHARS:
-                length += 1
-            else:
-                break
-
-        if length == 0:
+        match = self._RESERVED_WORD_RE.match(self._value, self._pos)
+        if match.end() == self._pos:
             self._raise_error('reserved word expected')
-
-        return self._yank(length)
+        self._pos = match.end()
+        return match.group()
 
     def _can_consume_exact_word(self, w: str) -> bool:
-        value = self._value
-        word_length = len(w)
-        return value == w \
-            or (len(value) > word_length
-                and value.startswith(w)
-                and value[word_length] in whitespace)
+        word_end = self._pos + len(w)
+        return self._value.startswith(w, self._pos) \
+            and (word_end == self._end
+                 or self._value[word_end] in self._WHITESPACE_CHARS)
 
     def _consume_mandatory_whitespaces(self) -> None:
-        if not self._value or self._value[0] not in whitespace:
+        if self._pos >= self._end \
+                or self._value[self._pos] not in self._WHITESPACE_CHARS:
             self._raise_error('whitespace expected')
         self._consume_optional_whitespaces()
 
     def _consume_optional_whitespaces(self) -> None:
-        self._value = self._value.lstrip(whitespace)
+        self._pos = self._WHITESPACES_RE.match(self._value, self._pos).end()
 
     def _yank_expected(self, value: str):
-        if not self._value.startswith(value):
+        if not self._value.startswith(value, self._pos):
             self._raise_error(f'"{value}" expected')
-        self._yank(len(value))
+        self._pos += len(value)
 
     def _yank(self, length: int = 1) -> str:
-        if length > len(self._value):
+        start = self._pos
+        end = start + length
+        if end > self._end:
             self._raise_error('unexpected end of string')
-        yanked_part = self._value[:length]
-        self._value = self._value[length:]
-        return yanked_part
+        self._pos = end
+        return self._value[start:end]
 
     def _raise_error(self, message: str):
-        pos = len(self._input_value) - len(self._value)
-        raise RuleParsingError(f'parsing error at position {pos}: {message}')
+        raise RuleParsingError(
+            f'parsing error at position {self._pos}: {message}')
+
+
+def iter_file_lines(
+    path: str,
+    start: int = 0,
+    end: Optional[int] = None
+) -> Iterator[bytes]:
+    """
+    Yields the lines (without line terminators) of a memory-mapped file.
+
+    :param start: Offset of the first byte to read; it must be the beginning
+        of a line.
+    :param end: Offset past the last byte to read, or `None` to read up to
+        the end of the file.
+    """
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:  # empty files cannot be mapped
+            return
+
+        end = size if end is None else min(end, size)
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            while pos < end:
+                newline = mm.find(b'\n', pos, end)
+                line_end = end if newline == -1 else newline
+                yield mm[pos:line_end]
+                pos = line_end + 1
+
+
+class RuleParseCache:
+    """
+    Size-bounded LRU cache in front of `RuleParser.parse`, keyed by the raw
+    rule string.
+
+    Since `Rule` objects are immutable, the same instance is returned for
+    every occurrence of an already parsed string. Parsing errors are never
+    cached.
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        if max_size <= 0:
+            raise ValueError(f'invalid cache size {max_size}')
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._rules: 'OrderedDict[str, Rule]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def parse(self, value: str) -> Rule:
+        rules = self._rules
+        rule = rules.get(value)
+
+        if rule is not None:
+            rules.move_to_end(value)
+            self.hits += 1
+            return rule
+
+        self.misses += 1
+        rule = RuleParser.parse(value)
+        rules[value] = rule
+
+        if len(rules) > self.max_size:
+            rules.popitem(last=False)
+            self.evictions += 1
+
+        return rule
+
+    def clear(self) -> None:
+        self._rules.clear()
@@ -17,9 +17,16 @@
 # along with "USBGuard Simple GUI Py/Qt".  If not, see
 # <https://www.gnu.org/licenses/>.
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from enum import Enum, unique
-from typing import Dict, Generic, List, Optional, TypeVar
+from types import MappingProxyType
+from typing import (Generic,
+                    Iterable,
+                    Mapping,
+                    Optional,
+                    Sequence,
+                    TextIO,
+                    TypeVar)
 
 
 @unique
@@ -34,6 +41,10 @@ class DeviceAttributeName(Enum):
     WITH_CONNECT_TYPE = 'with-connect-type'
 
 
+# Iterating on a tuple is much faster than on the enum itself
+_ATTRIBUTE_NAMES_ORDER = tuple(DeviceAttributeName)
+
+
 @unique
 class DeviceAttributeOperator(Enum):
     ALL_OF = 'all-of'
@@ -50,12 +61,26 @@ class RuleTarget(Enum):
     REJECT = 'reject'
 
 
+# Characters where `str.splitlines` splits, e.g. when reading a rules file
+_LINE_BREAKS = frozenset('\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029')
+
 DeviceAttributeValueType = TypeVar('DeviceAttributeValueType')
-@dataclass
+@dataclass(frozen=True)
 class DeviceAttribute(Generic[DeviceAttributeValueType]):
+    __slots__ = ('name', 'operator', 'values')
+
     name: DeviceAttributeName
     operator: Optional[DeviceAttributeOperator]
-    values: List[DeviceAttributeValueType]
+    values: Sequence[DeviceAttributeValueType]
+
+    def __post_init__(self) -> None:
+        # Instances are shared (e.g. by `RuleParseCache`), so the values are
+        # always stored as an immutable tuple.
+        object.__setattr__(self, 'values', tuple(self.values))
+
+    def __reduce__(self):
+        # The default slots-based pickling would fail on frozen instances
+        return self.__class__, (self.name, self.operator, self.values)
 
     @property
     def human_repr(self) -> str:
@@ -67,19 +92,79 @@ class DeviceAttribute(Generic[DeviceAttributeValueType]):
                 ' '.join(map(self._value_human_repr, self.values)))
         return f'{self.name.value}: {right_value}'
 
+    def to_rule_string(self) -> str:
+        """
+        Returns the attribute in USBGuard rule syntax, such that parsing it
+        gives back an identical attribute.
+
+        :raises ValueError: If the attribute cannot be expressed in the rule
+            syntax, e.g. because it has no values, or strings with quotes or
+            line breaks.
+        """
+        values = self.values
+        if not values:
+            raise ValueError(f'attribute {self.name.value} has no values')
+
+        value_rule_repr = self._value_rule_repr
+
+        if len(values) == 1 and self.operator is None:
+            return f'{self.name.value} {value_rule_repr(values[0])}'
+
+        return '%s %s{ %s }' % (
+            self.name.value,
+            f'{self.operator.value} ' if self.operator else '',
+            ' '.join(map(value_rule_repr, values)))
+
     @staticmethod
     def _value_human_repr(value) -> str:
         return f'"{value}"' if isinstance(value, str) else str(value)
 
+    @staticmethod
+    def _value_rule_repr(value) -> str:
+        if isinstance(value, str):
+            if '"' in value:
+                raise ValueError(f'string value {value!r} contains quotes')
+            # The parser doesn't unescape values, and a line break would
+            # split the rule over many lines of a rules file.
+            if not _LINE_BREAKS.isdisjoint(value):
+                raise ValueError(
+                    f'string value {value!r} contains line breaks')
+            return f'"{value}"'
+        return value.to_rule_string()
+
 
-@dataclass
+@dataclass(frozen=True)
 class DeviceId:
+    __slots__ = ('vendor_id', 'product_id')
+
     vendor_id: Optional[int]
     product_id: Optional[int]
 
+    def __reduce__(self):
+        return self.__class__, (self.vendor_id, self.product_id)
+
+    def covers(self, other: 'DeviceId') -> bool:
+        """
+        Tells whether every device id matched by `other` is also matched by
+        this one, taking `*` wildcards into account. For a concrete `other`
+        id, this is simply whether this id matches it.
+        """
+        if self.vendor_id is None:
+            return True
+        if self.vendor_id != other.vendor_id:
+            return False
+        return self.product_id is None or self.product_id == other.product_id
+
     def __repr__(self) -> str:
         return f'{self.vendor_repr}:{self.product_repr}'
 
+    def to_rule_string(self) -> str:
+        if self.vendor_id is None and self.product_id is not None:
+            raise ValueError(f'invalid device id {self!r}')
+        return '%s:%s' % (
+            '*' if self.vendor_id is None else '%04x' % self.vendor_id,
+            '*' if self.product_id is None else '%04x' % self.product_id)
+
     @property
     def vendor_repr(self) -> str:
         return self._hex_repr(self.vendor_id)
@@ -93,15 +178,42 @@ class DeviceId:
         return '*' if value is None else '%04x' % value
 
 
-@dataclass
+@dataclass(frozen=True)
 class DeviceInterfaceType:
+    __slots__ = ('iface_class', 'iface_subclass', 'iface_protocol')
+
     iface_class: int
     iface_subclass: Optional[int]
     iface_protocol: Optional[int]
 
+    def __reduce__(self):
+        return self.__class__, \
+            (self.iface_class, self.iface_subclass, self.iface_protocol)
+
+    def covers(self, other: 'DeviceInterfaceType') -> bool:
+        """The same as `DeviceId.covers`, for interface types."""
+        if self.iface_class != other.iface_class:
+            return False
+        if self.iface_subclass is None:
+            return True
+        if self.iface_subclass != other.iface_subclass:
+            return False
+        return self.iface_protocol is None \
+            or self.iface_protocol == other.iface_protocol
+
     def __repr__(self) -> str:
         return f'{self.cc}:{self.ss}:{self.pp}'
 
+    def to_rule_string(self) -> str:
+        if self.iface_subclass is None and self.iface_protocol is not None:
+            raise ValueError(f'invalid interface type {self!r}')
+        return '%02x:%s:%s' % (
+            self.iface_class,
+            '*' if self.iface_subclass is None
+            else '%02x' % self.iface_subclass,
+            '*' if self.iface_protocol is None
+            else '%02x' % self.iface_protocol)
+
     @property
     def cc(self) -> str:
         return '%02x' % self.iface_class
@@ -119,20 +231,78 @@ class DeviceInterfaceType:
         return '*' if value is None else '%02x' % value
 
 
-@dataclass
+@dataclass(frozen=True, init=False)
 class Rule:
+    __slots__ = ('target', 'attributes')
+
     target: RuleTarget
-    attributes: Dict[DeviceAttributeName, DeviceAttribute] = \
-        field(default_factory=dict)
-
-    def __getattr__(self, name: str) -> Optional[DeviceAttribute]:
-        enum_name = name.replace('_', '-')
-        try:
-            attribute = DeviceAttributeName(enum_name)
-        except ValueError:
-            raise AttributeError(
-                f"'{type(self).__name__}' object has no attribute '{name}'")
-        return self.attributes.get(attribute)
+    attributes: Mapping[DeviceAttributeName, DeviceAttribute]
+
+    def __init__(
+        self,
+        target: RuleTarget,
+        attributes: Optional[
+            Mapping[DeviceAttributeName, DeviceAttribute]] = None
+    ) -> None:
+        object.__setattr__(self, 'target', target)
+        object.__setattr__(
+            self, 'attributes', MappingProxyType(dict(attributes or {})))
+
+    def __hash__(self) -> int:
+        return hash((self.target, frozenset(self.attributes.values())))
+
+    def __reduce__(self):
+        return self.__class__, (self.target, dict(self.attributes))
+
+    @property
+    def id(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.ID)
+
+    @property
+    def hash(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.HASH)
+
+    @property
+    def parent_hash(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.PARENT_HASH)
+
+    @property
+    def name(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.NAME)
+
+    @property
+    def serial(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.SERIAL)
+
+    @property
+    def via_port(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.VIA_PORT)
+
+    @property
+    def with_interface(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.WITH_INTERFACE)
+
+    @property
+    def with_connect_type(self) -> Optional[DeviceAttribute]:
+        return self.attributes.get(DeviceAttributeName.WITH_CONNECT_TYPE)
+
+    def to_rule_string(self) -> str:
+        """
+        Returns the rule in USBGuard rule syntax; this is the exact inverse
+        of `RuleParser.parse`.
+
+        :raises ValueError: If the rule cannot be expressed in the rule
+            syntax (see `DeviceAttribute.to_rule_string`).
+        """
+        attributes = self.attributes
+        return ' '.join([
+            self.target.value,
+            *[
+                attributes[key].to_rule_string()
+                for key in _ATTRIBUTE_NAMES_ORDER
+                if key in attributes
+            ]
+        ])
 
     @property
     def human_repr(self) -> str:
@@ -146,3 +316,23 @@ class Rule:
                 if key in self.attributes
             ]
         ])
+
+
+def write_rules(rules: Iterable[Rule], stream: TextIO) -> int:
+    """
+    Writes the rules to the stream in USBGuard rule syntax, one per line, as
+    in a `rules.conf` file.
+
+    :raises ValueError: If a rule cannot be expressed in the rule syntax
+        (see `Rule.to_rule_string`); the rules before it are written.
+    :return: The amount of rules written.
+    """
+    count = 0
+    write = stream.write
+
+    for rule in rules:
+        write(rule.to_rule_string())
+        write('\n')
+        count += 1
+
+    return count
@@ -0,0 +1,54 @@
+# USBGuard Simple GUI Py/Qt
+# Copyright (C) 2019  Marco Nicola
+#
+# This file is part of "USBGuard Simple GUI Py/Qt".
+#
+# "USBGuard Simple GUI Py/Qt" is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# "USBGuard Simple GUI Py/Qt" is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "USBGuard Simple GUI Py/Qt".  If not, see
+# <https://www.gnu.org/licenses/>.
+
+from time import perf_counter
+from typing import Callable, List, Optional, TextIO, Tuple
+
+# Set this environment variable to print the startup milestones
+STARTUP_TIMING_ENV_VAR = 'USBGUARD_SIMPLE_GUI_STARTUP_TIMING'
+
+
+class StartupTimer:
+    """
+    Records when the milestones of the application startup are reached,
+    relative to the creation of the timer.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        clock: Callable[[], float] = perf_counter
+    ) -> None:
+        """
+        :param stream: Where each milestone is printed as soon as it is
+            reached; by default, they are only recorded.
+        """
+        self._stream = stream
+        self._clock = clock
+        self._start: float = clock()
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, label: str) -> float:
+        """:return: The time elapsed since the start, in seconds."""
+        elapsed = self._clock() - self._start
+        self.marks.append((label, elapsed))
+        if self._stream is not None:
+            self._stream.write(f'{elapsed * 1000:10.1f} ms  {label}\n')
+            self._stream.flush()
+        return elapsed
@@ -20,6 +20,7 @@
 import os
 import signal
 import sys
+from typing import Callable, List, Optional, Tuple
 from PySide2.QtGui import QIcon
 from PySide2.QtWidgets import (QAction,
                                QApplication,
@@ -27,24 +28,35 @@ from PySide2.QtWidgets import (QAction,
                                QMessageBox,
                                QSystemTrayIcon)
 from . import APP_NAME
+from .callback_dispatch import callback_name
 from .device import Device
 from .main_window import MainWindow
+from .policy_cache import is_reserved_rule_id
 from .rules import RuleTarget
+from .startup_timing import STARTUP_TIMING_ENV_VAR, StartupTimer
 from .usbguard_dbus_interface import (CallbackEventType,
                                       EventPresenceChangeType,
                                       UsbguardDbusInterface)
 
 SYSTEM_TRAY_APP_NAME = f'{APP_NAME} - System Tray App'
 
+_RULE_PARSE_CACHE_SIZE = 256
+
+_PRESENCE_COALESCING_WINDOW = 0.25  # seconds
+
 
 class SystemTrayApp:
     def __init__(
         self,
         app: QApplication,
-        usbguard_dbus: UsbguardDbusInterface
+        usbguard_dbus: UsbguardDbusInterface,
+        startup_timer: Optional[StartupTimer] = None
     ) -> None:
         self._app = app
-        self._main_window = MainWindow(app, usbguard_dbus)
+        self._startup_timer = startup_timer or StartupTimer()
+        # Created the first time it's opened, so that it doesn't delay the
+        # appearance of the tray icon.
+        self._main_window: Optional[MainWindow] = None
         self._open_action = self._create_open_action()
         self._quit_action = self._create_quit_action()
         self._menu = self._create_menu()
@@ -69,6 +81,20 @@ class SystemTrayApp:
                 '("balloon") messages.')
 
         self._tray_icon.show()
+        self._startup_timer.mark('tray icon shown')
+
+        self._usbguard_dbus.call_when_available(self._on_usbguard_available)
+
+    def _on_usbguard_available(self) -> None:
+        self._startup_timer.mark('USBGuard available')
+        self._preload_policy(
+            lambda _rules: self._startup_timer.mark('policy loaded'))
+
+    def _preload_policy(self, on_reply: Callable[[List], None]) -> None:
+        # Loading the policy in advance, so that notifications can show the
+        # matched rules right away; if it fails, it's retried on the first
+        # policy change.
+        self._usbguard_dbus.list_rules_async(on_reply, lambda _error: None)
 
     def _create_open_action(self) -> QAction:
         action = QAction('Open')
@@ -106,6 +132,8 @@ class SystemTrayApp:
         self._app.quit()
 
     def _open_window(self) -> None:
+        if self._main_window is None:
+            self._main_window = MainWindow(self._app, self._usbguard_dbus)
         self._main_window.show()
 
     def _register_dbus_callbacks(self) -> None:
@@ -114,8 +142,8 @@ class SystemTrayApp:
             return
 
         self._usbguard_dbus.register_callback(
-            CallbackEventType.DEVICE_PRESENCE_CHANGED,
-            self._on_device_presence_changed)
+            CallbackEventType.DEVICE_PRESENCE_CHANGED_BATCH,
+            self._on_device_presence_changed_batch)
 
         self._usbguard_dbus.register_callback(
             CallbackEventType.DEVICE_POLICY_CHANGED,
@@ -129,11 +157,25 @@ class SystemTrayApp:
             CallbackEventType.DEVICE_POLICY_CHANGED_ERROR,
             self._on_device_policy_changed_error)
 
-    def _on_device_presence_changed(
+        # The policy may have changed while USBGuard was restarting
+        self._usbguard_dbus.register_callback(
+            CallbackEventType.DAEMON_RECONNECTED,
+            lambda: self._preload_policy(lambda _rules: None))
+
+    def _on_device_presence_changed_batch(
+        self,
+        batch: List[Tuple[Device, EventPresenceChangeType, int]]
+    ) -> None:
+        if len(batch) == 1:
+            device, event, _target = batch[0]
+            self._show_device_presence_changed_message(device, event)
+        else:
+            self._show_devices_presence_changed_message(batch)
+
+    def _show_device_presence_changed_message(
         self,
         device: Device,
-        event: EventPresenceChangeType,
-        _target: int
+        event: EventPresenceChangeType
     ) -> None:
         if event is EventPresenceChangeType.REMOVE:
             self._show_removed_device_message(device)
@@ -151,10 +193,53 @@ class SystemTrayApp:
     ) -> None:
         self._tray_icon.showMessage(
             f'USB device policy changed for "{device.human_readable_name}"',
-            f'Rule #{rule_id}: {target_old.value} →  {target_new.value}\n\n'
+            f'Rule #{rule_id}: {target_old.value} →  {target_new.value}\n'
+            f'{self._policy_rule_repr(rule_id)}\n\n'
             f'{device.rule.human_repr}',
             QSystemTrayIcon.Information)
 
+    def _policy_rule_repr(self, rule_id: int) -> str:
+        if is_reserved_rule_id(rule_id):
+            return '(no rule of the policy matched)'
+
+        # Not waiting for USBGuard here: rules missing from the cache are
+        # fetched in the background for the next notifications.
+        rule = self._usbguard_dbus.get_cached_rule(rule_id)
+        if rule is None:
+            return '(matched rule not available)'
+
+        try:
+            return rule.to_rule_string()
+        except ValueError:
+            return rule.human_repr
+
+    def _show_devices_presence_changed_message(
+        self,
+        batch: List[Tuple[Device, EventPresenceChangeType, int]]
+    ) -> None:
+        to_be_managed = any(
+            event is not EventPresenceChangeType.REMOVE
+            and device.rule.target is not RuleTarget.ALLOW
+            for device, event, _target in batch)
+
+        lines = [
+            f'{event.name.lower()}: {device.human_readable_name}'
+            for device, event, _target in batch
+        ]
+
+        if to_be_managed:
+            self._tray_icon.showMessage(
+                f'{len(batch)} USB devices changed',
+                f'Click here to open {APP_NAME} and take action.\n\n'
+                + '\n'.join(lines),
+                QSystemTrayIcon.Warning,
+                100_000_000)
+        else:
+            self._tray_icon.showMessage(
+                f'{len(batch)} USB devices changed',
+                '\n'.join(lines),
+                QSystemTrayIcon.Information)
+
     def _show_removed_device_message(self, device: Device):
         self._tray_icon.showMessage(
             f'USB device "{device.human_readable_name}" was removed',
@@ -195,15 +280,33 @@ class SystemTrayApp:
             100_000_000)
 
 
+def _warn_slow_callback(
+    event_type: CallbackEventType,
+    callback: Callable,
+    duration: float
+) -> None:
+    # A callback blocking the GUI thread for this long makes it stutter
+    print(f'warning: {callback_name(callback)} took {duration * 1000:.0f} '
+          f'ms to handle {event_type.name}', file=sys.stderr)
+
+
 def main() -> None:
+    startup_timer = StartupTimer(
+        sys.stderr if os.environ.get(STARTUP_TIMING_ENV_VAR) else None)
+
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
+    startup_timer.mark('application created')
 
-    usbguard_dbus = UsbguardDbusInterface()
+    usbguard_dbus = UsbguardDbusInterface(
+        rule_parse_cache_size=_RULE_PARSE_CACHE_SIZE,
+        presence_coalescing_window=_PRESENCE_COALESCING_WINDOW,
+        on_slow_callback=_warn_slow_callback)
+    startup_timer.mark('D-Bus interface created')
 
-    system_tray_app = SystemTrayApp(app, usbguard_dbus)
+    system_tray_app = SystemTrayApp(app, usbguard_dbus, startup_timer)
     system_tray_app.start()
 
     sys.exit(app.exec_())
@@ -17,20 +17,43 @@
 # along with "USBGuard Simple GUI Py/Qt".  If not, see
 # <https://www.gnu.org/licenses/>.
 
-from enum import auto, Enum, IntEnum, unique
-from typing import Callable, Dict, List, Set, Optional
+from enum import auto, Enum, unique
+from threading import Lock
+from time import perf_counter
+from typing import (Callable,
+                    List,
+                    Optional,
+                    Sequence,
+                    Tuple,
+                    Union)
 from dbus import (Array,
+                  Boolean,
+                  DBusException,
                   Dictionary,
                   Interface,
                   String,
                   Struct,
                   SystemBus,
                   UInt32)
+from dbus.bus import BusConnection
 from dbus.mainloop.glib import DBusGMainLoop
+from PySide2.QtCore import QObject, Qt, QTimer, Signal
 
-from usbguard_simple_gui_py_qt.rules import RuleTarget
+from usbguard_simple_gui_py_qt.rules import Rule, RuleTarget
+from .callback_dispatch import CallbackDispatcher
 from .device import Device
-from .rule_parsing import RuleParser
+from .device_events import (EventPresenceChangeType,
+                            PendingPresenceEvent,
+                            PresenceEventCoalescer)
+from .device_policy_batch import (DevicePolicyBatch,
+                                  DevicePolicyBatchResult,
+                                  DevicePolicyChange)
+from .event_worker import EventWorker, TimingStats
+from .policy_cache import (is_reserved_rule_id,
+                           LAST_RULE_ID,
+                           PolicyCache,
+                           PolicyRule)
+from .rule_parsing import RuleParseCache, RuleParser, RuleParsingError
 
 _BUS_NAME = 'org.usbguard1'
 _POLICY_PATH = '/org/usbguard1/Policy'
@@ -43,17 +66,26 @@ _DEVICES_IFACE_NAME = 'org.usbguard.Devices1'
 class CallbackEventType(Enum):
     DEVICE_PRESENCE_CHANGED = auto()
     DEVICE_PRESENCE_CHANGED_ERROR = auto()
+    # Invoked with a list of `(device, event, target)` tuples
+    DEVICE_PRESENCE_CHANGED_BATCH = auto()
     DEVICE_POLICY_CHANGED = auto()
     DEVICE_POLICY_CHANGED_ERROR = auto()
+    # The USBGuard daemon left the bus
+    DAEMON_DISCONNECTED = auto()
+    # The USBGuard daemon is back on the bus after having left it (e.g. it
+    # was restarted): any state previously read from it may be outdated
+    DAEMON_RECONNECTED = auto()
 
 
-@unique
-class EventPresenceChangeType(IntEnum):
-    PRESENT = 0
-    INSERT = 1
-    UPDATE = 2
-    REMOVE = 3
-
+# Where the exceptions raised by the callbacks of each event type go
+_ERROR_EVENT_TYPES = {
+    CallbackEventType.DEVICE_PRESENCE_CHANGED:
+        CallbackEventType.DEVICE_PRESENCE_CHANGED_ERROR,
+    CallbackEventType.DEVICE_PRESENCE_CHANGED_BATCH:
+        CallbackEventType.DEVICE_PRESENCE_CHANGED_ERROR,
+    CallbackEventType.DEVICE_POLICY_CHANGED:
+        CallbackEventType.DEVICE_POLICY_CHANGED_ERROR,
+}
 
 _TARGET_TO_INT = {
     RuleTarget.ALLOW: 0,
@@ -66,52 +98,303 @@ _INT_TO_TARGET = {_TARGET_TO_INT[t]: t for t in _TARGET_TO_INT}
 
 class UsbguardDbusInterface:
 
-    def __init__(self) -> None:
-        DBusGMainLoop(set_as_default=True)
+    def __init__(
+        self,
+        rule_parse_cache_size: int = 0,
+        bus: Optional[BusConnection] = None,
+        presence_coalescing_window: float = 0,
+        worker_thread: bool = False,
+        callback_time_budget: float = 0.05,
+        on_slow_callback: Optional[
+            Callable[[CallbackEventType, Callable, float], None]] = None
+    ) -> None:
+        """
+        :param rule_parse_cache_size: Maximum amount of device rules kept in
+            an LRU cache of parsed rules. The same device rule strings are
+            sent over and over by devices being re-authorized or flapping.
+            The cache is disabled if this value is 0.
+        :param bus: The bus where USBGuard is reachable; by default, the
+            system bus, using the GLib main loop.
+        :param presence_coalescing_window: Time window, in seconds, used to
+            collapse the bursts of device presence events (e.g. when a hub
+            is plugged in) to at most one event per device. Superseded
+            events are dropped without parsing their device rule, and an
+            insertion followed by a removal cancels out. Coalescing is
+            disabled if this value is 0.
+        :param worker_thread: Whether to build the devices of the received
+            signals (the rule parsing, mostly) on a background thread. The
+            callbacks are still invoked on the thread of the main loop,
+            through queued Qt signals. The D-Bus messages themselves are
+            always received on the main loop, to which dbus-python is bound.
+        :param callback_time_budget: Time, in seconds, over which a callback
+            is reported as slow by `callback_dispatcher`.
+        :param on_slow_callback: Invoked with the event type, callback and
+            duration of each callback call over `callback_time_budget`.
+        """
+        # Time spent on the thread of the main loop (the GUI thread) to
+        # handle the signals, in each D-Bus signal handler, coalesced batch
+        # or delivery from the worker thread. The time per event is the
+        # total divided by `received_signals`.
+        self.gui_thread_timing = TimingStats()
+        self.received_signals: int = 0
+
+        self._worker: Optional[EventWorker] = None
+        if worker_thread:
+            self._gui_thread_delivery = _GuiThreadDelivery(self._run_delivery)
+            self._worker = EventWorker(
+                self._gui_thread_delivery.delivered.emit,
+                lambda error: self._dispatch(
+                    CallbackEventType.DEVICE_PRESENCE_CHANGED_ERROR, error),
+                name='usbguard-dbus-worker')
+
+        self._rule_parse_lock = Lock()
+        self._rule_parse_cache: Optional[RuleParseCache] = \
+            RuleParseCache(rule_parse_cache_size) \
+            if rule_parse_cache_size else None
+
+        self._presence_coalescer: Optional[PresenceEventCoalescer] = \
+            PresenceEventCoalescer(
+                presence_coalescing_window,
+                self._on_coalesced_presence_events,
+                self._schedule) \
+            if presence_coalescing_window else None
+
+        if bus is None:
+            DBusGMainLoop(set_as_default=True)
+            bus = SystemBus()
+
+        self._bus = bus
+
+        # Proxies are only created when first used, and never introspect the
+        # remote objects: the signatures of the calls are given explicitly.
+        self._policy_iface: Optional[Interface] = None
+        self._devices_iface: Optional[Interface] = None
+
+        # Unlike `connect_to_signal`, this doesn't need the proxies, nor the
+        # daemon to be running.
+        self._bus.add_signal_receiver(
+            self._on_device_presence_changed,
+            'DevicePresenceChanged',
+            _DEVICES_IFACE_NAME,
+            _BUS_NAME,
+            _DEVICES_PATH)
+
+        self._bus.add_signal_receiver(
+            self._on_device_policy_changed,
+            'DevicePolicyChanged',
+            _DEVICES_IFACE_NAME,
+            _BUS_NAME,
+            _DEVICES_PATH)
+
+        self._callback_dispatcher: CallbackDispatcher[CallbackEventType] = \
+            CallbackDispatcher(
+                list(CallbackEventType),
+                _ERROR_EVENT_TYPES,
+                callback_time_budget,
+                on_slow_callback)
+
+        self._policy_cache = PolicyCache()
+        self._policy_refresh_pending: bool = False
+
+        # The unique name of the daemon on the bus, or '' when it isn't there
+        self._daemon_owner: str = ''
+        self._daemon_seen: bool = False
+        self._bus.watch_name_owner(_BUS_NAME, self._on_name_owner_changed)
 
-        self._bus = SystemBus()
+    @property
+    def callback_dispatcher(self) -> CallbackDispatcher[CallbackEventType]:
+        """
+        Invokes the registered callbacks, in registration order, isolating
+        their exceptions (reported to the callbacks of the `*_ERROR` event
+        types as `CallbackError`s) and recording their latency.
+        """
+        return self._callback_dispatcher
+
+    @property
+    def rule_parse_cache(self) -> Optional[RuleParseCache]:
+        return self._rule_parse_cache
 
-        self._policy_proxy = self._bus.get_object(_BUS_NAME, _POLICY_PATH)
-        self._policy = Interface(self._policy_proxy, _POLICY_IFACE_NAME)
+    @property
+    def _policy(self) -> Interface:
+        if self._policy_iface is None:
+            self._policy_iface = self._create_interface(
+                _POLICY_PATH, _POLICY_IFACE_NAME)
+        return self._policy_iface
 
-        self._devices_proxy = self._bus.get_object(_BUS_NAME, _DEVICES_PATH)
-        self._devices = Interface(self._devices_proxy, _DEVICES_IFACE_NAME)
+    @property
+    def _devices(self) -> Interface:
+        if self._devices_iface is None:
+            self._devices_iface = self._create_interface(
+                _DEVICES_PATH, _DEVICES_IFACE_NAME)
+        return self._devices_iface
 
-        self._devices.connect_to_signal(
-            'DevicePresenceChanged', self._on_device_presence_changed)
+    def _create_interface(self, path: str, iface_name: str) -> Interface:
+        # Following the name owner changes, the proxy doesn't need to look
+        # the daemon up (or even to find it running) when it is created.
+        proxy = self._bus.get_object(
+            _BUS_NAME,
+            path,
+            introspect=False,
+            follow_name_owner_changes=True)
+        return Interface(proxy, iface_name)
 
-        self._devices.connect_to_signal(
-            'DevicePolicyChanged', self._on_device_policy_changed)
+    def call_when_available(self, callback: Callable[[], None]) -> None:
+        """
+        Invokes the callback from the main loop as soon as the USBGuard
+        daemon is on the bus, which is right away if it is already running.
+        """
+        watch = None
+        called = False
+
+        def on_name_owner_changed(owner: str) -> None:
+            nonlocal called
+            if not owner or called:
+                return
+            called = True
+            if watch is not None:
+                watch.cancel()
+            callback()
+
+        watch = self._bus.watch_name_owner(_BUS_NAME, on_name_owner_changed)
+        if called:
+            watch.cancel()
+
+    @property
+    def policy_cache(self) -> PolicyCache:
+        """
+        Rules of the policy, by rule id, loaded by `list_rules` and kept up
+        to date by the methods changing the policy.
+        """
+        return self._policy_cache
 
-        self._callbacks: Dict[CallbackEventType, Set[Callable]] = \
-            {e: set() for e in CallbackEventType}
+    def close(self) -> None:
+        """Stops the worker thread, if any."""
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker = None
 
     def register_callback(
         self,
         event_type: CallbackEventType,
         callback: Callable
     ) -> None:
-        callbacks = self._callbacks[event_type]
-        if callback in callbacks:
-            raise Exception(f'callback {callback} already registered')
-        self._callbacks[event_type].add(callback)
+        self._callback_dispatcher.register(event_type, callback)
 
     def unregister_callback(
         self,
         event_type: CallbackEventType,
         callback: Callable
     ) -> None:
-        self._callbacks[event_type].remove(callback)
+        self._callback_dispatcher.unregister(event_type, callback)
 
     def list_devices(self, query: str = 'match') -> List[Device]:
         response: Array[Struct[UInt32, String]] = \
             self._devices.listDevices(query)
-        return [
-            Device(
-                device_id=int(device_struct[0]),
-                rule=RuleParser.parse(str(device_struct[1])))
-            for device_struct in response
-        ]
+        return self._devices_from_response(response)
+
+    def list_devices_async(
+        self,
+        on_reply: Callable[[List[Device]], None],
+        on_error: Callable[[Exception], None],
+        query: str = 'match'
+    ) -> None:
+        """
+        Non-blocking version of `list_devices`.
+
+        The call returns immediately, and one of the handlers is invoked
+        later from the main loop (the same one running the Qt event loop),
+        so the UI never waits for the USBGuard daemon.
+
+        :param on_reply: Invoked with the list of devices.
+        :param on_error: Invoked with the D-Bus or parsing error.
+        """
+        def reply_handler(response: Array) -> None:
+            try:
+                devices = self._devices_from_response(response)
+            except Exception as error:
+                on_error(error)
+                return
+            on_reply(devices)
+
+        self._devices.listDevices(
+            query,
+            reply_handler=reply_handler,
+            error_handler=on_error)
+
+    def list_rules(self) -> List[PolicyRule]:
+        """
+        Reads the whole policy, also (re)loading `policy_cache`.
+
+        :return: The rules in policy order. A rule which cannot be parsed is
+            returned as a `RuleParsingError` in place of the `Rule`.
+        """
+        response: Array[Struct[UInt32, String]] = \
+            self._policy.listRules('match')
+        return self._load_policy(response)
+
+    def list_rules_async(
+        self,
+        on_reply: Callable[[List[PolicyRule]], None],
+        on_error: Callable[[DBusException], None]
+    ) -> None:
+        """Non-blocking version of `list_rules`, see `list_devices_async`."""
+        self._policy.listRules(
+            'match',
+            reply_handler=lambda response:
+                on_reply(self._load_policy(response)),
+            error_handler=on_error)
+
+    def get_rule(self, rule_id: int) -> Optional[Rule]:
+        """
+        Looks up a rule of the policy, e.g. the one reported by a
+        `DEVICE_POLICY_CHANGED` event.
+
+        The policy is only read from USBGuard when the cache is not loaded
+        yet, or doesn't know the rule (it could have been added by someone
+        else in the meantime).
+
+        :return: The rule, or `None` for reserved rule ids, unknown rules and
+            rules which cannot be parsed.
+        """
+        if is_reserved_rule_id(rule_id):
+            return None
+        if not self._policy_cache.contains(rule_id):
+            self.list_rules()
+        return self._policy_cache.get(rule_id)
+
+    def get_cached_rule(self, rule_id: int) -> Optional[Rule]:
+        """
+        Non-blocking version of `get_rule`, e.g. for event callbacks: when
+        the cache doesn't know the rule, `None` is returned right away, and
+        the policy is read again in the background for the next lookups.
+        """
+        if is_reserved_rule_id(rule_id):
+            return None
+        if not self._policy_cache.contains(rule_id):
+            self._refresh_policy_cache()
+        return self._policy_cache.get(rule_id)
+
+    def append_rule(
+        self,
+        rule: Rule,
+        parent_id: int = LAST_RULE_ID,
+        temporary: bool = False
+    ) -> int:
+        """
+        :param parent_id: The id of the rule after which the new one is
+            inserted; by default, it is appended at the end of the policy.
+        :param temporary: Whether the rule is lost when USBGuard restarts.
+        :return: The id of the new rule.
+        """
+        response: UInt32 = self._policy.appendRule(
+            rule.to_rule_string(), UInt32(parent_id), Boolean(temporary))
+        rule_id = int(response)
+        self._policy_cache.add(rule_id, rule)
+        return rule_id
+
+    def remove_rule(self, rule_id: int) -> None:
+        self._policy.removeRule(UInt32(rule_id))
+        self._policy_cache.remove(rule_id)
 
     def apply_device_policy(
         self,
@@ -120,18 +403,175 @@ class UsbguardDbusInterface:
         permanent: bool
     ) -> Optional[int]:
         response: UInt32 = self._devices.applyDevicePolicy(
-            device_id,
-            _TARGET_TO_INT[target],
-            permanent)
+            UInt32(device_id),
+            UInt32(_TARGET_TO_INT[target]),
+            Boolean(permanent))
+        if permanent:
+            # USBGuard added or changed a rule of the policy
+            self._policy_cache.invalidate()
         return int(response) if permanent else None
 
+    def apply_device_policy_async(
+        self,
+        device_id: int,
+        target: RuleTarget,
+        permanent: bool,
+        on_reply: Callable[[Optional[int]], None],
+        on_error: Callable[[DBusException], None]
+    ) -> None:
+        """
+        Non-blocking version of `apply_device_policy`, see
+        `list_devices_async`.
+
+        :param on_reply: Invoked with the id of the new rule if `permanent`,
+            or `None`.
+        :param on_error: Invoked with the D-Bus error.
+        """
+        def reply_handler(response: UInt32) -> None:
+            if permanent:
+                self._policy_cache.invalidate()
+                on_reply(int(response))
+            else:
+                on_reply(None)
+
+        self._devices.applyDevicePolicy(
+            UInt32(device_id),
+            UInt32(_TARGET_TO_INT[target]),
+            Boolean(permanent),
+            reply_handler=reply_handler,
+            error_handler=on_error)
+
+    def _devices_from_response(
+        self,
+        response: Array  # Array[Struct[UInt32, String]]
+    ) -> List[Device]:
+        return [
+            Device(
+                device_id=int(device_struct[0]),
+                rule=self._parse_rule(device_struct[1]))
+            for device_struct in response
+        ]
+
+    def apply_device_policies(
+        self,
+        changes: Sequence[DevicePolicyChange],
+        on_done: Callable[[DevicePolicyBatchResult], None]
+    ) -> None:
+        """
+        Applies the policy of many devices at once, without blocking.
+
+        All the requests are sent right away, without waiting for the
+        previous answers, so the whole batch takes about as long as a single
+        call. `on_done` is invoked from the main loop once every request is
+        answered, with the result of each one and the total wall time.
+
+        :param changes: `(device id, target, permanent)` tuples.
+        """
+        batch = DevicePolicyBatch(changes, on_done)
+        batch.start()
+        for index, (device_id, target, permanent) in enumerate(changes):
+            try:
+                self.apply_device_policy_async(
+                    device_id,
+                    target,
+                    permanent,
+                    on_reply=batch.reply_handler(index),
+                    on_error=batch.error_handler(index))
+            except Exception as error:
+                # E.g. the connection to the bus is lost
+                batch.error_handler(index)(error)
+
+    def _refresh_policy_cache(self) -> None:
+        if self._policy_refresh_pending:
+            return
+
+        def on_done(_result) -> None:
+            self._policy_refresh_pending = False
+
+        self._policy_refresh_pending = True
+        try:
+            self.list_rules_async(on_done, on_done)
+        except DBusException:
+            # The next lookup will try again
+            self._policy_refresh_pending = False
+
+    def _load_policy(
+        self,
+        response: Array  # Array[Struct[UInt32, String]]
+    ) -> List[PolicyRule]:
+        rules = [
+            (int(rule_struct[0]), self._parse_policy_rule(rule_struct[1]))
+            for rule_struct in response
+        ]
+        self._policy_cache.load(rules)
+        return rules
+
+    def _parse_policy_rule(
+        self,
+        value: String
+    ) -> Union[Rule, RuleParsingError]:
+        try:
+            return self._parse_rule(value)
+        except RuleParsingError as error:
+            return error
+
+    def _device_from_signal(
+        self,
+        device_id: int,
+        device_rule: String,
+        attributes: Dictionary
+    ) -> Device:
+        # Building the rule from the structured attributes is much cheaper
+        # than parsing it; the rule string is only parsed when the
+        # attributes are not enough.
+        rule = RuleParser.from_attributes(
+            str(device_rule),
+            {str(name): str(value) for name, value in attributes.items()})
+        if rule is None:
+            rule = self._parse_rule(device_rule)
+        return Device(device_id=device_id, rule=rule)
+
+    def _parse_rule(self, value: String) -> Rule:
+        if self._rule_parse_cache is None:
+            return RuleParser.parse(str(value))
+        # The cache may be used by the worker thread at the same time
+        with self._rule_parse_lock:
+            return self._rule_parse_cache.parse(str(value))
+
+    def _on_name_owner_changed(self, owner: str) -> None:
+        previous_owner = self._daemon_owner
+        self._daemon_owner = owner
+
+        if not owner:
+            if previous_owner:
+                self._dispatch(CallbackEventType.DAEMON_DISCONNECTED)
+            return
+
+        if not self._daemon_seen:
+            # The first time the daemon is found is no reconnection
+            self._daemon_seen = True
+            return
+
+        if owner == previous_owner:
+            return
+
+        # A new instance of the daemon: nothing read from the previous one
+        # can be trusted anymore.
+        self._policy_cache.invalidate()
+        self._policy_iface = None
+        self._devices_iface = None
+        self._dispatch(CallbackEventType.DAEMON_RECONNECTED)
+
+    def _dispatch(self, event_type: CallbackEventType, *args) -> None:
+        self._callback_dispatcher.dispatch(event_type, *args)
+
     def _on_device_presence_changed(
         self,
         device_id: UInt32,
         event: UInt32,
         target: UInt32,
         device_rule: String,
-        _attributes: Dictionary
+        attributes: Dictionary
     ) -> None:
         """
         :param device_id: Device id of the device.
@@ -140,23 +580,85 @@ class UsbguardDbusInterface:
         :param target: The current authorization target of the device in
             numerical form.
         :param device_rule: Device specific rule.
-        :param _attributes: A dictionary of device attributes and their values.
+        :param attributes: A dictionary of device attributes and their values.
         """
+        started = perf_counter()
+        self.received_signals += 1
+
         try:
-            resolved_event = EventPresenceChangeType(int(event))
-            resolved_target = int(target)
-            device = Device(
+            pending_event = PendingPresenceEvent(
                 device_id=int(device_id),
-                rule=RuleParser.parse(device_rule))
+                event=EventPresenceChangeType(int(event)),
+                target=int(target),
+                payload=(device_rule, attributes))
         except Exception as error:
-            event_type = CallbackEventType.DEVICE_PRESENCE_CHANGED_ERROR
-            for callback in self._callbacks[event_type]:
-                callback(error)
-            return
+            self._dispatch(
+                CallbackEventType.DEVICE_PRESENCE_CHANGED_ERROR, error)
+        else:
+            if self._presence_coalescer is None:
+                self._process_presence_events([pending_event])
+            else:
+                self._presence_coalescer.add(pending_event)
+
+        self.gui_thread_timing.add(perf_counter() - started)
+
+    def _on_coalesced_presence_events(
+        self,
+        pending_events: List[PendingPresenceEvent]
+    ) -> None:
+        started = perf_counter()
+        self._process_presence_events(pending_events)
+        self.gui_thread_timing.add(perf_counter() - started)
 
-        event_type = CallbackEventType.DEVICE_PRESENCE_CHANGED
-        for callback in self._callbacks[event_type]:
-            callback(device, resolved_event, resolved_target)
+    def _process_presence_events(
+        self,
+        pending_events: List[PendingPresenceEvent]
+    ) -> None:
+        if self._worker is None:
+            self._build_presence_delivery(pending_events)()
+        else:
+            self._worker.submit(
+                lambda: self._build_presence_delivery(pending_events))
+
+    def _build_presence_delivery(
+        self,
+        pending_events: List[PendingPresenceEvent]
+    ) -> Callable[[], None]:
+        batch: List[Tuple[Device, EventPresenceChangeType, int]] = []
+        errors: List[Exception] = []
+
+        for pending_event in pending_events:
+            try:
+                device = self._device_from_signal(
+                    pending_event.device_id, *pending_event.payload)
+            except Exception as error:
+                errors.append(error)
+                continue
+            batch.append((device, pending_event.event, pending_event.target))
+
+        return lambda: self._deliver_presence_events(batch, errors)
+
+    def _deliver_presence_events(
+        self,
+        batch: List[Tuple[Device, EventPresenceChangeType, int]],
+        errors: List[Exception]
+    ) -> None:
+        for error in errors:
+            self._dispatch(
+                CallbackEventType.DEVICE_PRESENCE_CHANGED_ERROR, error)
+
+        for device, event, target in batch:
+            self._dispatch(
+                CallbackEventType.DEVICE_PRESENCE_CHANGED,
+                device, event, target)
+
+        if batch:
+            self._dispatch(
+                CallbackEventType.DEVICE_PRESENCE_CHANGED_BATCH, batch)
+
+    @staticmethod
+    def _schedule(delay: float, callback: Callable[[], None]) -> None:
+        QTimer.singleShot(int(delay * 1000), callback)
 
     def _on_device_policy_changed(
         self,
@@ -165,7 +667,7 @@ class UsbguardDbusInterface:
         target_new: UInt32,
         device_rule: String,
         rule_id: UInt32,
-        _attributes: Dictionary
+        attributes: Dictionary
     ) -> None:
         """
         :param device_id: Device id of the device.
@@ -174,25 +676,53 @@ class UsbguardDbusInterface:
         :param device_rule: Device specific rule.
         :param rule_id: A rule id of the matched rule. Otherwise a reserved
             rule id value is used.
-        :param _attributes: A dictionary of device attributes and their values.
+        :param attributes: A dictionary of device attributes and their values.
         """
-        try:
-            resolved_target_old = _INT_TO_TARGET[int(target_old)]
-            resolved_target_new = _INT_TO_TARGET[int(target_new)]
-            resolved_rule_id = int(rule_id)
-            device = Device(
-                device_id=int(device_id),
-                rule=RuleParser.parse(device_rule))
-        except Exception as error:
-            event_type = CallbackEventType.DEVICE_POLICY_CHANGED_ERROR
-            for callback in self._callbacks[event_type]:
-                callback(error)
-            return
+        started = perf_counter()
+        self.received_signals += 1
+
+        # USBGuard signals the presence change of a device right before its
+        # policy change: if still pending, it's delivered first, otherwise it
+        # would bring the old target back afterwards.
+        if self._presence_coalescer is not None:
+            self._presence_coalescer.flush_device(int(device_id))
+
+        def build_delivery() -> Callable[[], None]:
+            try:
+                event_args = (
+                    self._device_from_signal(
+                        int(device_id), device_rule, attributes),
+                    _INT_TO_TARGET[int(target_old)],
+                    _INT_TO_TARGET[int(target_new)],
+                    int(rule_id))
+            except Exception as error:
+                return lambda error=error: self._dispatch(
+                    CallbackEventType.DEVICE_POLICY_CHANGED_ERROR, error)
+
+            return lambda: self._dispatch(
+                CallbackEventType.DEVICE_POLICY_CHANGED, *event_args)
+
+        if self._worker is None:
+            build_delivery()()
+        else:
+            self._worker.submit(build_delivery)
+
+        self.gui_thread_timing.add(perf_counter() - started)
+
+    def _run_delivery(self, delivery: Callable[[], None]) -> None:
+        started = perf_counter()
+        delivery()
+        self.gui_thread_timing.add(perf_counter() - started)
+
+
+class _GuiThreadDelivery(QObject):
+    """
+    Runs the callables emitted from any thread in the thread of this object
+    (the GUI thread), through a queued signal connection.
+    """
+
+    delivered = Signal(object)
 
-        event_type = CallbackEventType.DEVICE_POLICY_CHANGED
-        for callback in self._callbacks[event_type]:
-            callback(
-                device,
-                resolved_target_old,
-                resolved_target_new,
-                resolved_rule_id)
+    def __init__(self, run: Callable[[Callable[[], None]], None]) -> None:
+        super().__init__()
+        self.delivered.connect(run, Qt.QueuedConnection)